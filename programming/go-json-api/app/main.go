@@ -6,6 +6,8 @@ import (
 	"io"
 	"log"
 	"net/http"
+	"os"
+	"sync"
 )
 
 // User struct to represent user data
@@ -27,6 +29,9 @@ var users = []User{
 	{ID: 2, Name: "Jane Smith", Email: "jane@example.com"},
 }
 
+// Guards users, handlers run concurrently on their own goroutines
+var usersMu sync.RWMutex
+
 // Handler for creating a new user
 func createUserHandler(w http.ResponseWriter, r *http.Request) {
 	// Ensure only POST method is accepted
@@ -51,15 +56,15 @@ func createUserHandler(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	// Create a new user
+	// Create a new user and add it to the "database"
+	usersMu.Lock()
 	newUser := User{
 		ID:    len(users) + 1,
 		Name:  newUserReq.Name,
 		Email: newUserReq.Email,
 	}
-
-	// Add user to the "database"
 	users = append(users, newUser)
+	usersMu.Unlock()
 
 	// Set response headers
 	w.Header().Set("Content-Type", "application/json")
@@ -80,8 +85,13 @@ func getUsersHandler(w http.ResponseWriter, r *http.Request) {
 	// Set response headers
 	w.Header().Set("Content-Type", "application/json")
 
+	// Users are only ever appended, so a copy of the slice header stays valid
+	usersMu.RLock()
+	snapshot := users
+	usersMu.RUnlock()
+
 	// Convert users to JSON and send response
-	json.NewEncoder(w).Encode(users)
+	json.NewEncoder(w).Encode(snapshot)
 }
 
 func main() {
@@ -98,7 +108,10 @@ func main() {
 	})
 
 	// Start the server
-	port := 8000
-	fmt.Printf("Server starting on port %d...\n", port)
-	log.Fatal(http.ListenAndServe(fmt.Sprintf(":%d", port), nil))
+	port := os.Getenv("PORT")
+	if port == "" {
+		port = "8000"
+	}
+	fmt.Printf("Server starting on port %s...\n", port)
+	log.Fatal(http.ListenAndServe(":"+port, nil))
 }
@@ -0,0 +1,504 @@
+"""
+Side-by-side benchmark of go-json-api and python-json-api
+
+Drives the equivalent create and list operations of both services with the
+same request mix, concurrency levels and payloads, and reports throughput,
+latency percentiles and resident memory per service.
+
+    # Start both as bare processes, one after the other, on a free port
+    python compare.py --spawn --concurrency 1,10,50 --requests 5000
+
+    # Against services that are already running, e.g. the Go compose setup
+    python compare.py --targets go --go-url https://localhost:8443 --insecure \\
+        --go-container myapp
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+GO_APP = ROOT / "go-json-api" / "app"
+PYTHON_APP = ROOT / "python-json-api"
+
+OPERATIONS = ["create", "list"]
+# python-json-api compresses responses the client accepts and go-json-api does
+# not, both send plain JSON when the client asks for it
+CLIENT_HEADERS = {"Accept-Encoding": "identity"}
+
+
+@dataclass
+class Target:
+    """A running service and how to express each operation against it"""
+
+    name: str
+    base_url: str
+    # Paths of the create and list operations
+    paths: dict[str, str]
+    headers: dict[str, str] = field(default_factory=dict)
+    verify: bool = True
+    pid: int | None = None
+    container: str | None = None
+
+    def create_body(self, index: int) -> dict[str, Any]:
+        name = f"bench-{index}"
+        email = f"{name}@example.com"
+        if self.name == "go":
+            return {"name": name, "email": email}
+        # python-json-api has no user listing, items are its closest equivalent
+        return {"name": name, "description": email, "price": 1.0}
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """Nearest-rank percentile of samples, q in [0, 100]"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def latency_summary(latencies: list[float]) -> dict[str, float]:
+    return {
+        "requests": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    """Operation weights such as create=1,list=4"""
+    mix = {}
+    for part in value.split(","):
+        operation, _, weight = part.partition("=")
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation: {operation}")
+        mix[operation] = int(weight or 1)
+    return mix
+
+
+def parse_sizes(value: str) -> list[int]:
+    return [int(size) for size in value.split(",")]
+
+
+def build_schedule(mix: dict[str, int], requests: int, seed: int) -> list[str]:
+    """The same shuffled sequence of operations for every target"""
+    total = sum(mix.values())
+    schedule = []
+    for operation, weight in mix.items():
+        schedule += [operation] * round(requests * weight / total)
+    random.Random(seed).shuffle(schedule)
+    return schedule
+
+
+def process_tree_rss(pid: int) -> int:
+    """Resident memory of a process and its descendants in bytes"""
+    children: dict[int, list[int]] = {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # The command name in parentheses may contain spaces
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry.name))
+
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending += children.get(current, [])
+        try:
+            status = Path(f"/proc/{current}/status").read_text()
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith("VmRSS:"):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+def container_rss(container: str) -> int:
+    """Memory usage of a container as reported by docker stats, in bytes"""
+    output = subprocess.run(
+        ["docker", "stats", "--no-stream", "--format", "{{.MemUsage}}", container],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    usage = output.split("/")[0].strip()
+    units = {"B": 1, "KiB": 1024, "MiB": 1024**2, "GiB": 1024**3}
+    for unit in sorted(units, key=len, reverse=True):
+        if usage.endswith(unit):
+            return int(float(usage.removesuffix(unit)) * units[unit])
+    raise ValueError(f"Unexpected memory usage: {usage}")
+
+
+def read_rss(target: Target) -> int | None:
+    if target.pid is not None:
+        return process_tree_rss(target.pid)
+    if target.container is not None:
+        return container_rss(target.container)
+    return None
+
+
+class RssSampler:
+    """Samples the resident memory of a target in the background"""
+
+    def __init__(self, target: Target, interval: float = 0.25):
+        self.target = target
+        self.interval = interval
+        self.peak: int | None = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = read_rss(self.target)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def _drive(
+    target: Target, operations: list[tuple[int, str]], concurrency: int
+) -> dict[str, Any]:
+    latencies: dict[str, list[float]] = {operation: [] for operation in OPERATIONS}
+    errors = 0
+    queue = iter(operations)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=target.base_url,
+        headers={**CLIENT_HEADERS, **target.headers},
+        verify=target.verify,
+        limits=limits,
+        timeout=30.0,
+    ) as client:
+
+        async def worker():
+            nonlocal errors
+            for index, operation in queue:
+                start = time.monotonic()
+                try:
+                    if operation == "create":
+                        response = await client.post(
+                            target.paths["create"], json=target.create_body(index)
+                        )
+                    else:
+                        response = await client.get(target.paths["list"])
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies[operation].append(time.monotonic() - start)
+                else:
+                    errors += 1
+
+        start = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        end = time.monotonic()
+    return {"latencies": latencies, "errors": errors, "start": start, "end": end}
+
+
+def _client_process(
+    target: Target, operations: list[tuple[int, str]], concurrency: int
+) -> dict[str, Any]:
+    return asyncio.run(_drive(target, operations, concurrency))
+
+
+def run_level(
+    target: Target,
+    schedule: list[str],
+    concurrency: int,
+    client_processes: int,
+    offset: int,
+) -> dict[str, Any]:
+    """Run the schedule at one concurrency level, split over client processes"""
+    operations = [(offset + i, operation) for i, operation in enumerate(schedule)]
+    processes = max(1, min(client_processes, concurrency))
+    if processes == 1:
+        parts = [_client_process(target, operations, concurrency)]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [
+                executor.submit(
+                    _client_process,
+                    target,
+                    operations[i::processes],
+                    concurrency // processes + (i < concurrency % processes),
+                )
+                for i in range(processes)
+            ]
+            parts = [future.result() for future in futures]
+
+    latencies = {
+        operation: [value for part in parts for value in part["latencies"][operation]]
+        for operation in OPERATIONS
+    }
+    elapsed = max(part["end"] for part in parts) - min(part["start"] for part in parts)
+    combined = [value for values in latencies.values() for value in values]
+    return {
+        "concurrency": concurrency,
+        "throughput_rps": len(combined) / elapsed if elapsed else 0.0,
+        "errors": sum(part["errors"] for part in parts),
+        **latency_summary(combined),
+        "operations": {
+            operation: latency_summary(values)
+            for operation, values in latencies.items()
+            if values
+        },
+    }
+
+
+def benchmark_target(target: Target, args: argparse.Namespace) -> dict[str, Any]:
+    if args.preload:
+        preload = ["create"] * args.preload
+        run_level(target, preload, min(args.preload, 10), 1, offset=0)
+    offset = args.preload
+    idle = read_rss(target)
+    levels = []
+    for concurrency in args.concurrency:
+        schedule = build_schedule(args.mix, args.requests, args.seed)
+        with RssSampler(target) as sampler:
+            level = run_level(
+                target, schedule, concurrency, args.client_processes, offset
+            )
+        offset += len(schedule)
+        level["rss_peak_mb"] = sampler.peak / 1024**2 if sampler.peak else None
+        levels.append(level)
+    return {"rss_idle_mb": idle / 1024**2 if idle else None, "levels": levels}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url: str, verify: bool = True, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, verify=verify).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+def python_token(base_url: str, verify: bool = True) -> str:
+    """Register a benchmark user on python-json-api and log it in"""
+    credentials = {"username": f"bench-{uuid.uuid4().hex[:8]}", "password": "bench"}
+    with httpx.Client(base_url=base_url, verify=verify) as client:
+        client.post(
+            "/register", json={**credentials, "email": "bench@example.com"}
+        ).raise_for_status()
+        response = client.post("/login", json=credentials)
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+
+def make_target(name: str, base_url: str, verify: bool, **kwargs) -> Target:
+    if name == "go":
+        paths = {"create": "/users", "list": "/users"}
+        return Target(name, base_url, paths, verify=verify, **kwargs)
+    token = python_token(base_url, verify)
+    return Target(
+        name,
+        base_url,
+        {"create": "/items", "list": "/items"},
+        headers={"Authorization": f"Bearer {token}"},
+        verify=verify,
+        **kwargs,
+    )
+
+
+def spawn(
+    name: str, args: argparse.Namespace, workdir: Path
+) -> tuple[subprocess.Popen, str]:
+    """Start a service as a bare process on a free port, returning its URL"""
+    port = free_port()
+    env = {**os.environ, "PORT": str(port)}
+    if name == "go":
+        binary = args.go_binary
+        if binary is None:
+            if shutil.which("go") is None:
+                raise SystemExit("go is not installed, pass --go-binary")
+            binary = workdir / "go-json-api"
+            subprocess.run(
+                ["go", "build", "-o", str(binary), "."],
+                cwd=GO_APP,
+                check=True,
+            )
+        command = [str(binary)]
+        ready = f"http://127.0.0.1:{port}/users"
+    else:
+        # Throttling of /register and /login would skew the setup otherwise
+        env["PASSWORD_RATE_PER_SECOND"] = "0"
+        command = [
+            sys.executable,
+            "serve.py",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(args.python_workers),
+            "--no-access-log",
+            "--log-level",
+            "warning",
+        ]
+        ready = f"http://127.0.0.1:{port}/"
+    process = subprocess.Popen(
+        command, cwd=GO_APP if name == "go" else PYTHON_APP, env=env
+    )
+    try:
+        wait_until_ready(ready)
+    except RuntimeError:
+        process.terminate()
+        raise
+    return process, f"http://127.0.0.1:{port}"
+
+
+def print_report(results: dict[str, dict[str, Any]]):
+    names = list(results)
+    print(f"{'':<26}" + "".join(f"{name:>16}" for name in names))
+    print(
+        f"{'rss idle (MB)':<26}"
+        + "".join(_cell(results[name]["rss_idle_mb"]) for name in names)
+    )
+    levels = [level["concurrency"] for level in results[names[0]]["levels"]]
+    for i, concurrency in enumerate(levels):
+        for label, key in [
+            ("throughput (rps)", "throughput_rps"),
+            ("p50 (ms)", "p50_ms"),
+            ("p95 (ms)", "p95_ms"),
+            ("p99 (ms)", "p99_ms"),
+            ("errors", "errors"),
+            ("rss peak (MB)", "rss_peak_mb"),
+        ]:
+            row = f"c={concurrency:<5} {label:<19}"
+            print(row + "".join(_cell(results[n]["levels"][i][key]) for n in names))
+    for name in names:
+        errors = sum(level["errors"] for level in results[name]["levels"])
+        if errors:
+            print(
+                f"warning: {errors} {name} requests failed, its latencies and "
+                "throughput cover successful requests only"
+            )
+
+
+def _cell(value: float | None) -> str:
+    if value is None:
+        return f"{'-':>16}"
+    return f"{value:>16}" if isinstance(value, int) else f"{value:>16.2f}"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--targets", type=lambda v: v.split(","), default=["go", "python"]
+    )
+    parser.add_argument("--spawn", action="store_true", help="Start bare processes")
+    parser.add_argument("--go-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--python-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--go-binary", type=Path, help="Prebuilt go-json-api binary")
+    parser.add_argument("--go-pid", type=int, help="PID for RSS sampling")
+    parser.add_argument("--python-pid", type=int, help="PID for RSS sampling")
+    parser.add_argument("--go-container", help="Container for RSS sampling")
+    parser.add_argument("--python-container", help="Container for RSS sampling")
+    parser.add_argument(
+        "--python-workers",
+        type=int,
+        default=1,
+        help="Only 1, users and tokens are in the memory of each worker",
+    )
+    parser.add_argument("--insecure", action="store_true", help="Skip TLS checks")
+    parser.add_argument("--concurrency", type=parse_sizes, default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=2000, help="Per level")
+    parser.add_argument("--mix", type=parse_mix, default={"create": 1, "list": 1})
+    parser.add_argument(
+        "--preload", type=int, default=100, help="Creates before the first level"
+    )
+    parser.add_argument("--client-processes", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args(argv)
+    if args.python_workers != 1:
+        # A token issued by one worker is unknown to the others, so most
+        # requests would measure 401 responses
+        parser.error("--python-workers must be 1, each worker has its own users")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.targets:
+            process, base_url = None, getattr(args, f"{name}_url")
+            if args.spawn:
+                process, base_url = spawn(name, args, Path(workdir))
+            try:
+                target = make_target(
+                    name,
+                    base_url,
+                    verify=not args.insecure,
+                    pid=process.pid if process else getattr(args, f"{name}_pid"),
+                    container=getattr(args, f"{name}_container"),
+                )
+                results[name] = benchmark_target(target, args)
+            finally:
+                if process is not None:
+                    process.terminate()
+                    process.wait()
+
+    print_report(results)
+    if args.output:
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "requests": args.requests,
+                "mix": args.mix,
+                "preload": args.preload,
+                "client_processes": args.client_processes,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            },
+            "results": results,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
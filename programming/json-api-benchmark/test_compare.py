@@ -0,0 +1,101 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import compare
+
+
+class FakeService(BaseHTTPRequestHandler):
+    """Accepts creates and fails every other list request"""
+
+    lists = 0
+    encodings: set[str] = set()
+    lock = threading.Lock()
+
+    def do_POST(self):  # noqa: N802
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.respond(201)
+
+    def do_GET(self):  # noqa: N802
+        with self.lock:
+            FakeService.encodings.add(self.headers["Accept-Encoding"])
+            FakeService.lists += 1
+            failed = FakeService.lists % 2 == 0
+        self.respond(401 if failed else 200)
+
+    def respond(self, status: int):
+        body = json.dumps({}).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def target():
+    FakeService.lists = 0
+    FakeService.encodings = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeService)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield compare.Target(
+        "go",
+        f"http://127.0.0.1:{server.server_port}",
+        {"create": "/users", "list": "/users"},
+    )
+    server.shutdown()
+    server.server_close()
+
+
+def test_build_schedule_is_shared_and_weighted():
+    schedule = compare.build_schedule({"create": 1, "list": 3}, 100, seed=1)
+    assert schedule == compare.build_schedule({"create": 1, "list": 3}, 100, seed=1)
+    assert (schedule.count("create"), schedule.count("list")) == (25, 75)
+
+
+def test_run_level_counts_errors_apart_from_latencies(target):
+    schedule = ["create"] * 10 + ["list"] * 10
+    level = compare.run_level(target, schedule, 4, 1, offset=0)
+    assert level["concurrency"] == 4
+    assert level["errors"] == 5
+    assert level["requests"] == 15
+    assert level["operations"]["create"]["requests"] == 10
+    assert level["operations"]["list"]["requests"] == 5
+    assert level["throughput_rps"] > 0
+    assert level["p50_ms"] <= level["p95_ms"] <= level["p99_ms"]
+    # Neither service compresses the responses it is compared on
+    assert FakeService.encodings == {"identity"}
+
+
+def test_report_warns_about_errors(capsys):
+    level = {
+        "concurrency": 10,
+        "throughput_rps": 100.0,
+        "p50_ms": 1.0,
+        "p95_ms": 2.0,
+        "p99_ms": 3.0,
+        "rss_peak_mb": None,
+    }
+    compare.print_report(
+        {
+            "go": {"rss_idle_mb": 10.0, "levels": [{**level, "errors": 0}]},
+            "python": {"rss_idle_mb": None, "levels": [{**level, "errors": 7}]},
+        }
+    )
+    out = capsys.readouterr().out
+    rows = {line[:26].strip(): line[26:].split() for line in out.splitlines()}
+    assert rows["c=10    errors"] == ["0", "7"]
+    assert rows["rss idle (MB)"] == ["10.00", "-"]
+    assert "warning: 7 python requests failed" in out
+    assert "go requests failed" not in out
+
+
+def test_more_than_one_python_worker_is_rejected():
+    with pytest.raises(SystemExit) as exited:
+        compare.main(["--spawn", "--python-workers", "4"])
+    assert exited.value.code == 2
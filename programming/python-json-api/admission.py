@@ -0,0 +1,126 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import HTTPException, Request, status
+
+from metrics import ADMISSION_REJECTIONS
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class ConcurrencyLimiter:
+    """
+    Limit concurrent requests with a bounded wait queue
+    Requests are rejected when the queue is full or their wait deadline passes
+    """
+
+    def __init__(self, limit: int, max_queue: int, max_wait: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise AdmissionRejected("queue full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the wait ended
+                self.release()
+            else:
+                future.cancel()
+                with suppress(ValueError):
+                    self._waiters.remove(future)
+            if isinstance(e, asyncio.TimeoutError):
+                raise AdmissionRejected("wait deadline exceeded") from None
+            raise
+
+    def release(self):
+        # Hand the slot directly to the next waiter to keep FIFO order
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class RateLimiter:
+    """Per-client token buckets, keeping at most max_clients buckets"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def acquire(self, client: str, now: float | None = None) -> float:
+        """Take a token, returning 0 or the seconds until a token is available"""
+        if now is None:
+            now = time.monotonic()
+        tokens, updated = self.buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / self.rate
+        self.buckets[client] = (tokens, now)
+        if len(self.buckets) > self.max_clients:
+            self.buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        self.buckets.clear()
+
+
+@asynccontextmanager
+async def admit(
+    request: Request,
+    route: str,
+    limiter: ConcurrencyLimiter,
+    rate_limiter: RateLimiter | None = None,
+):
+    """Admit a request through a rate limiter and a concurrency limiter"""
+    if rate_limiter is not None and rate_limiter.rate > 0:
+        client = request.client.host if request.client else "unknown"
+        wait = rate_limiter.acquire(client)
+        if wait > 0:
+            ADMISSION_REJECTIONS.inc(route, "rate_limited")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+    try:
+        await limiter.acquire()
+    except AdmissionRejected as e:
+        ADMISSION_REJECTIONS.inc(route, str(e).replace(" ", "_"))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, try again later",
+            headers={"Retry-After": "1"},
+        ) from None
+    try:
+        yield
+    finally:
+        limiter.release()
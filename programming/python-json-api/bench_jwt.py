@@ -0,0 +1,152 @@
+"""
+Micro-benchmark of the JWT backends
+
+Measures sign and verify throughput of every backend for HS256, RS256 and
+ES256, signing with PEM private keys and verifying against public JWKs the
+way OIDC providers publish them.
+
+    python bench_jwt.py --iterations 2000 --output bench_jwt.json
+"""
+
+import argparse
+import base64
+import json
+import platform
+import sys
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+from jwt_backend import BACKENDS, get_backend
+
+ALGORITHMS = ["HS256", "RS256", "ES256"]
+
+
+def _b64int(value: int, size: int | None = None) -> str:
+    data = value.to_bytes(size or (value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def public_jwk(public_key: Any, kid: str = "bench") -> dict[str, str]:
+    """JWK of an RSA or P-256 public key"""
+    numbers = public_key.public_numbers()
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return {
+            "kty": "RSA",
+            "kid": kid,
+            "n": _b64int(numbers.n),
+            "e": _b64int(numbers.e),
+        }
+    return {
+        "kty": "EC",
+        "kid": kid,
+        "crv": "P-256",
+        "x": _b64int(numbers.x, 32),
+        "y": _b64int(numbers.y, 32),
+    }
+
+
+def generate_keys(algorithm: str) -> tuple[Any, Any]:
+    """Signing key and verification key for an algorithm"""
+    if algorithm.startswith("HS"):
+        secret = "bench-secret-" + "x" * 32
+        return secret, secret
+    if algorithm.startswith("RS"):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode("ascii")
+    return pem, public_jwk(private_key.public_key())
+
+
+def measure(fn: Callable[[], Any], iterations: int) -> dict[str, float]:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    return {
+        "ops_per_second": iterations / elapsed if elapsed else 0.0,
+        "us_per_op": elapsed / iterations * 1e6,
+    }
+
+
+def run_benchmark(
+    iterations: int,
+    backends: list[str] | None = None,
+    algorithms: list[str] | None = None,
+) -> dict[str, dict[str, float]]:
+    """Results keyed by backend/algorithm/operation"""
+    results = {}
+    claims = {
+        "sub": "bench-user",
+        "iss": "https://bench.example.com",
+        "aud": "bench-client",
+        "exp": int(time.time()) + 3600,
+    }
+    for algorithm in algorithms or ALGORITHMS:
+        signing_key, verifying_key = generate_keys(algorithm)
+        for name in backends or list(BACKENDS):
+            backend = get_backend(name)
+            token = backend.encode(claims, signing_key, algorithm=algorithm)
+            results[f"{name}/{algorithm}/sign"] = measure(
+                partial(backend.encode, claims, signing_key, algorithm=algorithm),
+                iterations,
+            )
+            results[f"{name}/{algorithm}/verify"] = measure(
+                partial(
+                    backend.decode,
+                    token,
+                    verifying_key,
+                    algorithms=[algorithm],
+                    audience="bench-client",
+                    issuer="https://bench.example.com",
+                ),
+                iterations,
+            )
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument(
+        "--backends", type=lambda value: value.split(","), default=list(BACKENDS)
+    )
+    parser.add_argument(
+        "--algorithms", type=lambda value: value.split(","), default=ALGORITHMS
+    )
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.iterations, args.backends, args.algorithms)
+    for name, result in results.items():
+        print(
+            f"{name:<30} {result['ops_per_second']:>12.0f} ops/s "
+            f"{result['us_per_op']:>10.1f} us/op"
+        )
+    if args.output:
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "iterations": args.iterations,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            },
+            "results": results,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,527 @@
+"""
+End-to-end benchmark suite for the JSON API
+
+Runs every endpoint either in-process over ASGI or against a real uvicorn
+worker, reports throughput and latency percentiles as JSON and fails when a
+result regresses past a threshold compared to a baseline file.
+
+    python benchmark.py --mode asgi --users 1,10 --items 10,100 --output bench.json
+    python benchmark.py --mode server --baseline bench.json --threshold 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+import httpx
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+SCENARIOS = [
+    "register",
+    "login",
+    "auth_me",
+    "oidc_auth_me",
+    "items_create",
+    "items_list",
+    "items_get",
+    "items_update",
+    "items_delete",
+]
+
+PASSWORD = "benchmark-password"  # noqa: S105
+OIDC_CLIENT_ID = "benchmark-client"
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """Nearest-rank percentile of samples, q in [0, 100]"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict[str, Any]:
+    """
+    Summarize request latencies in seconds into a result record
+    latencies holds a sample for every request that completed and errors
+    counts the requests that failed, so requests in the record excludes them.
+    """
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": count / elapsed if elapsed > 0 else 0.0,
+        "mean_ms": sum(latencies) / count * 1000 if count else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def error_rate(result: dict[str, Any]) -> float:
+    """Fraction of all requests sent that failed, results without counts have none"""
+    errors = result.get("errors", 0)
+    total = result.get("requests", 0) + errors
+    return errors / total if total else 0.0
+
+
+def compare_results(
+    results: dict[str, dict], baseline: dict[str, dict], threshold: float
+) -> list[str]:
+    """Return a description of every result that regressed past threshold"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {result['throughput_rps']:.1f} rps, "
+                f"baseline {base['throughput_rps']:.1f} rps"
+            )
+        if result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(
+                f"{name}: p95 {result['p95_ms']:.2f} ms, "
+                f"baseline {base['p95_ms']:.2f} ms"
+            )
+        # Failing fast looks like a speedup, so any rise in errors regresses
+        if error_rate(result) > error_rate(base):
+            regressions.append(
+                f"{name}: {result['errors']} errors "
+                f"({error_rate(result):.2%}), baseline {base.get('errors', 0)} "
+                f"({error_rate(base):.2%})"
+            )
+    return regressions
+
+
+class FakeIdentityProvider:
+    """Local OIDC provider serving discovery and JWKS documents over HTTP"""
+
+    def __init__(self):
+        self.kid = "benchmark-key"
+        self.private_key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048
+        )
+        public_pem = self.private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        self.jwks = {
+            "keys": [
+                {
+                    **jwk.construct(public_pem, "RS256").to_dict(),
+                    "kid": self.kid,
+                    "use": "sig",
+                }
+            ]
+        }
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.issuer = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _handler(self):
+        idp = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # noqa: N802
+                if self.path == "/.well-known/openid-configuration":
+                    body = {"issuer": idp.issuer, "jwks_uri": f"{idp.issuer}/jwks"}
+                elif self.path == "/jwks":
+                    body = idp.jwks
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def issue_token(self, subject: str) -> str:
+        private_pem = self.private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        claims = {
+            "iss": self.issuer,
+            "aud": OIDC_CLIENT_ID,
+            "sub": subject,
+            "email": f"{subject}@example.com",
+            "name": subject,
+            "exp": datetime.now(timezone.utc) + timedelta(hours=1),
+        }
+        return jwt.encode(
+            claims, private_pem, algorithm="RS256", headers={"kid": self.kid}
+        )
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+async def run_requests(
+    count: int,
+    concurrency: int,
+    request: Callable[[int], Awaitable[httpx.Response]],
+) -> dict[str, Any]:
+    """
+    Run request(0..count-1) with bounded concurrency and summarize
+    Failed requests are counted as errors only, a fast failure would
+    otherwise raise throughput and lower the latency percentiles.
+    """
+    latencies: list[float] = []
+    errors = 0
+    indices = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for i in indices:
+            start = time.perf_counter()
+            try:
+                response = await request(i)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(min(concurrency, count), 1))))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def run_workload(
+    client: httpx.AsyncClient,
+    idp: FakeIdentityProvider,
+    users: int,
+    items: int,
+    requests: int,
+    concurrency: int,
+    scenarios: list[str],
+) -> dict[str, dict]:
+    """Run the selected scenarios for one (users, items) combination"""
+    run_id = uuid.uuid4().hex[:8]
+    usernames = [f"bench-{run_id}-{i}" for i in range(users)]
+    results: dict[str, dict] = {}
+
+    async def register(i):
+        return await client.post(
+            "/register",
+            json={
+                "username": usernames[i],
+                "email": f"{usernames[i]}@example.com",
+                "password": PASSWORD,
+            },
+        )
+
+    async def login(i):
+        return await client.post(
+            "/login",
+            json={"username": usernames[i % users], "password": PASSWORD},
+        )
+
+    # Users and items are always created, but only timed when selected
+    results["register"] = await run_requests(users, concurrency, register)
+    headers = []
+    for username in usernames:
+        response = await client.post(
+            "/login", json={"username": username, "password": PASSWORD}
+        )
+        token = response.json()["access_token"]
+        headers.append({"Authorization": f"Bearer {token}"})
+
+    if "login" in scenarios:
+        results["login"] = await run_requests(requests, concurrency, login)
+
+    async def auth_me(i):
+        return await client.get("/auth/me", headers=headers[i % users])
+
+    if "auth_me" in scenarios:
+        results["auth_me"] = await run_requests(requests, concurrency, auth_me)
+
+    oidc_headers = [
+        {"Authorization": f"Bearer {idp.issue_token(f'oidc-{run_id}-{i}')}"}
+        for i in range(users)
+    ]
+
+    async def oidc_auth_me(i):
+        return await client.get("/auth/me", headers=oidc_headers[i % users])
+
+    if "oidc_auth_me" in scenarios:
+        results["oidc_auth_me"] = await run_requests(
+            requests, concurrency, oidc_auth_me
+        )
+
+    item_ids: list[list[int]] = [[] for _ in range(users)]
+
+    async def items_create(i):
+        user = i % users
+        response = await client.post(
+            "/items",
+            json={
+                "name": f"Item {i}",
+                "description": f"Benchmark item number {i}",
+                "price": float(i % 1000),
+            },
+            headers=headers[user],
+        )
+        if response.status_code == 200:
+            item_ids[user].append(response.json()["id"])
+        return response
+
+    results["items_create"] = await run_requests(
+        users * items, concurrency, items_create
+    )
+
+    async def items_list(i):
+        return await client.get("/items", headers=headers[i % users])
+
+    async def items_get(i):
+        user = i % users
+        ids = item_ids[user]
+        return await client.get(f"/items/{ids[i % len(ids)]}", headers=headers[user])
+
+    async def items_update(i):
+        user = i % users
+        ids = item_ids[user]
+        return await client.put(
+            f"/items/{ids[i % len(ids)]}",
+            json={"name": f"Updated {i}", "price": float(i % 1000)},
+            headers=headers[user],
+        )
+
+    flat_ids = [(user, item_id) for user, ids in enumerate(item_ids) for item_id in ids]
+
+    async def items_delete(i):
+        user, item_id = flat_ids[i]
+        return await client.delete(f"/items/{item_id}", headers=headers[user])
+
+    has_items = items > 0
+    for name, request, count in [
+        ("items_list", items_list, requests),
+        ("items_get", items_get, requests if has_items else 0),
+        ("items_update", items_update, requests if has_items else 0),
+        ("items_delete", items_delete, len(flat_ids)),
+    ]:
+        if name in scenarios and count:
+            results[name] = await run_requests(count, concurrency, request)
+
+    return {name: result for name, result in results.items() if name in scenarios}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not become ready")
+
+
+async def benchmark(args: argparse.Namespace) -> dict[str, dict]:
+    results: dict[str, dict] = {}
+    with FakeIdentityProvider() as idp:
+        if args.mode == "asgi":
+            client_factory, cleanup = _asgi_client(idp)
+        else:
+            client_factory, cleanup = _server_client(idp)
+        try:
+            async with client_factory() as client:
+                await wait_until_ready(client)
+                for users in args.users:
+                    for items in args.items:
+                        run = await run_workload(
+                            client,
+                            idp,
+                            users,
+                            items,
+                            args.requests,
+                            args.concurrency,
+                            args.scenarios,
+                        )
+                        for name, result in run.items():
+                            results[f"{name}[users={users},items={items}]"] = result
+        finally:
+            cleanup()
+    return results
+
+
+def _asgi_client(idp: FakeIdentityProvider):
+    import main
+    from oidc_config import OIDCProvider
+
+    oidc_enabled = main.OIDC_ENABLED
+    main.OIDC_ENABLED = True
+    # All benchmark requests come from one client, so disable throttling
+    rate_limiter = main.password_rate_limiter
+    main.password_rate_limiter = None
+    provider = OIDCProvider(
+        name="benchmark",
+        issuer=idp.issuer,
+        client_id=OIDC_CLIENT_ID,
+        algorithms=["RS256"],
+    )
+    main.oidc_config.add_provider(provider)
+
+    def client_factory():
+        return httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app), base_url="http://asgi"
+        )
+
+    def cleanup():
+        main.OIDC_ENABLED = oidc_enabled
+        main.password_rate_limiter = rate_limiter
+        main.oidc_config.providers.pop(provider.name, None)
+        main.oidc_config.jwks_cache.pop(provider.name, None)
+        main.oidc_config.jwks_cache_expiry.pop(provider.name, None)
+
+    return client_factory, cleanup
+
+
+def _server_client(idp: FakeIdentityProvider):
+    port = free_port()
+    env = {
+        **os.environ,
+        "OIDC_ENABLED": "true",
+        "OIDC_ISSUER": idp.issuer,
+        "OIDC_CLIENT_ID": OIDC_CLIENT_ID,
+        "PASSWORD_RATE_PER_SECOND": "0",
+    }
+    process = subprocess.Popen(  # noqa: S603
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=Path(__file__).parent,
+        env=env,
+    )
+
+    def client_factory():
+        return httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60.0)
+
+    def cleanup():
+        process.terminate()
+        process.wait(timeout=10)
+
+    return client_factory, cleanup
+
+
+def parse_sizes(value: str) -> list[int]:
+    return [int(size) for size in value.split(",")]
+
+
+def parse_scenarios(value: str) -> list[str]:
+    scenarios = [scenario.strip() for scenario in value.split(",")]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown scenarios: {sorted(unknown)}")
+    return scenarios
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=["asgi", "server"], default="asgi")
+    parser.add_argument("--users", type=parse_sizes, default=[10])
+    parser.add_argument("--items", type=parse_sizes, default=[100])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--scenarios", type=parse_scenarios, default=SCENARIOS)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Compare to a previous output")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Allowed relative regression in throughput and p95 latency",
+    )
+    args = parser.parse_args(argv)
+    baseline = None
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        # In-process and server latencies include different overheads
+        if baseline["meta"]["mode"] != args.mode:
+            parser.error(
+                f"baseline was run in {baseline['meta']['mode']} mode, not {args.mode}"
+            )
+
+    results = asyncio.run(benchmark(args))
+    report = {
+        "meta": {
+            "mode": args.mode,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+
+    for name, result in results.items():
+        print(
+            f"{name:<40} {result['throughput_rps']:>10.1f} rps "
+            f"p50 {result['p50_ms']:>8.2f} ms p95 {result['p95_ms']:>8.2f} ms "
+            f"p99 {result['p99_ms']:>8.2f} ms errors {result['errors']}"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if baseline is not None:
+        regressions = compare_results(results, baseline["results"], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
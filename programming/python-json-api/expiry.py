@@ -0,0 +1,147 @@
+import math
+import time
+from collections.abc import Hashable
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel of deadlines by key
+    Level 0 has one slot per tick, each higher level one slot per full turn
+    of the level below. Adding and cancelling a timer are O(1), and a timer
+    is moved down at most once per level before it fires. Deadlines beyond
+    the top level wait in an overflow set until the top level turns.
+    """
+
+    def __init__(
+        self,
+        tick: float = 1.0,
+        slots: int = 64,
+        levels: int = 4,
+        start: float | None = None,
+    ):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        # Last tick whose timers have fired
+        self.current = self._tick_of(time.time() if start is None else start)
+        self.wheels: list[list[set[Hashable]]] = [
+            [set() for _ in range(slots)] for _ in range(levels)
+        ]
+        self.overflow: set[Hashable] = set()
+        # key -> (deadline tick, level, slot), level -1 for the overflow
+        self.timers: dict[Hashable, tuple[int, int, int]] = {}
+
+    def _tick_of(self, timestamp: float) -> int:
+        return int(timestamp // self.tick)
+
+    def _place(self, key: Hashable, deadline: int):
+        delta = deadline - self.current
+        for level in range(self.levels):
+            if delta < self.slots ** (level + 1):
+                slot = (deadline // self.slots**level) % self.slots
+                self.wheels[level][slot].add(key)
+                self.timers[key] = (deadline, level, slot)
+                return
+        self.overflow.add(key)
+        self.timers[key] = (deadline, -1, -1)
+
+    def add(self, key: Hashable, expires_at: float):
+        """Schedule key to fire once the Unix timestamp expires_at has passed"""
+        self.remove(key)
+        # Timers already due fire on the next tick
+        self._place(key, max(math.ceil(expires_at / self.tick), self.current + 1))
+
+    def remove(self, key: Hashable) -> bool:
+        timer = self.timers.pop(key, None)
+        if timer is None:
+            return False
+        _, level, slot = timer
+        if level < 0:
+            self.overflow.discard(key)
+        else:
+            self.wheels[level][slot].discard(key)
+        return True
+
+    def _cascade(self, keys: set[Hashable]):
+        for key in list(keys):
+            deadline, _, _ = self.timers.pop(key)
+            self._place(key, deadline)
+        keys.clear()
+
+    def _next_event(self) -> int | None:
+        """Next tick at which a slot fires or cascades, None without timers"""
+        if not self.timers:
+            return None
+        after = self.current + 1
+        ticks = []
+        for level, wheel in enumerate(self.wheels):
+            span = self.slots**level
+            turn = span * self.slots
+            # A slot's timers all wait for the next time the wheel reaches it
+            ticks.extend(
+                after + (index * span - after) % turn
+                for index, slot in enumerate(wheel)
+                if slot
+            )
+        if self.overflow:
+            turn = self.slots**self.levels
+            ticks.append(after + -after % turn)
+        return min(ticks)
+
+    def advance(self, now: float | None = None) -> list[Hashable]:
+        """Move the wheel to now, returning the keys whose deadline passed"""
+        target = self._tick_of(time.time() if now is None else now)
+        fired = []
+        # Skip straight to ticks with work, idle stretches cost nothing
+        while (tick := self._next_event()) is not None and tick <= target:
+            self.current = tick
+            if tick % self.slots**self.levels == 0 and self.overflow:
+                overflow, self.overflow = self.overflow, set()
+                self._cascade(overflow)
+            # Higher levels first, they may refill a slot cascaded below
+            for level in range(self.levels - 1, 0, -1):
+                if tick % self.slots**level == 0:
+                    self._cascade(
+                        self.wheels[level][(tick // self.slots**level) % self.slots]
+                    )
+            slot = self.wheels[0][tick % self.slots]
+            for key in slot:
+                del self.timers[key]
+            fired.extend(slot)
+            slot.clear()
+        self.current = max(self.current, target)
+        return fired
+
+    def pending(self) -> list[Hashable]:
+        """
+        Keys that fire on the next tick
+        Deadlines are rounded up to a whole tick, so these may have expired
+        before the wheel fires them. Later timers cannot have.
+        """
+        tick = self.current + 1
+        keys: list[Hashable] = []
+        for level, wheel in enumerate(self.wheels):
+            span = self.slots**level
+            # Timers only wait on a higher level for a tick it cascades at
+            if tick % span:
+                return keys
+            slot = wheel[(tick // span) % self.slots]
+            keys.extend(key for key in slot if self.timers[key][0] == tick)
+        if tick % self.slots**self.levels == 0:
+            keys.extend(key for key in self.overflow if self.timers[key][0] == tick)
+        return keys
+
+    def __len__(self) -> int:
+        return len(self.timers)
+
+    def clear(self, start: float | None = None):
+        self.current = self._tick_of(time.time() if start is None else start)
+        for wheel in self.wheels:
+            for slot in wheel:
+                slot.clear()
+        self.overflow.clear()
+        self.timers.clear()
+
+
+# Global item expiry wheel instance
+item_expiry = TimingWheel()
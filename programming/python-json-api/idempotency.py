@@ -0,0 +1,137 @@
+import hashlib
+import hmac
+import secrets
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+
+from starlette.responses import Response
+
+from singleflight import SingleFlight
+
+# Recomputed for the replayed body
+EXCLUDED_HEADERS = {"content-length"}
+
+
+class IdempotencyKeyReused(Exception):
+    """An idempotency key was sent again with a different request"""
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status_code: int
+    body: bytes
+    headers: list[tuple[str, str]]
+    expires_at: float
+
+    def replay(self) -> Response:
+        response = Response(self.body, self.status_code)
+        for name, value in self.headers:
+            response.headers.append(name, value)
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+
+class IdempotencyCache:
+    """
+    Responses of writes stored by scope and Idempotency-Key
+    Each scope, usually a user, keeps at most max_keys responses for ttl
+    seconds, and the least recently written scopes are dropped beyond
+    max_scopes. Concurrent requests with the same key wait for the first one.
+    """
+
+    def __init__(
+        self, ttl: float = 86400, max_keys: int = 1000, max_scopes: int = 10000
+    ):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.max_scopes = max_scopes
+        self.scopes: OrderedDict[Hashable, OrderedDict[str, StoredResponse]] = (
+            OrderedDict()
+        )
+        self._flights = SingleFlight()
+        # Fingerprints cover request bodies, which may hold passwords
+        self._secret = secrets.token_bytes(32)
+
+    def digest(self, *parts: str | bytes) -> str:
+        mac = hmac.new(self._secret, digestmod=hashlib.sha256)
+        for part in parts:
+            part = part.encode() if isinstance(part, str) else part
+            mac.update(len(part).to_bytes(8, "little") + part)
+        return mac.hexdigest()
+
+    def _expire(self, scope: Hashable, now: float):
+        entries = self.scopes.get(scope)
+        if entries is None:
+            return
+        # Entries share one TTL, so insertion order is expiry order
+        while entries and next(iter(entries.values())).expires_at <= now:
+            entries.popitem(last=False)
+        if not entries:
+            del self.scopes[scope]
+
+    def get(self, scope: Hashable, key: str) -> StoredResponse | None:
+        self._expire(scope, time.time())
+        entries = self.scopes.get(scope)
+        return entries.get(key) if entries is not None else None
+
+    def put(self, scope: Hashable, key: str, stored: StoredResponse):
+        entries = self.scopes.setdefault(scope, OrderedDict())
+        self.scopes.move_to_end(scope)
+        entries[key] = stored
+        while len(entries) > self.max_keys:
+            entries.popitem(last=False)
+        # Sweep the least recently written scope and drop scopes beyond the cap
+        self._expire(next(iter(self.scopes)), time.time())
+        while len(self.scopes) > self.max_scopes:
+            self.scopes.popitem(last=False)
+
+    async def run(
+        self,
+        scope: Hashable,
+        key: str,
+        fingerprint: str,
+        fn: Callable[[], Awaitable[Response]],
+    ) -> tuple[Response, bool]:
+        """
+        Run fn once per scope and key, returning its response and whether it
+        was replayed from an earlier or concurrent request
+        """
+        response = None
+
+        async def execute() -> StoredResponse:
+            nonlocal response
+            # The request may have finished since the lookup below
+            stored = self.get(scope, key)
+            if stored is None:
+                response = await fn()
+                stored = StoredResponse(
+                    fingerprint,
+                    response.status_code,
+                    bytes(response.body),
+                    [
+                        (name, value)
+                        for name, value in response.headers.items()
+                        if name not in EXCLUDED_HEADERS
+                    ],
+                    time.time() + self.ttl,
+                )
+                self.put(scope, key, stored)
+            return stored
+
+        stored = self.get(scope, key)
+        if stored is None:
+            stored = await self._flights.do_async((scope, key), execute)
+        if stored.fingerprint != fingerprint:
+            raise IdempotencyKeyReused(key)
+        if response is not None:
+            return response, False
+        return stored.replay(), True
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.scopes.values())
+
+    def clear(self):
+        self.scopes.clear()
@@ -0,0 +1,108 @@
+from bisect import bisect_left, insort
+from typing import Any
+
+
+def _entry_key(entry: tuple[Any, int, Any]) -> tuple[Any, int]:
+    return entry[0], entry[1]
+
+
+class SortedKeyIndex:
+    """
+    Sorted list of (key, item_id, item) entries for a single owner
+    Lookups cost O(log n + k) where k is the number of matching entries
+    """
+
+    def __init__(self):
+        self.entries: list[tuple[Any, int, Any]] = []
+
+    def add(self, key: Any, item_id: int, item: Any):
+        # Entries are ordered by (key, item_id) only, items are never compared
+        insort(self.entries, (key, item_id, item), key=_entry_key)
+
+    def remove(self, key: Any, item_id: int):
+        index = bisect_left(self.entries, (key, item_id), key=_entry_key)
+        if index < len(self.entries) and _entry_key(self.entries[index]) == (
+            key,
+            item_id,
+        ):
+            self.entries.pop(index)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class ItemIndex:
+    """Per-owner price and name indexes for item queries"""
+
+    def __init__(self):
+        self.by_price: dict[int, SortedKeyIndex] = {}
+        self.by_name: dict[int, SortedKeyIndex] = {}
+
+    @staticmethod
+    def _name_key(name: str) -> str:
+        return name.casefold()
+
+    def add(self, item: Any):
+        for indexes, key in (
+            (self.by_price, item.price),
+            (self.by_name, self._name_key(item.name)),
+        ):
+            index = indexes.get(item.owner_id)
+            if index is None:
+                index = indexes[item.owner_id] = SortedKeyIndex()
+            index.add(key, item.id, item)
+
+    def remove(self, item: Any):
+        for indexes, key in (
+            (self.by_price, item.price),
+            (self.by_name, self._name_key(item.name)),
+        ):
+            index = indexes.get(item.owner_id)
+            if index is None:
+                continue
+            index.remove(key, item.id)
+            if not index:
+                del indexes[item.owner_id]
+
+    def clear(self):
+        self.by_price.clear()
+        self.by_name.clear()
+
+    def price_range(
+        self,
+        owner_id: int,
+        min_price: float | None = None,
+        max_price: float | None = None,
+    ):
+        """Yield the owner's items with min_price <= price <= max_price by price"""
+        index = self.by_price.get(owner_id)
+        if index is None:
+            return
+        entries = index.entries
+        start = (
+            0
+            if min_price is None
+            else bisect_left(entries, (min_price,), key=_entry_key)
+        )
+        for i in range(start, len(entries)):
+            price, _, item = entries[i]
+            if max_price is not None and price > max_price:
+                break
+            yield item
+
+    def name_prefix(self, owner_id: int, prefix: str):
+        """Yield the owner's items whose name starts with prefix by name"""
+        index = self.by_name.get(owner_id)
+        if index is None:
+            return
+        key = self._name_key(prefix)
+        entries = index.entries
+        for i in range(bisect_left(entries, (key,), key=_entry_key), len(entries)):
+            name, _, item = entries[i]
+            if not name.startswith(key):
+                break
+            yield item
+
+
+# Global item index instance
+item_index = ItemIndex()
@@ -0,0 +1,252 @@
+import hashlib
+from bisect import bisect, insort
+from collections.abc import Hashable, Iterable
+from typing import Any
+
+from metrics import SHARD_REQUEST_DURATION, SHARD_REQUESTS
+
+
+class ShardUnavailable(Exception):
+    """A store node could not be reached or failed"""
+
+    def __init__(self, node: str):
+        super().__init__(f"Item store node {node} is unavailable")
+        self.node = node
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(value.encode(), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """
+    Consistent hashing of keys onto nodes
+    Each node owns vnodes points on the ring, and a key belongs to the node
+    of the first point at or after its hash. Adding a node moves only the
+    keys that fall to its points, about 1/N of them.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 128):
+        self.vnodes = vnodes
+        self.points: list[tuple[int, str]] = []
+        self.nodes: list[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for replica in range(self.vnodes):
+            insort(self.points, (_hash(f"{node}#{replica}"), node))
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        self.points = [point for point in self.points if point[1] != node]
+
+    def node_for(self, key: Hashable) -> str:
+        if not self.points:
+            raise LookupError("Hash ring has no nodes")
+        index = bisect(self.points, (_hash(str(key)), ""))
+        return self.points[index % len(self.points)][1]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+
+class ShardedItemStore:
+    """
+    Items by owner on the store nodes picked by a hash ring
+    Requests go over one pooled HTTP client, which keeps connections to every
+    node alive. Items are plain dicts as the nodes store them.
+
+    While a rebalance runs, previous_nodes is the ring it moves owners from.
+    An owner that hashes to another node there is read from that node first,
+    then from its new one, so its items are found before, during and after
+    its move.
+    """
+
+    def __init__(
+        self,
+        nodes: Iterable[str],
+        vnodes: int = 128,
+        token: str | None = None,
+        timeout: float = 5.0,
+        max_connections: int = 100,
+        previous_nodes: Iterable[str] = (),
+    ):
+        self.ring = HashRing((node.rstrip("/") for node in nodes), vnodes)
+        self.previous_ring = HashRing(
+            (node.rstrip("/") for node in previous_nodes), vnodes
+        )
+        self.token = token
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+
+    @property
+    def client(self):
+        # Created on first use, inside the event loop that serves requests
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                headers={"X-Shard-Token": self.token} if self.token else {},
+            )
+        return self._client
+
+    def previous_node(self, owner: Hashable) -> str | None:
+        """Node an owner may not have been moved from yet, if any"""
+        if not self.previous_ring:
+            return None
+        node = self.previous_ring.node_for(owner)
+        return None if node == self.ring.node_for(owner) else node
+
+    async def request(
+        self,
+        owner: Hashable,
+        method: str,
+        path: str = "",
+        node: str | None = None,
+        **kwargs,
+    ):
+        """Request to node, by default the one owning owner, None for a 404"""
+        import httpx
+
+        node = node or self.ring.node_for(owner)
+        try:
+            with SHARD_REQUEST_DURATION.time(node):
+                response = await self.client.request(
+                    method, f"{node}/owners/{owner}/items{path}", **kwargs
+                )
+        except httpx.HTTPError as exc:
+            SHARD_REQUESTS.inc(node, "error")
+            raise ShardUnavailable(node) from exc
+        if response.status_code == 404:
+            SHARD_REQUESTS.inc(node, "not_found")
+            return None
+        if response.status_code == 409:
+            # The owner is being moved to another node, retried after the move
+            SHARD_REQUESTS.inc(node, "fenced")
+            raise ShardUnavailable(node)
+        if response.is_error:
+            SHARD_REQUESTS.inc(node, "error")
+            raise ShardUnavailable(node)
+        SHARD_REQUESTS.inc(node, "success")
+        return response.json()
+
+    async def _request_moving(self, owner: Hashable, method: str, path: str, **kwargs):
+        """
+        Request to an owner's previous node and, on a 404 there, its node
+        A move imports the owner's items before it drops them from the
+        previous node, so an item missing there is on the new node already.
+        Writes to both are refused while the owner moves.
+        """
+        previous = self.previous_node(owner)
+        if previous is not None:
+            result = await self.request(owner, method, path, previous, **kwargs)
+            if result is not None:
+                return result
+        return await self.request(owner, method, path, **kwargs)
+
+    async def items(self, owner: Hashable) -> list[dict]:
+        previous = self.previous_node(owner)
+        if previous is None:
+            return await self.request(owner, "GET")
+        items = await self.request(owner, "GET", node=previous)
+        # Imported items are on both nodes until the previous one drops them
+        ids = {item["id"] for item in items}
+        moved = await self.request(owner, "GET")
+        return items + [item for item in moved if item["id"] not in ids]
+
+    async def get(self, owner: Hashable, item_id: int) -> dict | None:
+        return await self._request_moving(owner, "GET", f"/{item_id}")
+
+    async def create(self, owner: Hashable, data: dict) -> dict:
+        """Store a new item, the node assigns its id"""
+        return await self.request(owner, "POST", json=data)
+
+    async def replace(self, owner: Hashable, item_id: int, data: dict) -> dict | None:
+        return await self._request_moving(owner, "PUT", f"/{item_id}", json=data)
+
+    async def delete(self, owner: Hashable, item_id: int) -> dict | None:
+        return await self._request_moving(owner, "DELETE", f"/{item_id}")
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async def _move_owner(client, owner: str, node: str, target: str) -> int:
+    """Move an owner's items from node to target, returning how many moved"""
+    fences = [f"{node}/owners/{owner}/fence", f"{target}/owners/{owner}/fence"]
+    # Both nodes refuse the owner's writes until the move is done, so no write
+    # lands on the old node after the export, and no delete on the new node
+    # is undone by the import
+    for fence in fences:
+        response = await client.put(fence)
+        response.raise_for_status()
+    try:
+        response = await client.get(f"{node}/owners/{owner}/items/export")
+        response.raise_for_status()
+        items: list[Any] = response.json()
+        response = await client.post(
+            f"{target}/owners/{owner}/items/import", json=items
+        )
+        response.raise_for_status()
+        response = await client.delete(f"{node}/owners/{owner}")
+        response.raise_for_status()
+    finally:
+        for fence in fences:
+            await client.delete(fence)
+    return len(items)
+
+
+async def rebalance(
+    nodes: Iterable[str],
+    new_nodes: Iterable[str],
+    vnodes: int = 128,
+    token: str | None = None,
+) -> dict[str, int]:
+    """
+    Move every owner whose node differs between two rings, returning the
+    number of owners and items moved
+    Owners are merged into their new node, where items written after the API
+    switched to the new ring win, and then dropped from the old one. Writes
+    to an owner answer 503 while it moves.
+    """
+    import httpx
+
+    nodes = [node.rstrip("/") for node in nodes]
+    ring = HashRing((node.rstrip("/") for node in new_nodes), vnodes)
+    headers = {"X-Shard-Token": token} if token else {}
+    moved = {"owners": 0, "items": 0}
+    async with httpx.AsyncClient(headers=headers, timeout=60.0) as client:
+        # Fences are held only while a rebalance runs, release those left by
+        # an interrupted one
+        for node in dict.fromkeys([*nodes, *ring.nodes]):
+            response = await client.get(f"{node}/fences")
+            response.raise_for_status()
+            for owner in response.json():
+                response = await client.delete(f"{node}/owners/{owner}/fence")
+                response.raise_for_status()
+        for node in nodes:
+            response = await client.get(f"{node}/owners")
+            response.raise_for_status()
+            for owner in response.json():
+                target = ring.node_for(owner)
+                if target == node:
+                    continue
+                moved["items"] += await _move_owner(client, owner, node, target)
+                moved["owners"] += 1
+    return moved
@@ -0,0 +1,124 @@
+import math
+from bisect import bisect_left, insort
+
+
+class OwnerStats:
+    """Running price aggregates for the items of a single owner"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        # Welford's running mean and sum of squared deviations, a running
+        # sum of squares loses the variance to cancellation for close prices
+        self.mean = 0.0
+        self.m2 = 0.0
+        # Sorted prices give O(1) min/max and O(log n) histogram bins
+        self.prices: list[float] = []
+
+    def add(self, price: float):
+        self.count += 1
+        self.total += price
+        delta = price - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (price - self.mean)
+        insort(self.prices, price)
+
+    def remove(self, price: float):
+        index = bisect_left(self.prices, price)
+        if index == len(self.prices) or self.prices[index] != price:
+            return
+        self.prices.pop(index)
+        self.count -= 1
+        if self.count == 0:
+            # Reset to avoid accumulating floating point drift
+            self.total = 0.0
+            self.mean = 0.0
+            self.m2 = 0.0
+        else:
+            self.total -= price
+            # Welford's update run backwards
+            mean = self.mean
+            self.mean -= (price - mean) / self.count
+            self.m2 -= (price - mean) * (price - self.mean)
+
+    def stddev(self) -> float:
+        """Population standard deviation of the prices"""
+        if self.count < 2 or self.prices[0] == self.prices[-1]:
+            return 0.0
+        variance = self.m2 / self.count
+        if variance <= 0.0:
+            # Removals left m2 rounded below the true spread, recompute it
+            self.m2 = math.fsum((price - self.mean) ** 2 for price in self.prices)
+            variance = self.m2 / self.count
+        return math.sqrt(variance)
+
+    def histogram(self, bins: int) -> list[dict]:
+        if not self.prices:
+            return []
+
+        low, high = self.prices[0], self.prices[-1]
+        width = (high - low) / bins
+        histogram = []
+        start = 0
+        for i in range(bins):
+            lower = low + i * width
+            upper = high if i == bins - 1 else low + (i + 1) * width
+            # The last bin is closed so that the maximum price is counted
+            if i == bins - 1:
+                end = len(self.prices)
+            else:
+                end = bisect_left(self.prices, upper, lo=start)
+            histogram.append({"lower": lower, "upper": upper, "count": end - start})
+            start = end
+        return histogram
+
+
+class ItemStats:
+    """Per-owner item statistics kept up to date on every item mutation"""
+
+    def __init__(self):
+        self.owners: dict[int, OwnerStats] = {}
+
+    def add(self, owner_id: int, price: float):
+        stats = self.owners.get(owner_id)
+        if stats is None:
+            stats = self.owners[owner_id] = OwnerStats()
+        stats.add(price)
+
+    def remove(self, owner_id: int, price: float):
+        stats = self.owners.get(owner_id)
+        if stats is None:
+            return
+        stats.remove(price)
+        if stats.count == 0:
+            del self.owners[owner_id]
+
+    def clear(self):
+        self.owners.clear()
+
+    def summary(self, owner_id: int, bins: int = 10) -> dict:
+        stats = self.owners.get(owner_id)
+        if stats is None or stats.count == 0:
+            return {
+                "count": 0,
+                "total_price": 0.0,
+                "min_price": None,
+                "max_price": None,
+                "mean_price": None,
+                "stddev_price": None,
+                "histogram": [],
+            }
+
+        return {
+            "count": stats.count,
+            "total_price": stats.total,
+            "min_price": stats.prices[0],
+            "max_price": stats.prices[-1],
+            "mean_price": stats.mean,
+            "stddev_price": stats.stddev(),
+            "histogram": stats.histogram(bins),
+        }
+
+
+# Global item statistics instance
+item_stats = ItemStats()
@@ -0,0 +1,136 @@
+import sys
+import weakref
+from collections.abc import Hashable, Iterable, Iterator
+from typing import Any
+
+
+class Snapshot:
+    """Point-in-time, read-only view of the items of some or all owners"""
+
+    def __init__(self, partitions: dict[Hashable, dict[int, Any]]):
+        self.partitions = partitions
+
+    def items(self, owner: Hashable) -> list:
+        return list(self.partitions.get(owner, {}).values())
+
+    def get(self, item_id: int) -> Any | None:
+        for partition in self.partitions.values():
+            item = partition.get(item_id)
+            if item is not None:
+                return item
+        return None
+
+    def __iter__(self) -> Iterator:
+        for partition in self.partitions.values():
+            yield from partition.values()
+
+    def __len__(self) -> int:
+        return sum(len(partition) for partition in self.partitions.values())
+
+
+class ItemStore:
+    """
+    Items by owner with copy-on-write snapshots
+    Each owner's items live in their own partition. A snapshot shares the
+    partitions instead of copying them, and the first write to a partition
+    that a live snapshot still references copies it, so readers holding a
+    snapshot never block or observe writers. Without live snapshots writes
+    are in place.
+    """
+
+    def __init__(self):
+        self.partitions: dict[Hashable, dict[int, Any]] = {}
+        # item id -> owner, for lookups by id alone
+        self.owners: dict[int, Hashable] = {}
+        # Owners whose partition no snapshot has seen yet
+        self._private: set[Hashable] = set()
+        self._snapshots: weakref.WeakSet[Snapshot] = weakref.WeakSet()
+
+    def snapshot(self, owner: Hashable | None = None) -> Snapshot:
+        """
+        Snapshot of one owner's items in O(1), or of all items in O(owners)
+        """
+        if owner is None:
+            snapshot = Snapshot(dict(self.partitions))
+            self._private = set()
+        else:
+            partition = self.partitions.get(owner)
+            snapshot = Snapshot({} if partition is None else {owner: partition})
+            self._private.discard(owner)
+        self._snapshots.add(snapshot)
+        return snapshot
+
+    def _writable(self, owner: Hashable) -> dict[int, Any]:
+        partition = self.partitions.get(owner)
+        if partition is None:
+            partition = self.partitions[owner] = {}
+        elif owner not in self._private and self._snapshots:
+            partition = self.partitions[owner] = dict(partition)
+        self._private.add(owner)
+        return partition
+
+    def get(self, item_id: int) -> Any | None:
+        owner = self.owners.get(item_id)
+        if owner is None:
+            return None
+        return self.partitions[owner].get(item_id)
+
+    def add(self, item: Any):
+        """Add an item, or replace the stored item with the same id"""
+        self._writable(item.owner_id)[item.id] = item
+        self.owners[item.id] = item.owner_id
+
+    def remove(self, item_id: int) -> Any | None:
+        owner = self.owners.pop(item_id, None)
+        if owner is None:
+            return None
+        partition = self._writable(owner)
+        item = partition.pop(item_id)
+        if not partition:
+            del self.partitions[owner]
+            self._private.discard(owner)
+        return item
+
+    def remove_many(self, item_ids: Iterable[int]) -> list:
+        """Remove items by id, returning those that were stored"""
+        removed = (self.remove(item_id) for item_id in item_ids)
+        return [item for item in removed if item is not None]
+
+    def snapshot_usage(self) -> dict:
+        """
+        Live snapshots, and the partitions and items only they still
+        reference, with their approximate bytes
+        """
+        snapshots = list(self._snapshots)
+        partitions = {}
+        for snapshot in snapshots:
+            for owner, partition in snapshot.partitions.items():
+                if partition is not self.partitions.get(owner):
+                    partitions[id(partition)] = (owner, partition)
+        items = 0
+        size = 0
+        for owner, partition in partitions.values():
+            live = self.partitions.get(owner, {})
+            size += sys.getsizeof(partition)
+            for item_id, item in partition.items():
+                if live.get(item_id) is not item:
+                    items += 1
+                    size += sys.getsizeof(item) + sys.getsizeof(vars(item))
+        return {
+            "snapshots": len(snapshots),
+            "retained_partitions": len(partitions),
+            "retained_items": items,
+            "retained_bytes": size,
+        }
+
+    def __iter__(self) -> Iterator:
+        # Iterating a snapshot keeps loops safe across concurrent writes
+        return iter(self.snapshot())
+
+    def __len__(self) -> int:
+        return len(self.owners)
+
+    def clear(self):
+        self.partitions.clear()
+        self.owners.clear()
+        self._private.clear()
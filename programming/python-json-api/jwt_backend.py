@@ -0,0 +1,474 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from calendar import timegm
+from collections.abc import Iterable, Mapping
+from datetime import datetime
+from functools import cache
+from types import SimpleNamespace
+from typing import Any
+
+
+class JWTError(Exception):
+    """Token is malformed or its signature does not verify"""
+
+
+class ExpiredSignatureError(JWTError):
+    """Token is past its exp claim"""
+
+
+class JWTClaimsError(JWTError):
+    """Token has a claim that fails validation"""
+
+
+class JWTBackend(ABC):
+    """
+    Signs and verifies compact JWS tokens
+    Backends accept and reject the same tokens and raise the exceptions of
+    this module, so callers do not depend on the implementation.
+    """
+
+    name: str
+
+    @abstractmethod
+    def encode(
+        self,
+        claims: dict[str, Any],
+        key: Any,
+        algorithm: str = "HS256",
+        headers: dict[str, Any] | None = None,
+    ) -> str: ...
+
+    @abstractmethod
+    def decode(
+        self,
+        token: str,
+        key: Any,
+        algorithms: str | Iterable[str] | None = None,
+        audience: str | None = None,
+        issuer: str | Iterable[str] | None = None,
+    ) -> dict[str, Any]: ...
+
+    @abstractmethod
+    def get_unverified_header(self, token: str) -> dict[str, Any]: ...
+
+    @abstractmethod
+    def get_unverified_claims(self, token: str) -> dict[str, Any]: ...
+
+
+@cache
+def _jose() -> SimpleNamespace:
+    """python-jose, imported on first use of the jose backend"""
+    from jose import exceptions, jwt
+
+    return SimpleNamespace(jwt=jwt, errors=exceptions)
+
+
+class JoseBackend(JWTBackend):
+    """python-jose, which parses the key again for every token"""
+
+    name = "jose"
+
+    @property
+    def _jwt(self):
+        return _jose().jwt
+
+    @property
+    def _errors(self):
+        return _jose().errors
+
+    def encode(self, claims, key, algorithm="HS256", headers=None):
+        try:
+            return self._jwt.encode(
+                dict(claims), key, algorithm=algorithm, headers=headers
+            )
+        except self._errors.JOSEError as e:
+            raise JWTError(str(e)) from e
+
+    def decode(self, token, key, algorithms=None, audience=None, issuer=None):
+        try:
+            return self._jwt.decode(
+                token, key, algorithms=algorithms, audience=audience, issuer=issuer
+            )
+        except self._errors.ExpiredSignatureError as e:
+            raise ExpiredSignatureError(str(e)) from e
+        except self._errors.JWTClaimsError as e:
+            raise JWTClaimsError(str(e)) from e
+        except self._errors.JOSEError as e:
+            raise JWTError(str(e)) from e
+        except (TypeError, ValueError) as e:
+            # Raised by python-jose for claims such as a null exp
+            raise JWTClaimsError(str(e)) from e
+
+    def get_unverified_header(self, token):
+        try:
+            return self._jwt.get_unverified_header(token)
+        except self._errors.JOSEError as e:
+            raise JWTError(str(e)) from e
+
+    def get_unverified_claims(self, token):
+        try:
+            return self._jwt.get_unverified_claims(token)
+        except self._errors.JOSEError as e:
+            raise JWTError(str(e)) from e
+
+
+_HMAC_HASHES = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+_RSA_HASHES = {"RS256": "SHA256", "RS384": "SHA384", "RS512": "SHA512"}
+# Curve, hash and size in bytes of each half of the raw R || S signature
+_EC_ALGORITHMS = {
+    "ES256": ("SECP256R1", "SHA256", 32),
+    "ES384": ("SECP384R1", "SHA384", 48),
+    "ES512": ("SECP521R1", "SHA512", 66),
+}
+_EC_CURVES = {"P-256": "SECP256R1", "P-384": "SECP384R1", "P-521": "SECP521R1"}
+_PEM_MARKERS = (
+    b"-----BEGIN PUBLIC KEY-----",
+    b"-----BEGIN RSA PUBLIC KEY-----",
+    b"-----BEGIN CERTIFICATE-----",
+    b"ssh-rsa",
+)
+
+
+@cache
+def _primitives() -> SimpleNamespace:
+    """cryptography's public key primitives, imported on first RSA or EC use"""
+    from cryptography import x509
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+    from cryptography.hazmat.primitives.asymmetric.utils import (
+        decode_dss_signature,
+        encode_dss_signature,
+    )
+
+    return SimpleNamespace(
+        x509=x509,
+        InvalidSignature=InvalidSignature,
+        hashes=hashes,
+        serialization=serialization,
+        ec=ec,
+        padding=padding,
+        rsa=rsa,
+        decode_dss_signature=decode_dss_signature,
+        encode_dss_signature=encode_dss_signature,
+    )
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data: bytes | str) -> bytes:
+    if isinstance(data, str):
+        data = data.encode("ascii")
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+def _b64int(data: str) -> int:
+    return int.from_bytes(_b64decode(data), "big")
+
+
+def _json_object(data: bytes, part: str) -> dict[str, Any]:
+    try:
+        value = json.loads(data.decode("utf-8"))
+    except ValueError as e:
+        raise JWTError(f"Invalid {part} string: {e}") from None
+    if not isinstance(value, Mapping):
+        raise JWTError(f"Invalid {part} string: must be a json object")
+    return value
+
+
+def _numeric_date(claims: Mapping[str, Any], name: str, label: str) -> int:
+    try:
+        return int(claims[name])
+    except (TypeError, ValueError):
+        raise JWTClaimsError(f"{label} claim ({name}) must be an integer.") from None
+
+
+def _validate_claims(
+    claims: Mapping[str, Any],
+    audience: str | None,
+    issuer: str | Iterable[str] | None,
+):
+    """Validate registered claims the way python-jose does by default"""
+    now = int(time.time())
+    if "iat" in claims:
+        _numeric_date(claims, "iat", "Issued At")
+    if "nbf" in claims and _numeric_date(claims, "nbf", "Not Before") > now:
+        raise JWTClaimsError("The token is not yet valid (nbf)")
+    if "exp" in claims and _numeric_date(claims, "exp", "Expiration Time") < now:
+        raise ExpiredSignatureError("Signature has expired.")
+
+    if "aud" in claims:
+        audiences = claims["aud"]
+        if isinstance(audiences, str):
+            audiences = [audiences]
+        if not isinstance(audiences, list) or not all(
+            isinstance(aud, str) for aud in audiences
+        ):
+            raise JWTClaimsError("Invalid claim format in token")
+        if audience not in audiences:
+            raise JWTClaimsError("Invalid audience")
+
+    if issuer is not None:
+        if isinstance(issuer, str):
+            issuer = (issuer,)
+        if claims.get("iss") not in issuer:
+            raise JWTClaimsError("Invalid issuer")
+
+    if "sub" in claims and not isinstance(claims["sub"], str):
+        raise JWTClaimsError("Subject must be a string.")
+    if "jti" in claims and not isinstance(claims["jti"], str):
+        raise JWTClaimsError("JWT ID must be a string.")
+    if "at_hash" in claims:
+        raise JWTClaimsError(
+            "No access_token provided to compare against at_hash claim."
+        )
+
+
+class CryptographyBackend(JWTBackend):
+    """
+    JWS built directly on hmac and cryptography
+    Parsed keys are cached, so verifying against the same PEM or JWK does
+    not rebuild the key object for every token.
+    """
+
+    name = "cryptography"
+
+    def __init__(self, key_cache_size: int = 256):
+        self.key_cache_size = key_cache_size
+        self._keys: dict[tuple, Any] = {}
+
+    def _load_key(self, key: Any, algorithm: str, private: bool) -> Any:
+        if isinstance(key, str):
+            cache_key = (algorithm, private, key)
+        elif isinstance(key, bytes | Mapping):
+            cache_key = (
+                algorithm,
+                private,
+                key if isinstance(key, bytes) else json.dumps(key, sort_keys=True),
+            )
+        else:
+            # Already a cryptography key object
+            return key
+        loaded = self._keys.get(cache_key)
+        if loaded is None:
+            loaded = self._parse_key(key, algorithm, private)
+            if len(self._keys) >= self.key_cache_size:
+                self._keys.clear()
+            self._keys[cache_key] = loaded
+        return loaded
+
+    def _parse_key(self, key: Any, algorithm: str, private: bool) -> Any:
+        if algorithm in _HMAC_HASHES:
+            if isinstance(key, Mapping):
+                if key.get("kty") != "oct":
+                    raise JWTError("Incorrect key type for HMAC")
+                return _b64decode(key["k"])
+            secret = key.encode("utf-8") if isinstance(key, str) else key
+            if any(marker in secret for marker in _PEM_MARKERS):
+                raise JWTError(
+                    "The specified key is an asymmetric key or x509 certificate "
+                    "and should not be used as an HMAC secret."
+                )
+            return secret
+
+        if isinstance(key, Mapping):
+            return self._parse_jwk(key, algorithm, private)
+        c = _primitives()
+        pem = key.encode("utf-8") if isinstance(key, str) else key
+        if pem.startswith(b"-----BEGIN CERTIFICATE-----"):
+            return c.x509.load_pem_x509_certificate(pem).public_key()
+        try:
+            return c.serialization.load_pem_public_key(pem)
+        except ValueError:
+            loaded = c.serialization.load_pem_private_key(pem, password=None)
+            return loaded if private else loaded.public_key()
+
+    def _parse_jwk(self, jwk: Mapping[str, Any], algorithm: str, private: bool):
+        c = _primitives()
+        rsa, ec = c.rsa, c.ec
+        kty = jwk.get("kty")
+        if algorithm in _RSA_HASHES and kty == "RSA":
+            public_numbers = rsa.RSAPublicNumbers(_b64int(jwk["e"]), _b64int(jwk["n"]))
+            if not private:
+                return public_numbers.public_key()
+            d = _b64int(jwk["d"])
+            if "p" in jwk:
+                p, q = _b64int(jwk["p"]), _b64int(jwk["q"])
+            else:
+                p, q = rsa.rsa_recover_prime_factors(
+                    public_numbers.n, public_numbers.e, d
+                )
+            return rsa.RSAPrivateNumbers(
+                p,
+                q,
+                d,
+                rsa.rsa_crt_dmp1(d, p),
+                rsa.rsa_crt_dmq1(d, q),
+                rsa.rsa_crt_iqmp(p, q),
+                public_numbers,
+            ).private_key()
+        if algorithm in _EC_ALGORITHMS and kty == "EC":
+            curve = getattr(ec, _EC_CURVES[jwk["crv"]])()
+            public_numbers = ec.EllipticCurvePublicNumbers(
+                _b64int(jwk["x"]), _b64int(jwk["y"]), curve
+            )
+            if not private:
+                return public_numbers.public_key()
+            return ec.EllipticCurvePrivateNumbers(
+                _b64int(jwk["d"]), public_numbers
+            ).private_key()
+        raise JWTError(f"Incorrect key type {kty} for {algorithm}")
+
+    def _sign(self, signing_input: bytes, key: Any, algorithm: str) -> bytes:
+        key = self._load_key(key, algorithm, private=True)
+        if algorithm in _HMAC_HASHES:
+            return hmac.new(key, signing_input, _HMAC_HASHES[algorithm]).digest()
+        c = _primitives()
+        if algorithm in _RSA_HASHES:
+            hash_type = getattr(c.hashes, _RSA_HASHES[algorithm])
+            return key.sign(signing_input, c.padding.PKCS1v15(), hash_type())
+        _, hash_name, size = _EC_ALGORITHMS[algorithm]
+        hash_type = getattr(c.hashes, hash_name)
+        r, s = c.decode_dss_signature(key.sign(signing_input, c.ec.ECDSA(hash_type())))
+        return r.to_bytes(size, "big") + s.to_bytes(size, "big")
+
+    def _verify(
+        self, signing_input: bytes, signature: bytes, key: Any, algorithm: str
+    ) -> bool:
+        key = self._load_key(key, algorithm, private=False)
+        if algorithm in _HMAC_HASHES:
+            expected = hmac.new(key, signing_input, _HMAC_HASHES[algorithm]).digest()
+            return hmac.compare_digest(expected, signature)
+        c = _primitives()
+        try:
+            if algorithm in _RSA_HASHES:
+                hash_type = getattr(c.hashes, _RSA_HASHES[algorithm])
+                key.verify(signature, signing_input, c.padding.PKCS1v15(), hash_type())
+            else:
+                _, hash_name, size = _EC_ALGORITHMS[algorithm]
+                if len(signature) != 2 * size:
+                    return False
+                r = int.from_bytes(signature[:size], "big")
+                s = int.from_bytes(signature[size:], "big")
+                hash_type = getattr(c.hashes, hash_name)
+                key.verify(
+                    c.encode_dss_signature(r, s),
+                    signing_input,
+                    c.ec.ECDSA(hash_type()),
+                )
+        except c.InvalidSignature:
+            return False
+        return True
+
+    def encode(self, claims, key, algorithm="HS256", headers=None):
+        if not (
+            algorithm in _HMAC_HASHES
+            or algorithm in _RSA_HASHES
+            or algorithm in _EC_ALGORITHMS
+        ):
+            raise JWTError(f"Algorithm {algorithm} not supported.")
+        claims = dict(claims)
+        for name in ("exp", "iat", "nbf"):
+            if isinstance(claims.get(name), datetime):
+                claims[name] = timegm(claims[name].utctimetuple())
+        header = {"typ": "JWT", "alg": algorithm}
+        if headers:
+            header.update(headers)
+        signing_input = b".".join(
+            (
+                _b64encode(
+                    json.dumps(header, separators=(",", ":"), sort_keys=True).encode()
+                ),
+                _b64encode(json.dumps(claims, separators=(",", ":")).encode()),
+            )
+        )
+        try:
+            signature = self._sign(signing_input, key, algorithm)
+        except (TypeError, ValueError, KeyError) as e:
+            raise JWTError(str(e)) from e
+        return (signing_input + b"." + _b64encode(signature)).decode("ascii")
+
+    def _split(self, token: str) -> tuple[bytes, dict[str, Any], bytes, bytes]:
+        if isinstance(token, str):
+            token = token.encode("utf-8")
+        try:
+            signing_input, signature = token.rsplit(b".", 1)
+            header_segment, claims_segment = signing_input.split(b".", 1)
+            header = _json_object(_b64decode(header_segment), "header")
+            payload = _b64decode(claims_segment)
+            signature = _b64decode(signature)
+        except ValueError:
+            raise JWTError("Not enough segments") from None
+        except (TypeError, binascii.Error):
+            raise JWTError("Invalid padding") from None
+        return signing_input, header, payload, signature
+
+    def decode(self, token, key, algorithms=None, audience=None, issuer=None):
+        signing_input, header, payload, signature = self._split(token)
+
+        algorithm = header.get("alg")
+        if not algorithm:
+            raise JWTError("No algorithm was specified in the JWS header.")
+        if algorithms is not None and algorithm not in algorithms:
+            raise JWTError("The specified alg value is not allowed")
+        if not (
+            algorithm in _HMAC_HASHES
+            or algorithm in _RSA_HASHES
+            or algorithm in _EC_ALGORITHMS
+        ):
+            raise JWTError(f"Invalid or unsupported algorithm: {algorithm}")
+
+        if isinstance(key, Mapping) and "keys" in key:
+            keys = key["keys"]
+        elif isinstance(key, list | tuple):
+            keys = key
+        else:
+            keys = (key,)
+        for candidate in keys:
+            try:
+                if self._verify(signing_input, signature, candidate, algorithm):
+                    break
+            except (JWTError, TypeError, ValueError, KeyError):
+                continue
+        else:
+            raise JWTError("Signature verification failed.")
+
+        claims = _json_object(payload, "payload")
+        _validate_claims(claims, audience, issuer)
+        return claims
+
+    def get_unverified_header(self, token):
+        return self._split(token)[1]
+
+    def get_unverified_claims(self, token):
+        return _json_object(self._split(token)[2], "payload")
+
+
+BACKENDS: dict[str, type[JWTBackend]] = {
+    JoseBackend.name: JoseBackend,
+    CryptographyBackend.name: CryptographyBackend,
+}
+
+
+def get_backend(name: str) -> JWTBackend:
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown JWT backend: {name}") from None
+
+
+# Backend used for every token the API signs or verifies, python-jose stays
+# the default until the cryptography backend has been proven in production
+jwt = get_backend(os.getenv("JWT_BACKEND", "jose"))
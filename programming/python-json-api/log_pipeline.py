@@ -0,0 +1,192 @@
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import TextIO
+
+from metrics import LOG_MESSAGES_DROPPED, LOG_MESSAGES_SUPPRESSED
+
+# Attributes every LogRecord has, any others were passed in extra
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the fields passed in extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (name, value)
+            for name, value in vars(record).items()
+            if name not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Passes at most burst records per logger, level and message template in
+    each interval, for records at or above level
+    The first record passed after a suppressed run carries how many were
+    suppressed. Templates rather than formatted messages are compared, so
+    errors that differ only in their arguments count as repeats.
+    """
+
+    def __init__(
+        self,
+        burst: int = 5,
+        interval: float = 60.0,
+        level: int = logging.WARNING,
+        max_keys: int = 1024,
+    ):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.level = level
+        self.max_keys = max_keys
+        # key -> [window start, records passed, records suppressed]
+        self.windows: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if window is None and len(self.windows) >= self.max_keys:
+                    del self.windows[next(iter(self.windows))]
+                self.windows.pop(key, None)
+                self.windows[key] = [now, 1, 0]
+                if window is not None and window[2]:
+                    record.suppressed = window[2]
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+        LOG_MESSAGES_SUPPRESSED.inc(record.name)
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Queue handler that drops and counts records when the queue is full
+    While direct is set, records go straight to that handler instead.
+    """
+
+    def __init__(self, queue: queue.Queue, direct: logging.Handler | None = None):
+        super().__init__(queue)
+        self.direct = direct
+
+    def emit(self, record: logging.LogRecord):
+        direct = self.direct
+        if direct is not None:
+            # No writer thread drains the queue, write on the caller's thread
+            direct.handle(record)
+            return
+        super().emit(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments and render the traceback now, the record may
+        # reference objects that change before the writer thread gets to it
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_MESSAGES_DROPPED.inc(record.name)
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Waits for room when the queue is full, the writer is draining it
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """
+    Structured log output written by a background thread
+    Logging calls only filter a record and put it on a bounded queue, so a
+    slow or blocked stream never stalls the event loop. Records beyond the
+    queue size are dropped and counted. Before start and after stop, records
+    are written directly rather than queued with nothing to drain them.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO | None = None,
+        max_queue: int = 10000,
+        burst: int = 5,
+        interval: float = 60.0,
+    ):
+        self.queue: queue.Queue = queue.Queue(max_queue)
+        self.rate_limit = RateLimitFilter(burst, interval)
+        self.output = logging.StreamHandler(sys.stderr if stream is None else stream)
+        self.output.setFormatter(JsonFormatter())
+        self.handler = NonBlockingQueueHandler(self.queue, direct=self.output)
+        self.handler.addFilter(self.rate_limit)
+        self.listener = _Listener(self.queue, self.output)
+        self.running = False
+
+    def configure(self, max_queue: int, burst: int, interval: float):
+        """Apply settings read after the pipeline was created"""
+        with self.queue.mutex:
+            self.queue.maxsize = max_queue
+        self.rate_limit.burst = burst
+        self.rate_limit.interval = interval
+
+    def install(self, name: str, level: int | str = logging.INFO):
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        if self.handler not in logger.handlers:
+            logger.addHandler(self.handler)
+        # Handlers of the root logger, such as basicConfig's or gunicorn's,
+        # would write every record again on the caller's thread
+        logger.propagate = False
+
+    def uninstall(self, name: str):
+        logger = logging.getLogger(name)
+        logger.removeHandler(self.handler)
+        logger.propagate = True
+
+    def start(self):
+        if not self.running:
+            self.listener.start()
+            self.handler.direct = None
+            self.running = True
+
+    def stop(self):
+        """Write the queued records and stop the writer thread"""
+        if self.running:
+            self.handler.direct = self.output
+            self.listener.stop()
+            self.running = False
+        self.output.flush()
+
+
+# Global log pipeline instance
+log_pipeline = LogPipeline()
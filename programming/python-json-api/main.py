@@ -1,24 +1,238 @@
+import asyncio
+import gc
+import hashlib
+import hmac
+import logging
 import os
-from datetime import datetime, timedelta
-
-from fastapi import Depends, FastAPI, HTTPException, status
+import threading
+import time
+import uuid
+from collections.abc import Awaitable, Callable, Hashable
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Any
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from pydantic import BaseModel
-
+from pydantic import BaseModel, Field, TypeAdapter, field_validator
+
+from admission import ConcurrencyLimiter, RateLimiter, admit
+from expiry import item_expiry
+from idempotency import IdempotencyCache, IdempotencyKeyReused
+from item_index import item_index
+from item_shards import ShardedItemStore, ShardUnavailable
+from item_stats import item_stats
+from item_store import ItemStore
+from jwt_backend import ExpiredSignatureError, JWTError, jwt
+from log_pipeline import log_pipeline
+from metrics import (
+    BCRYPT_QUEUE_DEPTH,
+    IDEMPOTENT_REQUESTS,
+    ITEMS_EXPIRED,
+    PASSWORD_REHASHES,
+    TOKEN_VALIDATIONS,
+    CallbackGauge,
+    MetricsMiddleware,
+    registry,
+)
 from oidc_config import OIDCProvider, oidc_config
-
-app = FastAPI(title="Simple JSON API", version="1.0.0")
+from password_hashing import bcrypt_context, bcrypt_rounds, calibrate_rounds
+from profiling import (
+    ProfilerBusy,
+    folded,
+    memory_tracer,
+    process_rss,
+    profiler,
+    store_usage,
+    top_types,
+)
+from refresh_tokens import InvalidRefreshToken, RefreshTokenStore
+from request_timing import ServerTimingMiddleware, TimedRoute, stage
+from response_cache import IDENTITY, compress, negotiate_encoding, response_cache
+from revocation import revocation_list
+from singleflight import SingleFlight
+from text_search import text_index
+from traffic_capture import TrafficCaptureMiddleware, traffic_recorder
+
+logger = logging.getLogger("simple_json_api")
+
+# Application logs are written as JSON lines by a background thread
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Records logged while this many wait to be written are dropped and counted
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Warnings and errors with the same message are written at most
+# LOG_REPEAT_BURST times per LOG_REPEAT_INTERVAL seconds
+LOG_REPEAT_BURST = int(os.getenv("LOG_REPEAT_BURST", "5"))
+LOG_REPEAT_INTERVAL = float(os.getenv("LOG_REPEAT_INTERVAL", "60"))
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    Startup work kept out of import
+    OIDC discovery does network I/O and bcrypt calibration burns CPU, both
+    run once per worker before it serves requests.
+    """
+    log_pipeline.configure(LOG_QUEUE_SIZE, LOG_REPEAT_BURST, LOG_REPEAT_INTERVAL)
+    log_pipeline.install("simple_json_api", LOG_LEVEL)
+    log_pipeline.start()
+    await run_in_threadpool(init_oidc_providers)
+    await run_in_threadpool(calibrate_password_hashing)
+    if TRAFFIC_CAPTURE_PATH:
+        traffic_recorder.open(TRAFFIC_CAPTURE_PATH)
+    sweeper = asyncio.create_task(sweep_expired_items())
+    yield
+    traffic_recorder.close()
+    sweeper.cancel()
+    with suppress(asyncio.CancelledError):
+        await sweeper
+    if item_shards is not None:
+        await item_shards.aclose()
+    log_pipeline.stop()
+
+
+app = FastAPI(title="Simple JSON API", version="1.0.0", lifespan=lifespan)
+app.router.route_class = TimedRoute
 
 # Auth configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+# Largest batch accepted by /auth/introspect
+INTROSPECT_MAX_TOKENS = int(os.getenv("INTROSPECT_MAX_TOKENS", "1000"))
+# Secret resource servers send as X-Introspect-Token, introspection is
+# refused without it
+INTROSPECT_TOKEN = os.getenv("INTROSPECT_TOKEN") or None
+# Admission control for /auth/introspect, per client like the password routes
+INTROSPECT_CONCURRENCY_LIMIT = int(
+    os.getenv("INTROSPECT_CONCURRENCY_LIMIT", str(os.cpu_count() or 1))
+)
+INTROSPECT_RATE_PER_SECOND = float(os.getenv("INTROSPECT_RATE_PER_SECOND", "10"))
+INTROSPECT_RATE_BURST = float(os.getenv("INTROSPECT_RATE_BURST", "20"))
+
+# Responses of writes sent with an Idempotency-Key are kept for retries
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "1000"))
+IDEMPOTENCY_MAX_USERS = int(os.getenv("IDEMPOTENCY_MAX_USERS", "10000"))
+
+# Seconds between removals of expired items
+ITEM_SWEEP_INTERVAL = float(os.getenv("ITEM_SWEEP_INTERVAL", "1"))
+
+# Secret sent as X-Admin-Token to use the /debug endpoints, which are off
+# without it. Usernames can be registered again after a restart and OIDC
+# names are chosen by the provider, so they do not identify an admin.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+# Longest CPU profile a /debug/profile request may take
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
 
 # OIDC Configuration
 OIDC_ENABLED = os.getenv("OIDC_ENABLED", "false").lower() == "true"
 
+# Responses of at least COMPRESSION_MIN_BYTES are compressed for clients
+# accepting it, serialized item lists are cached up to RESPONSE_CACHE_MAX_BYTES
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", "67108864"))
+app.add_middleware(
+    GZipMiddleware, minimum_size=COMPRESSION_MIN_BYTES, compresslevel=COMPRESSION_LEVEL
+)
+response_cache.max_bytes = RESPONSE_CACHE_MAX_BYTES
+
+# Sharded mode: items live on the store nodes listed in ITEM_SHARDS
+# (comma-separated URLs), each owner on the node picked by consistent hashing
+ITEM_SHARDS = [
+    node.strip() for node in os.getenv("ITEM_SHARDS", "").split(",") if node.strip()
+]
+# Nodes before the last change of ITEM_SHARDS, set while a rebalance moves
+# owners off them
+ITEM_SHARDS_PREVIOUS = [
+    node.strip()
+    for node in os.getenv("ITEM_SHARDS_PREVIOUS", "").split(",")
+    if node.strip()
+]
+ITEM_SHARD_VNODES = int(os.getenv("ITEM_SHARD_VNODES", "128"))
+ITEM_SHARD_TIMEOUT = float(os.getenv("ITEM_SHARD_TIMEOUT", "5"))
+ITEM_SHARD_MAX_CONNECTIONS = int(os.getenv("ITEM_SHARD_MAX_CONNECTIONS", "100"))
+# Shared secret sent to the store nodes
+SHARD_TOKEN = os.getenv("SHARD_TOKEN") or None
+item_shards = (
+    ShardedItemStore(
+        ITEM_SHARDS,
+        ITEM_SHARD_VNODES,
+        SHARD_TOKEN,
+        ITEM_SHARD_TIMEOUT,
+        ITEM_SHARD_MAX_CONNECTIONS,
+        ITEM_SHARDS_PREVIOUS,
+    )
+    if ITEM_SHARDS
+    else None
+)
+
+
+@app.exception_handler(ShardUnavailable)
+async def shard_unavailable(_request: Request, exc: ShardUnavailable):
+    return JSONResponse(
+        status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"}
+    )
+
+
+def local_item_indexes():
+    """Stats and search read indexes that exist only next to a local store"""
+    if item_shards is not None:
+        raise HTTPException(
+            status_code=501, detail="Not available with a sharded item store"
+        )
+
+
+# Fraction of requests whose stage timings are reported, 0 disables timing
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv("SERVER_TIMING_SAMPLE_RATE", "0"))
+app.add_middleware(
+    ServerTimingMiddleware, sample_rate=lambda: SERVER_TIMING_SAMPLE_RATE
+)
+app.add_middleware(MetricsMiddleware)
+
+# Opt-in capture of sanitized requests for replay.py, to a file appended to
+TRAFFIC_CAPTURE_PATH = os.getenv("TRAFFIC_CAPTURE_PATH", "")
+# Larger request bodies are recorded by size only
+TRAFFIC_CAPTURE_MAX_BODY = int(os.getenv("TRAFFIC_CAPTURE_MAX_BODY", "65536"))
+traffic_recorder.max_body = TRAFFIC_CAPTURE_MAX_BODY
+app.add_middleware(TrafficCaptureMiddleware, recorder=traffic_recorder)
+
+# Admission control for the bcrypt-heavy password endpoints
+PASSWORD_CONCURRENCY_LIMIT = int(
+    os.getenv("PASSWORD_CONCURRENCY_LIMIT", str(os.cpu_count() or 1))
+)
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "64"))
+PASSWORD_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_QUEUE_TIMEOUT", "5"))
+# Per-client token bucket, a rate of 0 disables throttling
+PASSWORD_RATE_PER_SECOND = float(os.getenv("PASSWORD_RATE_PER_SECOND", "10"))
+PASSWORD_RATE_BURST = float(os.getenv("PASSWORD_RATE_BURST", "20"))
+
+login_limiter = ConcurrencyLimiter(
+    PASSWORD_CONCURRENCY_LIMIT, PASSWORD_QUEUE_LIMIT, PASSWORD_QUEUE_TIMEOUT
+)
+register_limiter = ConcurrencyLimiter(
+    PASSWORD_CONCURRENCY_LIMIT, PASSWORD_QUEUE_LIMIT, PASSWORD_QUEUE_TIMEOUT
+)
+password_rate_limiter = RateLimiter(PASSWORD_RATE_PER_SECOND, PASSWORD_RATE_BURST)
+introspect_limiter = ConcurrencyLimiter(
+    INTROSPECT_CONCURRENCY_LIMIT, PASSWORD_QUEUE_LIMIT, PASSWORD_QUEUE_TIMEOUT
+)
+introspect_rate_limiter = RateLimiter(INTROSPECT_RATE_PER_SECOND, INTROSPECT_RATE_BURST)
+
+# bcrypt cost, calibrated at startup to a hash time when BCRYPT_TARGET_MS is set
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "0"))
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "16"))
+
 
 # Initialize OIDC providers from environment
 def init_oidc_providers():
@@ -61,10 +275,33 @@ def init_oidc_providers():
         oidc_config.add_provider(generic_provider)
 
 
-init_oidc_providers()
+def calibrate_password_hashing():
+    global BCRYPT_ROUNDS, pwd_context
+
+    if BCRYPT_TARGET_MS <= 0:
+        return
+    BCRYPT_ROUNDS = calibrate_rounds(
+        BCRYPT_TARGET_MS / 1000, BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS
+    )
+    pwd_context = bcrypt_context(BCRYPT_ROUNDS)
+    logger.info(
+        "bcrypt cost calibrated to %d rounds for a %.0f ms target",
+        BCRYPT_ROUNDS,
+        BCRYPT_TARGET_MS,
+    )
+
+
+refresh_tokens = RefreshTokenStore(
+    SECRET_KEY, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+)
+
+idempotency_cache = IdempotencyCache(
+    IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_MAX_USERS
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = bcrypt_context(BCRYPT_ROUNDS)
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
 class UserCreate(BaseModel):
@@ -89,12 +326,46 @@ class User(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class IntrospectRequest(BaseModel):
+    tokens: list[str] = Field(max_length=INTROSPECT_MAX_TOKENS)
+
+
+class TokenIntrospection(BaseModel):
+    active: bool
+    user_id: int | None = None
+    username: str | None = None
+    auth_type: str | None = None
+    claims: dict | None = None
+
+
+class IntrospectResponse(BaseModel):
+    results: list[TokenIntrospection]
 
 
 class ItemCreate(BaseModel):
     name: str
     description: str | None = None
     price: float
+    # Items are removed once expired, times without a zone are UTC
+    expires_at: datetime | None = None
+
+    @field_validator("expires_at")
+    @classmethod
+    def expires_in_future(cls, expires_at: datetime | None) -> datetime | None:
+        if expires_at is None:
+            return None
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at <= datetime.now(timezone.utc):
+            raise ValueError("expires_at must be in the future")
+        return expires_at
 
 
 class Item(BaseModel):
@@ -103,21 +374,107 @@ class Item(BaseModel):
     description: str | None = None
     price: float
     owner_id: int
+    expires_at: datetime | None = None
+
+
+item_list_adapter = TypeAdapter(list[Item])
+
+
+def shard_owner(user) -> str:
+    """
+    Key of a user's items on the store nodes
+    The nodes outlive the API's in-memory user ids, which start over at 1 on
+    every restart and differ between workers, so items are keyed by the
+    username or the OIDC provider and subject instead.
+    """
+    if getattr(user, "oidc_subject", None):
+        identity = f"oidc:{user.oidc_provider}:{user.oidc_subject}"
+    else:
+        identity = f"local:{user.username}"
+    # A fixed-length digest is safe in URL paths whatever the username holds
+    return hashlib.blake2b(identity.encode(), digest_size=16).hexdigest()
+
+
+def shard_item(item: dict, user) -> Item:
+    return Item(**{**item, "owner_id": user.id})
+
+
+class HistogramBin(BaseModel):
+    lower: float
+    upper: float
+    count: int
+
+
+class ItemStatsResponse(BaseModel):
+    count: int
+    total_price: float
+    min_price: float | None = None
+    max_price: float | None = None
+    mean_price: float | None = None
+    stddev_price: float | None = None
+    histogram: list[HistogramBin]
 
 
 users_db = []
-items_db = []
+items_db = ItemStore()
+oidc_provisioning = SingleFlight()
 next_user_id = 1
 next_id = 1
+# OIDC users are created in the thread pool, local users on the event loop
+user_ids_lock = threading.Lock()
+
+registry.register(
+    CallbackGauge(
+        "store_size",
+        "Number of entries in the in-memory stores and caches",
+        ("store",),
+        lambda: {
+            ("users",): len(users_db),
+            ("items",): len(items_db),
+            ("jwks_cache",): len(oidc_config.jwks_cache),
+            ("idempotency_cache",): len(idempotency_cache),
+            ("response_cache",): len(response_cache),
+            ("expiry_timers",): len(item_expiry),
+            ("log_queue",): log_pipeline.queue.qsize(),
+        },
+    )
+)
+registry.register(
+    CallbackGauge(
+        "item_snapshots",
+        "Live item store snapshots, and the partitions, items and bytes only "
+        "they retain",
+        ("measure",),
+        lambda: {
+            (measure,): value for measure, value in items_db.snapshot_usage().items()
+        },
+    )
+)
+registry.register(
+    CallbackGauge(
+        "bcrypt_rounds",
+        "bcrypt cost used for new password hashes",
+        (),
+        lambda: {(): bcrypt_rounds(pwd_context)},
+    )
+)
 
 
 # Auth helper functions
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    with BCRYPT_QUEUE_DEPTH.track(), stage("bcrypt"):
+        return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password, hashed_password):
+    """Verify a password, returning a new hash when the cost is outdated"""
+    with BCRYPT_QUEUE_DEPTH.track(), stage("bcrypt"):
+        return pwd_context.verify_and_update(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    with BCRYPT_QUEUE_DEPTH.track(), stage("bcrypt"):
+        return pwd_context.hash(password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -126,11 +483,58 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # The token ID allows revoking the token before it expires
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def is_live(item: Item, now: float) -> bool:
+    """Whether an item has not expired, even if the sweeper has not removed it"""
+    return item.expires_at is None or item.expires_at.timestamp() > now
+
+
+# Item index functions, called on every item mutation
+def index_item(item: Item):
+    if item.expires_at is not None:
+        item_expiry.add(item.id, item.expires_at.timestamp())
+    item_stats.add(item.owner_id, item.price)
+    item_index.add(item)
+    text_index.add(item)
+    response_cache.invalidate(item.owner_id)
+
+
+def unindex_item(item: Item):
+    item_expiry.remove(item.id)
+    item_stats.remove(item.owner_id, item.price)
+    item_index.remove(item)
+    text_index.remove(item)
+    response_cache.invalidate(item.owner_id)
+
+
+def revoke_access_token(token: str):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return
+    if "jti" in payload and "exp" in payload:
+        revocation_list.revoke(payload["jti"], payload["exp"])
+
+
+def issue_tokens(username: str, refresh_token: str | None = None) -> dict:
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": username}, expires_delta=access_token_expires
+    )
+    if refresh_token is None:
+        refresh_token = refresh_tokens.issue(username)
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+    }
+
+
 def get_user_by_username(username: str):
     for user in users_db:
         if user.username == username:
@@ -146,9 +550,15 @@ def get_user_by_oidc_subject(subject: str, provider: str):
     return None
 
 
-def create_oidc_user(oidc_payload: dict, provider_name: str):
+def allocate_user_id() -> int:
     global next_user_id
+    with user_ids_lock:
+        user_id = next_user_id
+        next_user_id += 1
+    return user_id
 
+
+def create_oidc_user(oidc_payload: dict, provider_name: str):
     # Extract user info from OIDC claims
     subject = oidc_payload.get("sub")
     email = oidc_payload.get("email", f"{subject}@{provider_name}")
@@ -158,7 +568,7 @@ def create_oidc_user(oidc_payload: dict, provider_name: str):
         "User",
         (),
         {
-            "id": next_user_id,
+            "id": allocate_user_id(),
             "username": name,
             "email": email,
             "oidc_subject": subject,
@@ -167,31 +577,84 @@ def create_oidc_user(oidc_payload: dict, provider_name: str):
         },
     )()
 
-    next_user_id += 1
     users_db.append(user)
     return user
 
 
+def find_oidc_provider(issuer: str | None) -> str | None:
+    for name, provider in oidc_config.providers.items():
+        if provider.issuer == issuer:
+            return name
+    return None
+
+
+async def provision_oidc_user(oidc_payload: dict, provider_name: str):
+    subject = oidc_payload["sub"]
+
+    # Look for existing OIDC user
+    user = get_user_by_oidc_subject(subject, provider_name)
+    if user:
+        return user
+
+    async def get_or_create():
+        # Another flight may have created the user since the lookup above
+        user = get_user_by_oidc_subject(subject, provider_name)
+        if not user:
+            # Create new OIDC user automatically, off the event loop
+            user = await run_in_threadpool(
+                create_oidc_user, oidc_payload, provider_name
+            )
+        return user
+
+    # Concurrent first requests of a user share a single creation
+    return await oidc_provisioning.do_async((provider_name, subject), get_or_create)
+
+
 def authenticate_user(username: str, password: str):
     user = get_user_by_username(username)
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    verified, new_hash = verify_and_update_password(password, user.password_hash)
+    if not verified:
         return False
+    if new_hash is not None:
+        # Stored with a cost other than the configured one
+        user.password_hash = new_hash
+        PASSWORD_REHASHES.inc()
     return user
 
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ):
+    with stage("auth"):
+        return await resolve_user(credentials.credentials)
+
+
+def require_admin(x_admin_token: str | None = Header(None)):
+    if ADMIN_TOKEN is None or not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+
+async def resolve_user(token: str):
+    user, claims = validate_access_token(token)
+    if user is None:
+        # First request of an OIDC user
+        user = await provision_oidc_user(claims, find_oidc_provider(claims["iss"]))
+    return user
+
+
+def validate_access_token(token: str) -> tuple:
+    """
+    Validate an OIDC or local access token, returning the user and claims
+    The user of an OIDC token is None until resolve_user provisions it.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    token = credentials.credentials
-
     # First try OIDC validation if enabled
     if OIDC_ENABLED:
         oidc_payload = oidc_config.validate_token(token)
@@ -199,42 +662,187 @@ async def get_current_user(
             subject = oidc_payload.get("sub")
             issuer = oidc_payload.get("iss")
 
-            # Find provider name by issuer
-            provider_name = None
-            for name, provider in oidc_config.providers.items():
-                if provider.issuer == issuer:
-                    provider_name = name
-                    break
-
+            provider_name = find_oidc_provider(issuer)
             if subject and provider_name:
-                # Look for existing OIDC user
                 user = get_user_by_oidc_subject(subject, provider_name)
-                if not user:
-                    # Create new OIDC user automatically
-                    user = create_oidc_user(oidc_payload, provider_name)
-                return user
+                return user, oidc_payload
 
     # Fall back to local JWT validation
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
+            TOKEN_VALIDATIONS.inc("local", "missing_subject")
+            raise credentials_exception
+
+        jti = payload.get("jti")
+        if jti is not None and revocation_list.is_revoked(jti):
+            TOKEN_VALIDATIONS.inc("local", "revoked")
             raise credentials_exception
 
         user = get_user_by_username(username)
         if user is None:
+            TOKEN_VALIDATIONS.inc("local", "unknown_user")
             raise credentials_exception
-        return user
+        TOKEN_VALIDATIONS.inc("local", "valid")
+        return user, payload
 
+    except ExpiredSignatureError:
+        TOKEN_VALIDATIONS.inc("local", "expired")
+        raise credentials_exception
     except JWTError:
+        TOKEN_VALIDATIONS.inc("local", "invalid")
         raise credentials_exception
 
 
+def introspect_tokens(tokens: list[str]) -> list[TokenIntrospection]:
+    """
+    Validate a batch of tokens, each distinct token only once
+    OIDC users are not provisioned, an OIDC token of a user that has not
+    called the API yet is active without a user ID.
+    """
+    introspections = {}
+    for token in dict.fromkeys(tokens):
+        try:
+            user, claims = validate_access_token(token)
+        except HTTPException:
+            introspections[token] = TokenIntrospection(active=False)
+            continue
+        if user is None:
+            introspections[token] = TokenIntrospection(
+                active=True, auth_type="oidc", claims=claims
+            )
+            continue
+        introspections[token] = TokenIntrospection(
+            active=True,
+            user_id=user.id,
+            username=user.username,
+            auth_type="oidc" if getattr(user, "oidc_subject", None) else "local",
+            claims=claims,
+        )
+    return [introspections[token] for token in tokens]
+
+
+def idempotency_key(
+    idempotency_key: str | None = Header(None, min_length=1, max_length=255),
+) -> str | None:
+    return idempotency_key
+
+
+async def idempotent(
+    request: Request,
+    key: str | None,
+    scope: Hashable,
+    handler: Callable[[], Awaitable[Any]],
+):
+    """
+    Run a write handler at most once per scope and Idempotency-Key
+    Retries get the stored response, including client errors, and concurrent
+    duplicates wait for the first request. Server errors are not stored.
+    """
+    if key is None:
+        return await handler()
+
+    async def respond() -> JSONResponse:
+        try:
+            result = await handler()
+        except HTTPException as e:
+            if e.status_code >= 500:
+                raise
+            return JSONResponse({"detail": e.detail}, e.status_code, e.headers)
+        return JSONResponse(jsonable_encoder(result))
+
+    fingerprint = idempotency_cache.digest(
+        request.method, request.url.path, await request.body()
+    )
+    try:
+        response, replayed = await idempotency_cache.run(
+            scope, key, fingerprint, respond
+        )
+    except IdempotencyKeyReused:
+        IDEMPOTENT_REQUESTS.inc("mismatch")
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request",
+        ) from None
+    IDEMPOTENT_REQUESTS.inc("replayed" if replayed else "executed")
+    return response
+
+
+def expire_items(now: float | None = None) -> int:
+    """Remove the items whose expiry has passed, returning how many"""
+    now = time.time() if now is None else now
+    due = set(item_expiry.advance(now))
+    # Timers fire on the tick after an expiry, the next tick's items may have
+    # expired already
+    for item_id in item_expiry.pending():
+        item = items_db.get(item_id)
+        if item is not None and not is_live(item, now):
+            due.add(item_id)
+    if not due:
+        return 0
+    with stage("store"):
+        expired = items_db.remove_many(due)
+        for item in expired:
+            unindex_item(item)
+    ITEMS_EXPIRED.inc(amount=len(expired))
+    return len(expired)
+
+
+async def sweep_expired_items():
+    while True:
+        await asyncio.sleep(ITEM_SWEEP_INTERVAL)
+        try:
+            expire_items()
+        except Exception:
+            logger.exception("Expiring items failed")
+
+
+def refresh_scope(refresh_data: RefreshRequest) -> Hashable:
+    # The login the refresh token belongs to is only known once it is rotated
+    return ("refresh_token", idempotency_cache.digest(refresh_data.refresh_token))
+
+
+async def login_admission(request: Request):
+    async with admit(request, "/login", login_limiter, password_rate_limiter):
+        yield
+
+
+async def register_admission(request: Request):
+    async with admit(request, "/register", register_limiter, password_rate_limiter):
+        yield
+
+
+def check_introspect_token(x_introspect_token: str | None = Header(None)):
+    if INTROSPECT_TOKEN is None or not hmac.compare_digest(
+        x_introspect_token or "", INTROSPECT_TOKEN
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid introspection token",
+        )
+
+
+async def introspect_admission(request: Request):
+    async with admit(
+        request, "/auth/introspect", introspect_limiter, introspect_rate_limiter
+    ):
+        yield
+
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Simple JSON API"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Get metrics in the Prometheus text exposition format"""
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 @app.get("/auth/oidc/config")
 async def get_oidc_config():
     """Get OIDC configuration for client applications"""
@@ -269,88 +877,302 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return user_info
 
 
-@app.post("/register", response_model=User)
-async def register(user_data: UserCreate):
-    global next_user_id
-
-    # Check if user already exists
-    if get_user_by_username(user_data.username):
-        raise HTTPException(status_code=400, detail="Username already registered")
-
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
-    user = type(
-        "User",
-        (),
-        {
-            "id": next_user_id,
-            "username": user_data.username,
-            "email": user_data.email,
-            "password_hash": hashed_password,
-        },
-    )()
+@app.post(
+    "/auth/introspect",
+    response_model=IntrospectResponse,
+    dependencies=[Depends(check_introspect_token), Depends(introspect_admission)],
+)
+async def introspect(request_data: IntrospectRequest):
+    """
+    Validate a batch of access tokens for a resource server holding
+    INTROSPECT_TOKEN
+    Results are returned in request order, inactive tokens carry no claims
+    """
+    with stage("auth"):
+        results = await run_in_threadpool(introspect_tokens, request_data.tokens)
+    return IntrospectResponse(results=results)
+
+
+@app.post("/register", response_model=User, dependencies=[Depends(register_admission)])
+async def register(
+    user_data: UserCreate,
+    request: Request,
+    key: str | None = Depends(idempotency_key),
+):
+    async def create_user():
+        # Check if user already exists
+        if get_user_by_username(user_data.username):
+            raise HTTPException(status_code=400, detail="Username already registered")
+
+        # Create new user, hashing off the event loop
+        hashed_password = await run_in_threadpool(get_password_hash, user_data.password)
+        if get_user_by_username(user_data.username):
+            raise HTTPException(status_code=400, detail="Username already registered")
+        user = type(
+            "User",
+            (),
+            {
+                "id": allocate_user_id(),
+                "username": user_data.username,
+                "email": user_data.email,
+                "password_hash": hashed_password,
+            },
+        )()
+
+        users_db.append(user)
+
+        # Return user without password
+        return User(id=user.id, username=user.username, email=user.email)
+
+    return await idempotent(request, key, ("username", user_data.username), create_user)
+
+
+@app.post("/login", response_model=Token, dependencies=[Depends(login_admission)])
+async def login(
+    user_data: UserLogin,
+    request: Request,
+    key: str | None = Depends(idempotency_key),
+):
+    async def authenticate():
+        user = await run_in_threadpool(
+            authenticate_user, user_data.username, user_data.password
+        )
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect username or password",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return issue_tokens(user.username)
 
-    next_user_id += 1
-    users_db.append(user)
+    return await idempotent(
+        request, key, ("username", user_data.username), authenticate
+    )
 
-    # Return user without password
-    return User(id=user.id, username=user.username, email=user.email)
 
+@app.post("/refresh", response_model=Token)
+async def refresh(
+    refresh_data: RefreshRequest,
+    request: Request,
+    key: str | None = Depends(idempotency_key),
+):
+    """
+    Exchange a refresh token for new access and refresh tokens
+    Retry with an Idempotency-Key, reusing a rotated token revokes the login
+    """
 
-@app.post("/login", response_model=Token)
-async def login(user_data: UserLogin):
-    user = authenticate_user(user_data.username, user_data.password)
-    if not user:
-        raise HTTPException(
+    async def rotate():
+        invalid_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
+            detail="Invalid refresh token",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+        try:
+            username, refresh_token = refresh_tokens.rotate(refresh_data.refresh_token)
+        except InvalidRefreshToken:
+            raise invalid_exception from None
+        if get_user_by_username(username) is None:
+            refresh_tokens.revoke(refresh_token)
+            raise invalid_exception
+        return issue_tokens(username, refresh_token)
+
+    return await idempotent(request, key, refresh_scope(refresh_data), rotate)
+
+
+@app.post("/logout")
+async def logout(
+    refresh_data: RefreshRequest,
+    request: Request,
+    credentials: HTTPAuthorizationCredentials | None = Depends(optional_security),
+    key: str | None = Depends(idempotency_key),
+):
+    """
+    Revoke a refresh token and every token rotated from the same login
+    The access token in the Authorization header, if any, is revoked too
+    """
+
+    async def revoke():
+        refresh_tokens.revoke(refresh_data.refresh_token)
+        if credentials is not None:
+            revoke_access_token(credentials.credentials)
+        return {"message": "Logged out successfully"}
+
+    return await idempotent(request, key, refresh_scope(refresh_data), revoke)
 
 
 @app.get("/items", response_model=list[Item])
-async def get_items(current_user: User = Depends(get_current_user)):
-    return [item for item in items_db if item.owner_id == current_user.id]
+async def get_items(request: Request, current_user: User = Depends(get_current_user)):
+    """
+    Get the current user's items
+    Serialized and compressed bodies are cached until the user's items change,
+    so polling an unchanged collection skips both.
+    """
+    if item_shards is not None:
+        # Other API workers write to the same nodes, so nothing is cached here
+        items = await item_shards.items(shard_owner(current_user))
+        body = item_list_adapter.dump_json(
+            [shard_item(item, current_user) for item in items]
+        )
+        return Response(body, media_type="application/json")
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+
+    def serialize() -> bytes:
+        now = time.time()
+        with stage("store"):
+            snapshot = items_db.snapshot(current_user.id)
+            items = [item for item in snapshot if is_live(item, now)]
+        expiries = [item.expires_at.timestamp() for item in items if item.expires_at]
+        if expiries:
+            # Rendered again once the first of these items expires
+            response_cache.expire_at(current_user.id, min(expiries))
+        with stage("serialize"):
+            return item_list_adapter.dump_json(items)
+
+    body = response_cache.get_or_render(current_user.id, IDENTITY, serialize)
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding != IDENTITY and len(body) >= COMPRESSION_MIN_BYTES:
+        identity = body
+
+        def encode() -> bytes:
+            with stage("serialize"):
+                return compress(identity, encoding, COMPRESSION_LEVEL)
+
+        body = response_cache.get_or_render(current_user.id, encoding, encode)
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.get(
+    "/items/stats",
+    response_model=ItemStatsResponse,
+    dependencies=[Depends(local_item_indexes)],
+)
+async def get_items_stats(
+    bins: int = Query(10, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+):
+    """Get price statistics of the current user's items"""
+    # Statistics are kept per mutation, expired items leave them once removed
+    expire_items()
+    return item_stats.summary(current_user.id, bins)
+
+
+@app.get(
+    "/items/search",
+    response_model=list[Item],
+    dependencies=[Depends(local_item_indexes)],
+)
+async def search_items(
+    q: str | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    prefix: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Search the current user's items by keywords, price range and name prefix
+    Keyword results are ranked by relevance, others by name or price
+    """
+
+    now = time.time()
+
+    def matches_filters(item: Item) -> bool:
+        return (
+            is_live(item, now)
+            and (min_price is None or item.price >= min_price)
+            and (max_price is None or item.price <= max_price)
+            and (prefix is None or item.name.casefold().startswith(prefix.casefold()))
+        )
+
+    if q is not None:
+        results = text_index.search(current_user.id, q, limit, matches_filters)
+        return [item for item, _ in results]
+    if prefix is not None:
+        # Walk the name index and filter by price
+        matches = filter(
+            matches_filters, item_index.name_prefix(current_user.id, prefix)
+        )
+    else:
+        matches = item_index.price_range(current_user.id, min_price, max_price)
+        matches = (item for item in matches if is_live(item, now))
+    return list(islice(matches, limit))
+
+
+@app.get("/items/search/index", dependencies=[Depends(local_item_indexes)])
+async def get_search_index_info(current_user: User = Depends(get_current_user)):
+    """Get the size of the current user's full-text search index"""
+    return text_index.memory_usage(current_user.id)
 
 
 @app.get("/items/{item_id}", response_model=Item)
 async def get_item(item_id: int, current_user: User = Depends(get_current_user)):
-    for item in items_db:
-        if item.id == item_id:
-            if item.owner_id != current_user.id:
-                raise HTTPException(status_code=404, detail="Item not found")
-            return item
-    raise HTTPException(status_code=404, detail="Item not found")
+    if item_shards is not None:
+        item = await item_shards.get(shard_owner(current_user), item_id)
+        if item is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        return shard_item(item, current_user)
+    with stage("store"):
+        item = items_db.get(item_id)
+    if (
+        item is None
+        or item.owner_id != current_user.id
+        or not is_live(item, time.time())
+    ):
+        raise HTTPException(status_code=404, detail="Item not found")
+    return item
 
 
 @app.post("/items", response_model=Item)
 async def create_item(
-    item_data: ItemCreate, current_user: User = Depends(get_current_user)
+    item_data: ItemCreate,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    key: str | None = Depends(idempotency_key),
 ):
-    global next_id
-    item = Item(
-        id=next_id,
-        name=item_data.name,
-        description=item_data.description,
-        price=item_data.price,
-        owner_id=current_user.id,
-    )
-    next_id += 1
-    items_db.append(item)
-    return item
+    async def create():
+        global next_id
+        if item_shards is not None:
+            data = item_data.model_dump(mode="json")
+            item = await item_shards.create(shard_owner(current_user), data)
+            return shard_item(item, current_user)
+        item = Item(
+            id=next_id,
+            name=item_data.name,
+            description=item_data.description,
+            price=item_data.price,
+            owner_id=current_user.id,
+            expires_at=item_data.expires_at,
+        )
+        next_id += 1
+        with stage("store"):
+            items_db.add(item)
+            index_item(item)
+        return item
+
+    return await idempotent(request, key, ("user", current_user.id), create)
 
 
 @app.put("/items/{item_id}", response_model=Item)
 async def update_item(
-    item_id: int, item_data: ItemCreate, current_user: User = Depends(get_current_user)
+    item_id: int,
+    item_data: ItemCreate,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    key: str | None = Depends(idempotency_key),
 ):
-    for i, item in enumerate(items_db):
-        if item.id == item_id:
+    async def update():
+        if item_shards is not None:
+            data = item_data.model_dump(mode="json")
+            item = await item_shards.replace(shard_owner(current_user), item_id, data)
+            if item is None:
+                raise HTTPException(status_code=404, detail="Item not found")
+            return shard_item(item, current_user)
+        with stage("store"):
+            item = items_db.get(item_id)
+            if item is None or not is_live(item, time.time()):
+                raise HTTPException(status_code=404, detail="Item not found")
             if item.owner_id != current_user.id:
                 raise HTTPException(
                     status_code=403, detail="Not authorized to update this item"
@@ -361,26 +1183,163 @@ async def update_item(
                 description=item_data.description,
                 price=item_data.price,
                 owner_id=item.owner_id,
+                expires_at=item_data.expires_at,
             )
-            items_db[i] = updated_item
+            items_db.add(updated_item)
+            unindex_item(item)
+            index_item(updated_item)
             return updated_item
-    raise HTTPException(status_code=404, detail="Item not found")
+
+    return await idempotent(request, key, ("user", current_user.id), update)
 
 
 @app.delete("/items/{item_id}")
-async def delete_item(item_id: int, current_user: User = Depends(get_current_user)):
-    for i, item in enumerate(items_db):
-        if item.id == item_id:
+async def delete_item(
+    item_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    key: str | None = Depends(idempotency_key),
+):
+    async def delete():
+        if item_shards is not None:
+            if await item_shards.delete(shard_owner(current_user), item_id) is None:
+                raise HTTPException(status_code=404, detail="Item not found")
+            return {"message": "Item deleted successfully"}
+        with stage("store"):
+            item = items_db.get(item_id)
+            if item is None or not is_live(item, time.time()):
+                raise HTTPException(status_code=404, detail="Item not found")
             if item.owner_id != current_user.id:
                 raise HTTPException(
                     status_code=403, detail="Not authorized to delete this item"
                 )
-            items_db.pop(i)
+            items_db.remove(item_id)
+            unindex_item(item)
             return {"message": "Item deleted successfully"}
-    raise HTTPException(status_code=404, detail="Item not found")
+
+    return await idempotent(request, key, ("user", current_user.id), delete)
+
+
+def memory_stores() -> dict:
+    """In-memory stores and caches reported by /debug/memory"""
+    return {
+        "users": users_db,
+        "items": items_db,
+        "jwks_cache": oidc_config.jwks_cache,
+        "refresh_tokens": refresh_tokens.records,
+        "revocation_list": revocation_list.revoked,
+        "idempotency_cache": idempotency_cache.scopes,
+        "response_cache": response_cache.entries,
+        "item_stats": item_stats.owners,
+        "item_index": item_index,
+        "text_index": text_index.owners,
+    }
+
+
+@app.get("/debug/memory", include_in_schema=False)
+async def debug_memory(
+    sample: int = Query(100, ge=1, le=10000),
+    types: int = Query(0, ge=0, le=1000),
+    _admin: None = Depends(require_admin),
+):
+    """
+    Get entries and approximate bytes per store, and optionally the most
+    numerous object types. Objects shared between stores count in each.
+    """
+    report = {
+        "rss_bytes": process_rss(),
+        "stores": store_usage(memory_stores(), sample),
+        "item_snapshots": items_db.snapshot_usage(),
+        "gc_counts": gc.get_count(),
+    }
+    if types:
+        report["top_types"] = top_types(types)
+    return report
+
+
+@app.get("/debug/tracemalloc", include_in_schema=False)
+async def debug_tracemalloc_status(_admin: None = Depends(require_admin)):
+    return memory_tracer.status()
+
+
+@app.post("/debug/tracemalloc/start", include_in_schema=False)
+async def debug_tracemalloc_start(
+    frames: int = Query(1, ge=1, le=100),
+    _admin: None = Depends(require_admin),
+):
+    """Start tracing allocations, dropping earlier snapshots"""
+    memory_tracer.start(frames)
+    return memory_tracer.status()
+
+
+@app.post("/debug/tracemalloc/stop", include_in_schema=False)
+async def debug_tracemalloc_stop(_admin: None = Depends(require_admin)):
+    memory_tracer.stop()
+    return memory_tracer.status()
+
+
+@app.post("/debug/tracemalloc/snapshots", include_in_schema=False)
+async def debug_tracemalloc_snapshot(_admin: None = Depends(require_admin)):
+    try:
+        snapshot_id = await run_in_threadpool(memory_tracer.take_snapshot)
+    except RuntimeError:
+        raise HTTPException(
+            status_code=409, detail="tracemalloc is not tracing"
+        ) from None
+    return {"id": snapshot_id}
+
+
+@app.get("/debug/tracemalloc/snapshots/{snapshot_id}", include_in_schema=False)
+async def debug_tracemalloc_diff(
+    snapshot_id: int,
+    base: int | None = None,
+    key_type: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    limit: int = Query(20, ge=1, le=1000),
+    _admin: None = Depends(require_admin),
+):
+    """Get the largest allocation sites of a snapshot, or their growth since base"""
+    try:
+        return await run_in_threadpool(
+            memory_tracer.diff, snapshot_id, base, key_type, limit
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Snapshot not found") from None
+
+
+@app.get("/debug/profile", include_in_schema=False)
+async def debug_profile(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    _admin: None = Depends(require_admin),
+):
+    """
+    Sample the event loop's stack for a number of seconds while it keeps
+    serving requests, returned as collapsed stacks for flame graphs
+    """
+    if seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Profiles are limited to {PROFILE_MAX_SECONDS:g} seconds",
+        )
+    loop_thread = threading.get_ident()
+    try:
+        samples = await run_in_threadpool(
+            profiler.profile, loop_thread, seconds, interval_ms / 1000
+        )
+    except ProfilerBusy:
+        raise HTTPException(
+            status_code=409, detail="A profile is already running"
+        ) from None
+    filename = time.strftime("profile-%Y%m%d-%H%M%S.folded")
+    return PlainTextResponse(
+        folded(samples),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 if __name__ == "__main__":
-    import uvicorn
+    import sys
+
+    from serve import main
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    sys.exit(main())
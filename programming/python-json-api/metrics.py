@@ -0,0 +1,393 @@
+"""
+Prometheus text format metrics
+
+Updates write to a shard owned by the calling thread, so the hot path never
+takes a lock. Shards are merged when the metrics are rendered.
+"""
+
+import math
+import threading
+from bisect import bisect_left
+from collections.abc import Callable
+from time import perf_counter
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [
+        f'{name}="{_escape(str(value))}"'
+        for name, value in zip(names, values, strict=True)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: list[dict] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: dict = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def _merged(self) -> dict:
+        with self._lock:
+            shards = list(self._shards)
+        merged: dict = {}
+        for shard in shards:
+            for labels, value in list(shard.items()):
+                merged[labels] = merged.get(labels, 0.0) + value
+        return merged
+
+    def clear(self):
+        with self._lock:
+            for shard in self._shards:
+                shard.clear()
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self._merged().items())
+        ]
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples(),
+        ]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._merged().get(labels, 0.0)
+
+
+class Gauge(Metric):
+    """Gauge updated by increments, so that per-thread shards can be summed"""
+
+    type = "gauge"
+
+    def inc(self, *labels, amount: float = 1.0):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels) -> float:
+        return self._merged().get(labels, 0.0)
+
+    def track(self, *labels):
+        """Context manager incrementing the gauge while the block runs"""
+        return _Tracked(self, labels)
+
+
+class _Tracked:
+    __slots__ = ("gauge", "labels")
+
+    def __init__(self, gauge: Gauge, labels: tuple):
+        self.gauge = gauge
+        self.labels = labels
+
+    def __enter__(self):
+        self.gauge.inc(*self.labels)
+        return self
+
+    def __exit__(self, *exc):
+        self.gauge.dec(*self.labels)
+        return False
+
+
+class CallbackGauge(Metric):
+    """Gauge whose values are computed by a callback when rendered"""
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple,
+        callback: Callable[[], dict[tuple, float]],
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _merged(self) -> dict:
+        return self.callback()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # Bucket counts followed by the overflow bucket, sum and count
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def time(self, *labels):
+        """Context manager observing the duration of the block"""
+        return _Timer(self, labels)
+
+    def _merged(self) -> dict:
+        with self._lock:
+            shards = list(self._shards)
+        merged: dict = {}
+        for shard in shards:
+            for labels, state in list(shard.items()):
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = list(state)
+                else:
+                    merged[labels] = [a + b for a, b in zip(total, state, strict=True)]
+        return merged
+
+    def count(self, *labels) -> int:
+        state = self._merged().get(labels)
+        return 0 if state is None else state[-1]
+
+    def samples(self) -> list[str]:
+        lines = []
+        for labels, state in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), state[:-2], strict=True):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{_format_labels(self.labelnames, labels, le)} {cumulative}"
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{label_text} {state[-1]}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(perf_counter() - self.start, *self.labels)
+        return False
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def clear(self):
+        for metric in self.metrics.values():
+            metric.clear()
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # Use the route template to keep label cardinality bounded
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                perf_counter() - start,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status_code),
+            )
+
+
+# Global metrics registry and the metrics of this application
+registry = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route",
+        ("method", "route", "status"),
+    )
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.register(
+    Gauge("http_requests_in_flight", "HTTP requests currently being served")
+)
+BCRYPT_QUEUE_DEPTH = registry.register(
+    Gauge("bcrypt_queue_depth", "bcrypt operations waiting or running")
+)
+PASSWORD_REHASHES = registry.register(
+    Counter(
+        "password_rehashes_total",
+        "Password hashes upgraded to the configured bcrypt cost on login",
+    )
+)
+JWKS_FETCHES = registry.register(
+    Counter(
+        "jwks_fetches_total",
+        "JWKS and discovery document fetches by provider and outcome",
+        ("provider", "outcome"),
+    )
+)
+JWKS_FETCH_DURATION = registry.register(
+    Histogram(
+        "jwks_fetch_duration_seconds",
+        "JWKS and discovery document fetch latency by provider",
+        ("provider",),
+    )
+)
+TOKEN_VALIDATIONS = registry.register(
+    Counter(
+        "token_validations_total",
+        "Bearer token validations by token type and outcome",
+        ("type", "outcome"),
+    )
+)
+IDEMPOTENT_REQUESTS = registry.register(
+    Counter(
+        "idempotent_requests_total",
+        "Writes sent with an Idempotency-Key by outcome",
+        ("outcome",),
+    )
+)
+RESPONSE_CACHE_REQUESTS = registry.register(
+    Counter(
+        "response_cache_requests_total",
+        "Cached response body lookups by content coding and outcome",
+        ("encoding", "outcome"),
+    )
+)
+ITEMS_EXPIRED = registry.register(
+    Counter("items_expired_total", "Items removed by the expiry sweeper")
+)
+SHARD_REQUESTS = registry.register(
+    Counter(
+        "shard_requests_total",
+        "Requests to item store nodes by node and outcome",
+        ("node", "outcome"),
+    )
+)
+SHARD_REQUEST_DURATION = registry.register(
+    Histogram(
+        "shard_request_duration_seconds",
+        "Item store node request latency by node",
+        ("node",),
+    )
+)
+LOG_MESSAGES_DROPPED = registry.register(
+    Counter(
+        "log_messages_dropped_total",
+        "Log records dropped because the log queue was full by logger",
+        ("logger",),
+    )
+)
+LOG_MESSAGES_SUPPRESSED = registry.register(
+    Counter(
+        "log_messages_suppressed_total",
+        "Repeated log records suppressed by rate limiting by logger",
+        ("logger",),
+    )
+)
+ADMISSION_REJECTIONS = registry.register(
+    Counter(
+        "admission_rejections_total",
+        "Requests rejected by admission control by route and reason",
+        ("route", "reason"),
+    )
+)
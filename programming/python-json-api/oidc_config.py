@@ -1,10 +1,15 @@
+import logging
 from datetime import datetime, timedelta
 from typing import Any
 
-import requests
-from jose import JWTError, jwt
 from pydantic import BaseModel
 
+from jwt_backend import ExpiredSignatureError, JWTClaimsError, JWTError, jwt
+from metrics import JWKS_FETCH_DURATION, JWKS_FETCHES, TOKEN_VALIDATIONS
+from request_timing import stage
+
+logger = logging.getLogger("simple_json_api.oidc")
+
 
 class OIDCProvider(BaseModel):
     name: str
@@ -29,24 +34,37 @@ class OIDCConfig:
             self._discover_jwks(provider.name, provider.issuer)
 
     def _discover_jwks(self, provider_name: str, issuer: str):
+        import requests
+
         try:
             well_known_url = f"{issuer.rstrip('/')}/.well-known/openid-configuration"
-            response = requests.get(well_known_url, timeout=10)
+            with JWKS_FETCH_DURATION.time(provider_name):
+                response = requests.get(well_known_url, timeout=10)
             response.raise_for_status()
             config = response.json()
+            JWKS_FETCHES.inc(provider_name, "discovery_success")
 
             if "jwks_uri" in config:
                 self.providers[provider_name].jwks_uri = config["jwks_uri"]
                 self._fetch_jwks(provider_name, config["jwks_uri"])
 
         except Exception as e:
-            print(f"Failed to discover OIDC configuration for {provider_name}: {e}")
+            JWKS_FETCHES.inc(provider_name, "discovery_failure")
+            logger.error(
+                "Failed to discover OIDC configuration",
+                extra={"provider": provider_name, "error": str(e)},
+            )
 
     def _fetch_jwks(self, provider_name: str, jwks_uri: str):
+        # Imported on first fetch, requests is slow to import and rarely used
+        import requests
+
         try:
-            response = requests.get(jwks_uri, timeout=10)
+            with JWKS_FETCH_DURATION.time(provider_name):
+                response = requests.get(jwks_uri, timeout=10)
             response.raise_for_status()
             jwks = response.json()
+            JWKS_FETCHES.inc(provider_name, "success")
 
             self.jwks_cache[provider_name] = jwks
             # Cache for 1 hour
@@ -55,9 +73,17 @@ class OIDCConfig:
             )
 
         except Exception as e:
-            print(f"Failed to fetch JWKS for {provider_name}: {e}")
+            JWKS_FETCHES.inc(provider_name, "failure")
+            logger.error(
+                "Failed to fetch JWKS",
+                extra={"provider": provider_name, "error": str(e)},
+            )
 
     def _get_jwks(self, provider_name: str) -> dict | None:
+        with stage("jwks"):
+            return self._get_cached_jwks(provider_name)
+
+    def _get_cached_jwks(self, provider_name: str) -> dict | None:
         if provider_name not in self.jwks_cache:
             return None
 
@@ -84,6 +110,7 @@ class OIDCConfig:
             issuer = unverified_payload.get("iss")
 
             if not issuer:
+                TOKEN_VALIDATIONS.inc("oidc", "missing_issuer")
                 return None
 
             # Find matching provider
@@ -94,11 +121,13 @@ class OIDCConfig:
                     break
 
             if not provider:
+                TOKEN_VALIDATIONS.inc("oidc", "unknown_issuer")
                 return None
 
             # Get JWKS for this provider
             jwks = self._get_jwks(provider.name)
             if not jwks:
+                TOKEN_VALIDATIONS.inc("oidc", "missing_jwks")
                 return None
 
             # Get the key ID from token header
@@ -113,6 +142,7 @@ class OIDCConfig:
                     break
 
             if not key:
+                TOKEN_VALIDATIONS.inc("oidc", "unknown_key")
                 return None
 
             # Verify and decode the token
@@ -122,16 +152,26 @@ class OIDCConfig:
                 algorithms=provider.algorithms,
                 audience=provider.client_id,
                 issuer=provider.issuer,
-                options={"verify_exp": True},
             )
 
+            TOKEN_VALIDATIONS.inc("oidc", "valid")
             return payload
 
+        except ExpiredSignatureError as e:
+            TOKEN_VALIDATIONS.inc("oidc", "expired")
+            logger.warning("OIDC token expired", extra={"error": str(e)})
+            return None
+        except JWTClaimsError as e:
+            TOKEN_VALIDATIONS.inc("oidc", "invalid_claims")
+            logger.warning("OIDC token claims rejected", extra={"error": str(e)})
+            return None
         except JWTError as e:
-            print(f"JWT validation error: {e}")
+            TOKEN_VALIDATIONS.inc("oidc", "invalid")
+            logger.warning("OIDC token rejected", extra={"error": str(e)})
             return None
-        except Exception as e:
-            print(f"Token validation error: {e}")
+        except Exception:
+            TOKEN_VALIDATIONS.inc("oidc", "error")
+            logger.exception("OIDC token validation failed")
             return None
 
 
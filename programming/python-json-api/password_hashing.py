@@ -0,0 +1,57 @@
+import math
+import time
+
+from passlib.context import CryptContext
+
+# Bounds of the bcrypt cost parameter
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+# Cost measured first, cheap enough to time and extrapolate from
+PROBE_ROUNDS = 8
+
+
+def bcrypt_context(rounds: int) -> CryptContext:
+    """
+    Context hashing with exactly this bcrypt cost
+    Hashes of any other cost verify but are flagged for rehashing.
+    """
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+def bcrypt_rounds(context: CryptContext) -> int:
+    return context.handler("bcrypt").default_rounds
+
+
+def hash_time(rounds: int, samples: int = 3) -> float:
+    """Fastest of several bcrypt hashes at this cost, in seconds"""
+    context = bcrypt_context(rounds)
+    fastest = math.inf
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration-password")
+        fastest = min(fastest, time.perf_counter() - start)
+    return fastest
+
+
+def calibrate_rounds(
+    target: float, min_rounds: int = MIN_ROUNDS, max_rounds: int = MAX_ROUNDS
+) -> int:
+    """
+    Highest bcrypt cost whose hash time stays within target seconds
+    Each extra round doubles the work, so the cost is extrapolated from a
+    cheap probe and then checked with a single hash at the chosen cost.
+    """
+    min_rounds = max(min_rounds, MIN_ROUNDS)
+    max_rounds = min(max_rounds, MAX_ROUNDS)
+    probe = hash_time(PROBE_ROUNDS)
+    rounds = PROBE_ROUNDS + math.floor(math.log2(target / probe))
+    rounds = min(max(rounds, min_rounds), max_rounds)
+    while rounds > min_rounds and hash_time(rounds, samples=1) > target:
+        rounds -= 1
+    return rounds
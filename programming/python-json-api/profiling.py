@@ -0,0 +1,219 @@
+import gc
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from collections.abc import Sized
+from itertools import islice
+from types import FrameType
+from typing import Any
+
+# Sized by sys.getsizeof alone
+ATOMIC = (str, bytes, bytearray, int, float, complex, bool, type(None))
+
+# Allocations of the profiling machinery itself
+TRACEMALLOC_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _children(obj: Any) -> list | None:
+    if isinstance(obj, dict):
+        return [value for pair in obj.items() for value in pair]
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return list(obj)
+    if isinstance(obj, type):
+        # Classes built per instance, like local users, hold their data
+        return [value for value in vars(obj).values() if isinstance(value, ATOMIC)]
+    if hasattr(obj, "__dict__") and not callable(obj):
+        return [type(obj), vars(obj)]
+    return None
+
+
+def approximate_size(obj: Any, sample: int = 100, _seen: set | None = None) -> int:
+    """
+    Deep size of obj in bytes
+    Containers larger than sample are measured on an evenly spaced sample of
+    their elements, scaled to their length. Objects referenced twice are
+    counted once.
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, ATOMIC):
+        return size
+
+    if isinstance(obj, dict) and len(obj) > sample:
+        step = len(obj) // sample
+        pairs = list(islice(obj.items(), 0, None, step))
+        measured = sum(
+            approximate_size(key, sample, seen) + approximate_size(value, sample, seen)
+            for key, value in pairs
+        )
+        return size + measured * len(obj) // len(pairs)
+    children = _children(obj)
+    if not children:
+        return size
+    if len(children) > sample:
+        step = len(children) // sample
+        sampled = children[::step]
+        measured = sum(approximate_size(child, sample, seen) for child in sampled)
+        return size + measured * len(children) // len(sampled)
+    return size + sum(approximate_size(child, sample, seen) for child in children)
+
+
+def store_usage(stores: dict[str, Any], sample: int = 100) -> dict[str, dict]:
+    """Entries and approximate bytes per store"""
+    return {
+        name: {
+            "objects": len(store) if isinstance(store, Sized) else None,
+            "bytes": approximate_size(store, sample),
+        }
+        for name, store in stores.items()
+    }
+
+
+def top_types(limit: int = 20) -> list[dict]:
+    """Most numerous types among the objects tracked by the garbage collector"""
+    counts = Counter(type(obj).__qualname__ for obj in gc.get_objects())
+    return [{"type": name, "count": count} for name, count in counts.most_common(limit)]
+
+
+def process_rss() -> int | None:
+    """Resident memory of this process in bytes, on Linux"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class ProfilerBusy(Exception):
+    """A profile is already running in this worker"""
+
+
+class MemoryTracer:
+    """tracemalloc snapshots kept by ID for diffing"""
+
+    def __init__(self, max_snapshots: int = 8):
+        self.max_snapshots = max_snapshots
+        self.snapshots: OrderedDict[int, tracemalloc.Snapshot] = OrderedDict()
+        self._next_id = 1
+
+    def start(self, frames: int = 1):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.snapshots.clear()
+        tracemalloc.start(frames)
+
+    def stop(self):
+        tracemalloc.stop()
+        self.snapshots.clear()
+
+    def status(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            "snapshots": list(self.snapshots),
+        }
+
+    def take_snapshot(self) -> int:
+        """Raises RuntimeError unless tracing"""
+        snapshot = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+        snapshot_id = self._next_id
+        self._next_id += 1
+        self.snapshots[snapshot_id] = snapshot
+        while len(self.snapshots) > self.max_snapshots:
+            self.snapshots.popitem(last=False)
+        return snapshot_id
+
+    def diff(
+        self,
+        target: int,
+        base: int | None = None,
+        key_type: str = "lineno",
+        limit: int = 20,
+    ) -> list[dict]:
+        """
+        Allocation sites that grew the most between two snapshots, or the
+        largest ones of target without a base. Raises KeyError for an
+        unknown snapshot ID.
+        """
+        snapshot = self.snapshots[target]
+        if base is None:
+            stats = snapshot.statistics(key_type)
+        else:
+            stats = snapshot.compare_to(self.snapshots[base], key_type)
+        return [
+            {
+                "location": [
+                    f"{frame.filename}:{frame.lineno}" for frame in stat.traceback
+                ],
+                "size": stat.size,
+                "size_diff": getattr(stat, "size_diff", None),
+                "count": stat.count,
+                "count_diff": getattr(stat, "count_diff", None),
+            }
+            for stat in stats[:limit]
+        ]
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of one thread, usually the event loop, from a
+    background thread. One profile runs at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stack(frame: FrameType) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            name = getattr(code, "co_qualname", code.co_name)
+            names.append(f"{name} ({code.co_filename}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def profile(self, thread_id: int, seconds: float, interval: float) -> Counter:
+        """Sampled stacks of thread_id, root first, with their sample counts"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy
+        try:
+            samples = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is None:
+                    break
+                samples[self._stack(frame)] += 1
+                del frame
+                time.sleep(interval)
+            return samples
+        finally:
+            self._lock.release()
+
+
+def folded(samples: Counter) -> str:
+    """Collapsed stacks, as read by flamegraph.pl, speedscope and inferno"""
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+# Global profiling instances
+memory_tracer = MemoryTracer()
+profiler = SamplingProfiler()
@@ -0,0 +1,98 @@
+import hashlib
+import hmac
+import secrets
+from datetime import datetime, timedelta
+
+from pydantic import BaseModel
+
+
+class InvalidRefreshToken(Exception):
+    pass
+
+
+class RefreshTokenRecord(BaseModel):
+    subject: str
+    family: str
+    expires_at: datetime
+    used: bool = False
+
+
+class RefreshTokenStore:
+    """
+    Opaque rotating refresh tokens with server-side revocation
+    Only an HMAC digest of each token is stored, so renewing a session costs
+    an HMAC and a dict lookup. Reusing a rotated token revokes its family.
+    """
+
+    def __init__(self, secret: str, ttl: timedelta, purge_interval: int = 1024):
+        self.secret = secret.encode()
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.records: dict[str, RefreshTokenRecord] = {}
+        self.families: dict[str, set[str]] = {}
+        self._issued_since_purge = 0
+
+    def _digest(self, token: str) -> str:
+        return hmac.new(self.secret, token.encode(), hashlib.sha256).hexdigest()
+
+    def issue(self, subject: str, family: str | None = None) -> str:
+        self._issued_since_purge += 1
+        if self._issued_since_purge >= self.purge_interval:
+            self.purge()
+
+        token = secrets.token_urlsafe(32)
+        digest = self._digest(token)
+        if family is None:
+            family = secrets.token_hex(16)
+        self.records[digest] = RefreshTokenRecord(
+            subject=subject,
+            family=family,
+            expires_at=datetime.utcnow() + self.ttl,
+        )
+        self.families.setdefault(family, set()).add(digest)
+        return token
+
+    def rotate(self, token: str) -> tuple[str, str]:
+        """Exchange a refresh token for its subject and a new refresh token"""
+        digest = self._digest(token)
+        record = self.records.get(digest)
+        if record is None:
+            raise InvalidRefreshToken("Unknown refresh token")
+        if record.used:
+            # A rotated token was presented again, assume it has been stolen
+            self.revoke_family(record.family)
+            raise InvalidRefreshToken("Refresh token reuse detected")
+        if record.expires_at <= datetime.utcnow():
+            self.revoke_family(record.family)
+            raise InvalidRefreshToken("Refresh token expired")
+
+        record.used = True
+        return record.subject, self.issue(record.subject, record.family)
+
+    def revoke(self, token: str) -> bool:
+        record = self.records.get(self._digest(token))
+        if record is None:
+            return False
+        self.revoke_family(record.family)
+        return True
+
+    def revoke_family(self, family: str):
+        for digest in self.families.pop(family, set()):
+            self.records.pop(digest, None)
+
+    def purge(self):
+        """Drop expired tokens and families without tokens left"""
+        self._issued_since_purge = 0
+        now = datetime.utcnow()
+        for family, digests in list(self.families.items()):
+            expired = [d for d in digests if self.records[d].expires_at <= now]
+            for digest in expired:
+                digests.discard(digest)
+                del self.records[digest]
+            if not digests:
+                del self.families[family]
+
+    def clear(self):
+        self.records.clear()
+        self.families.clear()
+        self._issued_since_purge = 0
@@ -0,0 +1,312 @@
+"""
+Replay captured traffic against a local instance
+
+Re-drives a capture recorded with TRAFFIC_CAPTURE_PATH, keeping the original
+inter-arrival times divided by --speed, and reports latency percentiles per
+route. Requests of one user keep their order, each sent once the previous
+one finished. Users that the capture uses without registering them are
+registered and logged in before the clock starts.
+
+    python replay.py traffic.jsonl.gz --base-url http://127.0.0.1:8000 --speed 4
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import re
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from benchmark import percentile, summarize
+from traffic_capture import PLACEHOLDER, REPLAY_PASSWORD
+
+
+def read_capture(path: Path) -> list[dict]:
+    """
+    Request records of a capture file, appended captures played one after
+    the other
+    """
+    opener = gzip.open if path.suffix == ".gz" else open
+    records = []
+    base = 0.0
+    last = 0.0
+    with opener(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            record = json.loads(line)
+            if "capture" in record:
+                base = last
+                continue
+            record["t"] += base
+            last = max(last, record["t"])
+            records.append(record)
+    # Records are written as requests finish, replay them as they started
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def route_of(record: dict) -> str:
+    return f"{record['m']} " + PLACEHOLDER.sub("{id}", record["p"])
+
+
+class Bindings:
+    """Values captured placeholders stand for in this replay"""
+
+    def __init__(self):
+        # Run specific, so usernames and idempotency keys of a replay do not
+        # collide with an earlier replay against the same instance
+        self.nonce = uuid.uuid4().hex[:8]
+        self.tokens: dict[str, str] = {}
+        self.refresh_tokens: dict[str, str] = {}
+        self.ids: dict[str, str] = {}
+
+    def username(self, user: str) -> str:
+        return f"user-{user}-{self.nonce}"
+
+    def _fill(self, match: re.Match) -> str:
+        kind, value = match.groups()
+        if kind in ("user", "email"):
+            return self.username(value)
+        if kind == "token":
+            return self.tokens.get(value, "unknown")
+        if kind == "refresh":
+            return self.refresh_tokens.get(value, "unknown")
+        if kind == "id":
+            return self.ids.get(value, value)
+        if kind == "key":
+            return f"{value}-{self.nonce}"
+        if kind == "in":
+            at = datetime.now(timezone.utc) + timedelta(seconds=float(value))
+            return at.isoformat()
+        return match.group(0)
+
+    def render(self, value: Any) -> Any:
+        if isinstance(value, str):
+            return PLACEHOLDER.sub(self._fill, value)
+        if isinstance(value, dict):
+            return {key: self.render(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.render(item) for item in value]
+        return value
+
+    def bind(self, returned: dict, body: Any):
+        """Remember what the replayed response holds for captured values"""
+        if not isinstance(body, dict):
+            return
+        for field, captured in returned.items():
+            actual = body.get(field)
+            if actual is None:
+                continue
+            if field == "id":
+                self.ids[str(captured)] = str(actual)
+                continue
+            match = PLACEHOLDER.fullmatch(captured)
+            if match is None:
+                continue
+            kind, value = match.groups()
+            if kind == "token":
+                self.tokens[value] = actual
+            elif kind == "refresh":
+                self.refresh_tokens[value] = actual
+
+
+def users_to_prepare(records: list[dict]) -> list[str]:
+    """Users that the capture logs in or sends tokens of without registering"""
+    known: set[str] = set()
+    needed: list[str] = []
+
+    def use(user: str):
+        if user and user not in known:
+            known.add(user)
+            needed.append(user)
+
+    for record in records:
+        body = record.get("b")
+        username = body.get("username") if isinstance(body, dict) else None
+        match = PLACEHOLDER.fullmatch(username) if isinstance(username, str) else None
+        if match and record["p"] == "/register":
+            known.add(match.group(2))
+        elif match:
+            use(match.group(2))
+        token = PLACEHOLDER.search(record.get("h", {}).get("authorization", ""))
+        if token:
+            use(token.group(2))
+    return needed
+
+
+def sessions(records: list[dict]) -> list[str | None]:
+    """
+    User each record belongs to, from its credentials, or None
+    Refresh tokens belong to the user whose login or refresh returned them.
+    """
+    refresh_users: dict[str, str] = {}
+    result = []
+    for record in records:
+        found = PLACEHOLDER.findall(json.dumps([record.get("h"), record.get("b")]))
+        users = [value for kind, value in found if kind in ("user", "token") and value]
+        refreshed = [
+            refresh_users[value] for kind, value in found if value in refresh_users
+        ]
+        session = users[0] if users else (refreshed[0] if refreshed else None)
+        result.append(session)
+        if session is not None:
+            for kind, value in PLACEHOLDER.findall(json.dumps(record.get("r", {}))):
+                if kind == "refresh":
+                    refresh_users[value] = session
+    return result
+
+
+async def prepare(client: httpx.AsyncClient, records: list[dict], bindings: Bindings):
+    for user in users_to_prepare(records):
+        username = bindings.username(user)
+        response = await client.post(
+            "/register",
+            json={
+                "username": username,
+                "email": f"{username}@replay.invalid",
+                "password": REPLAY_PASSWORD,
+            },
+        )
+        response.raise_for_status()
+        response = await client.post(
+            "/login", json={"username": username, "password": REPLAY_PASSWORD}
+        )
+        response.raise_for_status()
+        bindings.tokens[user] = response.json()["access_token"]
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    records: list[dict],
+    speed: float = 1.0,
+    max_in_flight: int = 1000,
+) -> dict[str, Any]:
+    """Send records at their offsets divided by speed, results per route"""
+    bindings = Bindings()
+    await prepare(client, records, bindings)
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    mismatches: Counter = Counter()
+    lags: list[float] = []
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def send(record: dict, due: float, previous: asyncio.Task | None):
+        if previous is not None:
+            await asyncio.wait([previous])
+        # How far behind the capture's schedule requests are sent
+        lags.append(max(time.perf_counter() - due, 0.0))
+        route = route_of(record)
+        headers = bindings.render(record.get("h", {}))
+        if "b" in record:
+            options = {"json": bindings.render(record["b"])}
+        elif record.get("bl"):
+            options = {"content": b"x" * record["bl"]}
+        else:
+            options = {}
+        url = bindings.render(record["p"])
+        if record.get("q"):
+            url += "?" + record["q"]
+        start = time.perf_counter()
+        try:
+            response = await client.request(
+                record["m"], url, headers=headers, **options
+            )
+        except httpx.HTTPError:
+            errors[route] += 1
+            return
+        finally:
+            in_flight.release()
+        latencies[route].append(time.perf_counter() - start)
+        if response.status_code != record["s"]:
+            mismatches[route] += 1
+        if record.get("r") and response.is_success:
+            with suppress(ValueError):
+                bindings.bind(record["r"], response.json())
+
+    tasks = []
+    last: dict[str, asyncio.Task] = {}
+    start = time.perf_counter()
+    for record, session in zip(records, sessions(records), strict=True):
+        due = start + record["t"] / speed
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await in_flight.acquire()
+        # A user's requests keep their order, each waits for the previous one
+        # as the client that sent them did
+        previous = last.get(session) if session is not None else None
+        task = asyncio.create_task(send(record, due, previous))
+        if session is not None:
+            last[session] = task
+        tasks.append(task)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    routes = {}
+    for route in sorted(set(latencies) | set(errors)):
+        result = summarize(latencies[route], errors[route], elapsed)
+        result["p90_ms"] = percentile(latencies[route], 90) * 1000
+        result["status_mismatches"] = mismatches[route]
+        routes[route] = result
+    everything = [latency for samples in latencies.values() for latency in samples]
+    total = summarize(everything, sum(errors.values()), elapsed)
+    total["p90_ms"] = percentile(everything, 90) * 1000
+    total["status_mismatches"] = sum(mismatches.values())
+    total["max_lag_ms"] = max(lags, default=0.0) * 1000
+    total["captured_seconds"] = records[-1]["t"] if records else 0.0
+    total["elapsed_seconds"] = elapsed
+    return {"total": total, "routes": routes}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("capture", type=Path)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="Replay N times faster than captured"
+    )
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args(argv)
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    async def run():
+        records = read_capture(args.capture)
+        limits = httpx.Limits(max_connections=args.max_in_flight)
+        async with httpx.AsyncClient(
+            base_url=args.base_url, timeout=args.timeout, limits=limits
+        ) as client:
+            return await replay(client, records, args.speed, args.max_in_flight)
+
+    report = asyncio.run(run())
+    for name, result in [*report["routes"].items(), ("total", report["total"])]:
+        print(
+            f"{name:<32} {result['requests']:>8} req "
+            f"p50 {result['p50_ms']:>8.2f} ms p90 {result['p90_ms']:>8.2f} ms "
+            f"p99 {result['p99_ms']:>8.2f} ms errors {result['errors']} "
+            f"status changed {result['status_mismatches']}"
+        )
+    total = report["total"]
+    print(
+        f"replayed {total['captured_seconds']:.1f} s of traffic in "
+        f"{total['elapsed_seconds']:.1f} s, at most {total['max_lag_ms']:.1f} ms "
+        "behind schedule"
+    )
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import functools
+import inspect
+import logging
+import random
+from collections.abc import Callable
+from contextvars import ContextVar
+from time import perf_counter
+
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger("simple_json_api.timing")
+
+
+class RequestTimings:
+    """Accumulated stage durations of a single sampled request"""
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.stages: dict[str, float] = {}
+        self.endpoint_end: float | None = None
+
+    def add(self, name: str, duration: float):
+        self.stages[name] = self.stages.get(name, 0.0) + duration
+
+    def header_value(self, total: float) -> str:
+        metrics = [
+            f"{name};dur={duration * 1000:.3f}"
+            for name, duration in self.stages.items()
+        ]
+        metrics.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(metrics)
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+class _Stage:
+    __slots__ = ("name", "timings", "start")
+
+    def __init__(self, name: str, timings: RequestTimings):
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.add(self.name, perf_counter() - self.start)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str):
+    """
+    Context manager timing a stage of the current request
+    Costs a single context variable lookup when the request is not sampled
+    """
+    timings = _current.get()
+    if timings is None:
+        return _NULL_STAGE
+    return _Stage(name, timings)
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return await endpoint(*args, **kwargs)
+        start = perf_counter()
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            timings.endpoint_end = perf_counter()
+            timings.add("endpoint", timings.endpoint_end - start)
+
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """API route recording endpoint and response serialization stages"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = _timed_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            timings = _current.get()
+            if timings is not None and timings.endpoint_end is not None:
+                timings.add("serialize", perf_counter() - timings.endpoint_end)
+            return response
+
+        return timed_handler
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware emitting stage timings of sampled requests
+    as a Server-Timing response header and a structured log record
+    """
+
+    def __init__(self, app, sample_rate: Callable[[], float]):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        rate = self.sample_rate()
+        sampled = rate >= 1 or (rate > 0 and random.random() < rate)  # noqa: S311
+        if scope["type"] != "http" or not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status_code = None
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                total = perf_counter() - timings.start
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.header_value(total).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            total = perf_counter() - timings.start
+            route = scope.get("route")
+            logger.info(
+                "Request timing",
+                extra={
+                    "method": scope["method"],
+                    "path": getattr(route, "path", scope["path"]),
+                    "status": status_code,
+                    "total_ms": round(total * 1000, 3),
+                    "stages_ms": {
+                        name: round(duration * 1000, 3)
+                        for name, duration in timings.stages.items()
+                    },
+                },
+            )
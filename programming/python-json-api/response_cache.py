@@ -0,0 +1,131 @@
+import gzip
+import itertools
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from functools import cache
+
+from metrics import RESPONSE_CACHE_REQUESTS
+
+IDENTITY = "identity"
+
+
+@cache
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def supported_encodings() -> list[str]:
+    """Content codings in order of preference, br only with brotli installed"""
+    return (["br"] if _brotli() is not None else []) + ["gzip", IDENTITY]
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """Preferred supported coding allowed by an Accept-Encoding header"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, *params = (value.strip() for value in part.split(";"))
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.lower()] = weight
+
+    def weight(coding: str) -> float:
+        return weights.get(coding, weights.get("*", 0.0))
+
+    candidates = [coding for coding in supported_encodings() if coding != IDENTITY]
+    best = max(candidates, key=weight)
+    return best if weight(best) > 0 else IDENTITY
+
+
+def compress(body: bytes, encoding: str, level: int = 6) -> bytes:
+    if encoding == "gzip":
+        # A fixed mtime keeps the output identical for identical bodies
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    if encoding == "br":
+        return _brotli().compress(body, quality=min(level, 11))
+    return body
+
+
+class ResponseCache:
+    """
+    Serialized and compressed response bodies by owner, collection version
+    and content coding
+    Mutations invalidate an owner's collection by moving it to a new version,
+    whose bodies are rendered on the next read. Least recently used bodies
+    are evicted beyond max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[tuple[Hashable, int, str], bytes] = OrderedDict()
+        self.size = 0
+        self.versions: dict[Hashable, int] = {}
+        # Unix timestamps at which an owner's collection goes stale by itself
+        self.deadlines: dict[Hashable, float] = {}
+        self._clock = itertools.count(1)
+
+    def version(self, owner: Hashable) -> int:
+        deadline = self.deadlines.get(owner)
+        if deadline is not None and deadline <= time.time():
+            self.invalidate(owner)
+        return self.versions.get(owner, 0)
+
+    def expire_at(self, owner: Hashable, timestamp: float):
+        """Invalidate the owner's current collection at timestamp at the latest"""
+        if timestamp < self.deadlines.get(owner, float("inf")):
+            self.deadlines[owner] = timestamp
+
+    def invalidate(self, owner: Hashable):
+        old = self.versions.get(owner, 0)
+        # Versions are never reused, so stale bodies cannot be served
+        self.versions[owner] = next(self._clock)
+        self.deadlines.pop(owner, None)
+        for encoding in supported_encodings():
+            body = self.entries.pop((owner, old, encoding), None)
+            if body is not None:
+                self.size -= len(body)
+
+    def get_or_render(
+        self, owner: Hashable, encoding: str, render: Callable[[], bytes]
+    ) -> bytes:
+        """Cached body of the owner's current collection, rendered on a miss"""
+        key = (owner, self.version(owner), encoding)
+        body = self.entries.get(key)
+        if body is not None:
+            RESPONSE_CACHE_REQUESTS.inc(encoding, "hit")
+            self.entries.move_to_end(key)
+            return body
+        RESPONSE_CACHE_REQUESTS.inc(encoding, "miss")
+        body = render()
+        if len(body) <= self.max_bytes:
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+        return body
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+        self.versions.clear()
+        self.deadlines.clear()
+
+
+# Global response cache instance
+response_cache = ResponseCache()
@@ -0,0 +1,87 @@
+import hashlib
+import math
+import time
+
+
+class BloomFilter:
+    """Bloom filter using double hashing over a single BLAKE2b digest"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class RevocationList:
+    """
+    Revoked token IDs kept until the tokens expire
+    A Bloom filter answers for tokens that were never revoked, the common
+    case, and only possible matches are checked against the exact set.
+    """
+
+    def __init__(self, capacity: int = 10000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # jti -> expiry as a Unix timestamp
+        self.revoked: dict[str, float] = {}
+        self.bloom = BloomFilter(capacity, error_rate)
+
+    def revoke(self, jti: str, expires_at: float):
+        if expires_at <= time.time():
+            return
+        self.revoked[jti] = expires_at
+        if self.bloom.count >= self.bloom.capacity:
+            self.purge()
+        else:
+            self.bloom.add(jti)
+
+    def is_revoked(self, jti: str) -> bool:
+        if not self.revoked or jti not in self.bloom:
+            return False
+        expires_at = self.revoked.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def purge(self):
+        """Drop expired entries and rebuild the Bloom filter from the rest"""
+        now = time.time()
+        self.revoked = {
+            jti: expires_at
+            for jti, expires_at in self.revoked.items()
+            if expires_at > now
+        }
+        # Grow the filter when most entries are still live
+        capacity = max(self.capacity, 2 * len(self.revoked))
+        self.bloom = BloomFilter(capacity, self.error_rate)
+        for jti in self.revoked:
+            self.bloom.add(jti)
+
+    def clear(self):
+        self.revoked.clear()
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+
+
+# Global revocation list instance
+revocation_list = RevocationList()
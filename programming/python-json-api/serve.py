@@ -0,0 +1,64 @@
+"""
+Production launcher for the JSON API
+
+Runs the app under uvicorn with settings from ServerSettings, which command
+line options override.
+
+    simple-json-api --workers 4 --loop uvloop --http httptools
+
+With several workers, SIGHUP restarts them one at a time, each replacement
+serving before its predecessor is stopped. Workers that exit, for example
+after --max-requests, are replaced.
+"""
+
+import argparse
+import sys
+from typing import Any, Literal, get_args, get_origin
+
+from settings import ServerSettings
+
+
+def uvicorn_options(settings: ServerSettings) -> dict[str, Any]:
+    return {
+        "host": settings.host,
+        "port": settings.port,
+        "workers": settings.workers,
+        "loop": settings.loop,
+        "http": settings.http,
+        "timeout_keep_alive": settings.keep_alive,
+        "backlog": settings.backlog,
+        "limit_concurrency": settings.limit_concurrency,
+        "limit_max_requests": settings.max_requests,
+        "timeout_graceful_shutdown": settings.graceful_timeout,
+        "access_log": settings.access_log,
+        "log_level": settings.log_level,
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> dict[str, Any]:
+    """Options given on the command line, as ServerSettings overrides"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    for name, field in ServerSettings.model_fields.items():
+        flag = "--" + name.replace("_", "-")
+        if field.annotation is bool:
+            options = {"action": argparse.BooleanOptionalAction}
+        elif get_origin(field.annotation) is Literal:
+            options = {"choices": get_args(field.annotation)}
+        else:
+            options = {}
+        parser.add_argument(flag, help=field.description, **options)
+    args = parser.parse_args(argv)
+    return {name: value for name, value in vars(args).items() if value is not None}
+
+
+def main(argv: list[str] | None = None) -> int:
+    import uvicorn
+
+    settings = ServerSettings(**parse_args(argv))
+    # An import string, so that every worker process imports the app itself
+    uvicorn.run("main:app", **uvicorn_options(settings))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+from typing import Literal
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class ServerSettings(BaseSettings):
+    """
+    uvicorn settings of the production launcher
+    Read from SERVER_* environment variables or a .env file, e.g.
+    SERVER_WORKERS=4 or SERVER_LOOP=uvloop.
+    """
+
+    model_config = SettingsConfigDict(
+        env_prefix="SERVER_", env_file=".env", extra="ignore"
+    )
+
+    host: str = "0.0.0.0"  # noqa: S104
+    port: int = Field(default=8000, ge=0, le=65535)
+    workers: int = Field(
+        default=1,
+        ge=1,
+        description="Worker processes, each with its own in-memory stores",
+    )
+    loop: Literal["auto", "asyncio", "uvloop"] = "auto"
+    http: Literal["auto", "h11", "httptools"] = "auto"
+    keep_alive: int = Field(
+        default=5, ge=0, description="Seconds an idle connection is kept open"
+    )
+    backlog: int = Field(
+        default=2048, ge=1, description="Connections queued by the kernel"
+    )
+    limit_concurrency: int | None = Field(
+        default=None,
+        ge=1,
+        description="Connections per worker before answering 503",
+    )
+    max_requests: int | None = Field(
+        default=None,
+        ge=1,
+        description="Requests after which a worker is replaced by a fresh one",
+    )
+    graceful_timeout: int = Field(
+        default=30,
+        ge=0,
+        description="Seconds in-flight requests get to finish on shutdown",
+    )
+    access_log: bool = True
+    log_level: Literal["critical", "error", "warning", "info", "debug", "trace"] = (
+        "info"
+    )
@@ -0,0 +1,133 @@
+"""
+Startup cost of the API
+
+Reports the import time of main broken down by top-level package, as
+measured by `python -X importtime`, and the time to first request of a
+fresh interpreter: import, lifespan startup and one request. The test client
+import is reported separately as it is not part of a real worker.
+
+    python startup_time.py --top 15 --output startup.json
+    python startup_time.py --budget-ms 1500
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+FIRST_REQUEST_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client_imported = time.perf_counter()
+with TestClient(main.app) as client:
+    started = time.perf_counter()
+    status = client.get({path!r}).status_code
+    responded = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "client_import_ms": (client_imported - imported) * 1000,
+    "lifespan_ms": (started - client_imported) * 1000,
+    "first_request_ms": (responded - started) * 1000,
+    "status": status,
+}}))
+"""
+
+
+def parse_importtime(output: str) -> list[tuple[str, float]]:
+    """Self time in milliseconds of each imported module, in import order"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        modules.append((name.strip(), int(self_us) / 1000))
+    return modules
+
+
+def import_breakdown(module: str = "main") -> dict[str, Any]:
+    """Import time of a module in a fresh interpreter, by top-level package"""
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    packages: dict[str, float] = {}
+    for name, self_ms in parse_importtime(result.stderr):
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + self_ms
+    return {
+        "total_ms": sum(packages.values()),
+        "packages": dict(sorted(packages.items(), key=lambda item: -item[1])),
+    }
+
+
+def time_to_first_request(path: str = "/") -> dict[str, Any]:
+    """Interpreter start to first response of a new process, in milliseconds"""
+    start = time.perf_counter()
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", FIRST_REQUEST_SCRIPT.format(path=path)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_ms = (time.perf_counter() - start) * 1000
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return {"total_ms": total_ms, **timings}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--path", default="/", help="Path of the first request")
+    parser.add_argument("--top", type=int, default=10, help="Packages to list")
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        help="Fail when the time to first request exceeds this many milliseconds",
+    )
+    args = parser.parse_args(argv)
+
+    breakdown = import_breakdown(args.module)
+    first_request = time_to_first_request(args.path)
+
+    print(f"import {args.module:<30} {breakdown['total_ms']:>10.1f} ms")
+    for package, elapsed in list(breakdown["packages"].items())[: args.top]:
+        print(f"  {package:<34} {elapsed:>10.1f} ms")
+    print(f"time to first request {'':<16} {first_request['total_ms']:>10.1f} ms")
+    for stage in ("import_ms", "client_import_ms", "lifespan_ms", "first_request_ms"):
+        print(f"  {stage.removesuffix('_ms'):<34} {first_request[stage]:>10.1f} ms")
+
+    if args.output:
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            },
+            "import": breakdown,
+            "first_request": first_request,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.budget_ms is not None and first_request["total_ms"] > args.budget_ms:
+        print(
+            f"OVER BUDGET time to first request {first_request['total_ms']:.1f} ms "
+            f"> {args.budget_ms:.1f} ms",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
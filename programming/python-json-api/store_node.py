@@ -0,0 +1,266 @@
+"""
+Item store node for the sharded item store
+
+Holds the items of the owners that the API's hash ring assigns to it and
+serves them to the API over HTTP. Item ids end in the node id, so they stay
+unique when owners move between nodes.
+
+    python store_node.py serve --port 9001 --node-id 1
+    python store_node.py rebalance --from http://a:9001,http://b:9001 \\
+        --to http://a:9001,http://b:9001,http://c:9001
+"""
+
+import argparse
+import asyncio
+import hmac
+import itertools
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime
+
+from fastapi import Depends, FastAPI, Header, HTTPException
+from pydantic import BaseModel, ConfigDict
+
+from expiry import TimingWheel
+from item_shards import rebalance
+from item_store import ItemStore
+
+# Item ids are a sequence number times NODE_ID_SPACE plus the node id
+NODE_ID_SPACE = 1024
+# Required, two nodes with the same id would hand out the same item ids
+NODE_ID = int(os.environ["STORE_NODE_ID"]) if os.getenv("STORE_NODE_ID") else None
+# Shared secret the API sends in X-Shard-Token, empty accepts any request
+SHARD_TOKEN = os.getenv("SHARD_TOKEN", "")
+ITEM_SWEEP_INTERVAL = float(os.getenv("ITEM_SWEEP_INTERVAL", "1"))
+
+
+class NewItem(BaseModel):
+    """Item fields as the API validated them, stored as given"""
+
+    model_config = ConfigDict(extra="allow")
+
+    expires_at: datetime | None = None
+
+
+class StoredItem(NewItem):
+    id: int
+    # Opaque key the API derives from a user's stable identity
+    owner_id: str
+
+
+items = ItemStore()
+item_expiry = TimingWheel()
+sequence = itertools.count(1)
+# Owners a rebalance is moving, their items are read-only until it is done
+fenced: set[str] = set()
+
+
+async def sweep_expired_items():
+    while True:
+        await asyncio.sleep(ITEM_SWEEP_INTERVAL)
+        items.remove_many(item_expiry.advance())
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    if NODE_ID is None or not 0 <= NODE_ID < NODE_ID_SPACE:
+        raise RuntimeError(
+            f"STORE_NODE_ID must be set to a unique id in 0-{NODE_ID_SPACE - 1}"
+        )
+    sweeper = asyncio.create_task(sweep_expired_items())
+    yield
+    sweeper.cancel()
+    with suppress(asyncio.CancelledError):
+        await sweeper
+
+
+def check_token(x_shard_token: str | None = Header(None)):
+    if SHARD_TOKEN and not hmac.compare_digest(x_shard_token or "", SHARD_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid shard token")
+
+
+app = FastAPI(
+    title="Item store node", lifespan=lifespan, dependencies=[Depends(check_token)]
+)
+
+
+def is_live(item: StoredItem, now: float) -> bool:
+    return item.expires_at is None or item.expires_at.timestamp() > now
+
+
+def store(item: StoredItem):
+    items.add(item)
+    if item.expires_at is None:
+        item_expiry.remove(item.id)
+    else:
+        item_expiry.add(item.id, item.expires_at.timestamp())
+
+
+def check_writable(owner_id: str):
+    if owner_id in fenced:
+        raise HTTPException(status_code=409, detail="Owner is being moved")
+
+
+def owned_item(owner_id: str, item_id: int) -> StoredItem:
+    item = items.get(item_id)
+    if item is None or item.owner_id != owner_id or not is_live(item, time.time()):
+        raise HTTPException(status_code=404, detail="Item not found")
+    return item
+
+
+@app.get("/health")
+async def health():
+    return {"node_id": NODE_ID, "owners": len(items.partitions), "items": len(items)}
+
+
+@app.get("/owners")
+async def list_owners():
+    return list(items.partitions)
+
+
+@app.get("/fences")
+async def list_fences():
+    return sorted(fenced)
+
+
+@app.put("/owners/{owner_id}/fence")
+async def fence_owner(owner_id: str):
+    """Refuse writes to an owner's items while a rebalance moves them"""
+    fenced.add(owner_id)
+    return {"fenced": True}
+
+
+@app.delete("/owners/{owner_id}/fence")
+async def unfence_owner(owner_id: str):
+    fenced.discard(owner_id)
+    return {"fenced": False}
+
+
+@app.delete("/owners/{owner_id}")
+async def drop_owner(owner_id: str):
+    """Drop an owner's items once they moved to another node"""
+    removed = items.remove_many([item.id for item in items.snapshot(owner_id)])
+    for item in removed:
+        item_expiry.remove(item.id)
+    return {"deleted": len(removed)}
+
+
+@app.get("/owners/{owner_id}/items")
+async def list_items(owner_id: str):
+    now = time.time()
+    return [item for item in items.snapshot(owner_id) if is_live(item, now)]
+
+
+@app.post("/owners/{owner_id}/items")
+async def create_item(owner_id: str, data: NewItem):
+    check_writable(owner_id)
+    item_id = next(sequence) * NODE_ID_SPACE + NODE_ID
+    item = StoredItem(**data.model_dump(), id=item_id, owner_id=owner_id)
+    store(item)
+    return item
+
+
+@app.get("/owners/{owner_id}/items/export")
+async def export_items(owner_id: str):
+    """All of an owner's items, expired ones included, for rebalancing"""
+    return list(items.snapshot(owner_id))
+
+
+@app.post("/owners/{owner_id}/items/import")
+async def import_items(owner_id: str, imported: list[StoredItem]):
+    """
+    Merge items moved from another node
+    Items already stored as imported, by an earlier run of an interrupted
+    rebalance, are skipped. Any other item with the same id means two nodes
+    handed out the same ids, and nothing is imported.
+    """
+    conflicts = [
+        item.id
+        for item in imported
+        if item.owner_id != owner_id or items.get(item.id) not in (None, item)
+    ]
+    if conflicts:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Conflicting item ids", "ids": conflicts},
+        )
+    count = 0
+    for item in imported:
+        if items.get(item.id) is None:
+            store(item)
+            count += 1
+    return {"imported": count}
+
+
+@app.get("/owners/{owner_id}/items/{item_id}")
+async def get_item(owner_id: str, item_id: int):
+    return owned_item(owner_id, item_id)
+
+
+@app.put("/owners/{owner_id}/items/{item_id}")
+async def replace_item(owner_id: str, item_id: int, data: NewItem):
+    check_writable(owner_id)
+    owned_item(owner_id, item_id)
+    item = StoredItem(**data.model_dump(), id=item_id, owner_id=owner_id)
+    store(item)
+    return item
+
+
+@app.delete("/owners/{owner_id}/items/{item_id}")
+async def delete_item(owner_id: str, item_id: int):
+    check_writable(owner_id)
+    item = owned_item(owner_id, item_id)
+    items.remove(item_id)
+    item_expiry.remove(item_id)
+    return item
+
+
+def parse_nodes(value: str) -> list[str]:
+    return [node.strip() for node in value.split(",") if node.strip()]
+
+
+def main(argv: list[str] | None = None) -> int:
+    global NODE_ID
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="Run a store node")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=9001)
+    serve.add_argument(
+        "--node-id",
+        type=int,
+        default=NODE_ID,
+        required=NODE_ID is None,
+        choices=range(NODE_ID_SPACE),
+        metavar=f"0-{NODE_ID_SPACE - 1}",
+        help="Unique per node, required unless STORE_NODE_ID is set",
+    )
+    serve.add_argument("--log-level", default="info")
+    move = commands.add_parser(
+        "rebalance", help="Move owners from the nodes of one ring to another"
+    )
+    move.add_argument("--from", dest="nodes", type=parse_nodes, required=True)
+    move.add_argument("--to", dest="new_nodes", type=parse_nodes, required=True)
+    move.add_argument("--vnodes", type=int, default=128)
+    args = parser.parse_args(argv)
+
+    if args.command == "rebalance":
+        moved = asyncio.run(
+            rebalance(args.nodes, args.new_nodes, args.vnodes, SHARD_TOKEN or None)
+        )
+        print(json.dumps(moved))
+        return 0
+
+    import uvicorn
+
+    NODE_ID = args.node_id
+    uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
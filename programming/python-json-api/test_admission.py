@@ -0,0 +1,105 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from admission import AdmissionRejected, ConcurrencyLimiter, RateLimiter
+from main import app, items_db, users_db
+from metrics import ADMISSION_REJECTIONS, registry
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+    registry.clear()
+
+
+def test_limiter_rejects_when_queue_full():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=1, max_wait=1.0)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+
+        with pytest.raises(AdmissionRejected, match="queue full"):
+            await limiter.acquire()
+
+        # Releasing hands the slot over to the waiter
+        limiter.release()
+        await waiter
+        assert limiter.active == 1
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_limiter_wait_deadline():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=10, max_wait=0.01)
+        await limiter.acquire()
+        with pytest.raises(AdmissionRejected, match="wait deadline exceeded"):
+            await limiter.acquire()
+        assert limiter.queued == 0
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(rate=2.0, burst=2.0)
+    assert limiter.acquire("a", now=0.0) == 0
+    assert limiter.acquire("a", now=0.0) == 0
+    assert limiter.acquire("a", now=0.0) == pytest.approx(0.5)
+    assert limiter.acquire("b", now=0.0) == 0
+    assert limiter.acquire("a", now=0.5) == 0
+
+
+def test_rate_limiter_bounded_clients():
+    limiter = RateLimiter(rate=1.0, burst=1.0, max_clients=2)
+    for client_id in ["a", "b", "c"]:
+        limiter.acquire(client_id, now=0.0)
+    assert list(limiter.buckets) == ["b", "c"]
+
+
+def test_login_rate_limited():
+    client.post(
+        "/register",
+        json={"username": "limited", "email": "l@example.com", "password": "pw"},
+    )
+    with patch("main.password_rate_limiter", RateLimiter(rate=0.5, burst=1.0)):
+        login_data = {"username": "limited", "password": "pw"}
+        assert client.post("/login", json=login_data).status_code == 200
+        response = client.post("/login", json=login_data)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert ADMISSION_REJECTIONS.value("/login", "rate_limited") == 1
+
+
+def test_register_rejected_when_busy():
+    with patch("main.register_limiter", ConcurrencyLimiter(0, 0, 0.0)):
+        response = client.post(
+            "/register",
+            json={"username": "busy", "email": "b@example.com", "password": "pw"},
+        )
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert users_db == []
+    assert ADMISSION_REJECTIONS.value("/register", "queue_full") == 1
+
+
+def test_login_releases_slot_on_failure():
+    limiter = ConcurrencyLimiter(1, 0, 0.0)
+    with patch("main.login_limiter", limiter):
+        response = client.post("/login", json={"username": "nobody", "password": "x"})
+    assert response.status_code == 401
+    assert limiter.active == 0
@@ -2,7 +2,7 @@ import pytest
 from fastapi.testclient import TestClient
 
 import main
-from main import app, items_db, users_db
+from main import app, items_db, response_cache, users_db
 
 client = TestClient(app)
 
@@ -11,6 +11,7 @@ client = TestClient(app)
 def reset_db():
     users_db.clear()
     items_db.clear()
+    response_cache.clear()
     main.next_user_id = 1
     main.next_id = 1
 
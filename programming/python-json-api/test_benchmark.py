@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import benchmark
+import main
+from main import items_db, users_db
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+def test_percentile():
+    samples = [float(i) for i in range(1, 101)]
+    assert benchmark.percentile(samples, 50) == 50.0
+    assert benchmark.percentile(samples, 95) == 95.0
+    assert benchmark.percentile(samples, 99) == 99.0
+    assert benchmark.percentile([3.0], 99) == 3.0
+    assert benchmark.percentile([], 50) == 0.0
+
+
+def test_compare_results():
+    baseline = {"auth_me": {"throughput_rps": 1000.0, "p95_ms": 1.0}}
+    assert (
+        benchmark.compare_results(
+            {"auth_me": {"throughput_rps": 900.0, "p95_ms": 1.1}}, baseline, 0.2
+        )
+        == []
+    )
+    regressions = benchmark.compare_results(
+        {"auth_me": {"throughput_rps": 700.0, "p95_ms": 1.5}}, baseline, 0.2
+    )
+    assert len(regressions) == 2
+    assert benchmark.compare_results({"new": {}}, baseline, 0.2) == []
+
+
+def run_requests(statuses: list[int]) -> dict:
+    async def request(i: int) -> httpx.Response:
+        return httpx.Response(statuses[i])
+
+    return asyncio.run(benchmark.run_requests(len(statuses), 4, request))
+
+
+def test_run_requests_counts_errors_apart_from_requests():
+    result = run_requests([200] * 150 + [401] * 50)
+    assert result["requests"] == 150
+    assert result["errors"] == 50
+    assert benchmark.error_rate(result) == 0.25
+
+
+def test_compare_results_fails_on_more_errors():
+    baseline = {"login": run_requests([200] * 200)}
+    (regression,) = [
+        line
+        for line in benchmark.compare_results(
+            {"login": run_requests([200] * 150 + [401] * 50)}, baseline, 10.0
+        )
+        if "errors" in line
+    ]
+    assert "50 errors (25.00%)" in regression
+
+    same_rate = run_requests([200] * 398 + [500] * 2)
+    base = run_requests([200] * 199 + [500])
+    assert not [
+        line
+        for line in benchmark.compare_results(
+            {"login": same_rate}, {"login": base}, 10.0
+        )
+        if "errors" in line
+    ]
+
+
+def test_baseline_from_another_mode_is_rejected(tmp_path):
+    baseline = tmp_path / "bench.json"
+    baseline.write_text(json.dumps({"meta": {"mode": "asgi"}, "results": {}}))
+    with pytest.raises(SystemExit) as exited:
+        benchmark.main(["--mode", "server", "--baseline", str(baseline)])
+    assert exited.value.code == 2
+
+
+@pytest.mark.slow
+def test_asgi_benchmark(tmp_path):
+    output = tmp_path / "bench.json"
+    exit_code = benchmark.main(
+        [
+            "--users",
+            "1",
+            "--items",
+            "2",
+            "--requests",
+            "4",
+            "--scenarios",
+            "auth_me,oidc_auth_me,items_create,items_list,items_delete",
+            "--output",
+            str(output),
+        ]
+    )
+    assert exit_code == 0
+    report = json.loads(output.read_text())
+    results = report["results"]
+    assert set(results) == {
+        "auth_me[users=1,items=2]",
+        "oidc_auth_me[users=1,items=2]",
+        "items_create[users=1,items=2]",
+        "items_list[users=1,items=2]",
+        "items_delete[users=1,items=2]",
+    }
+    assert all(result["errors"] == 0 for result in results.values())
+    assert not main.OIDC_ENABLED
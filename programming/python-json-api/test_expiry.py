@@ -0,0 +1,212 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from expiry import TimingWheel
+from item_stats import item_stats
+from main import (
+    app,
+    item_expiry,
+    item_index,
+    items_db,
+    response_cache,
+    text_index,
+    users_db,
+)
+from metrics import ITEMS_EXPIRED
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    item_stats.clear()
+    item_index.clear()
+    text_index.clear()
+    item_expiry.clear()
+    response_cache.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+@pytest.fixture
+def auth_headers():
+    credentials = {"username": "alice", "password": "pw"}
+    client.post("/register", json={**credentials, "email": "a@x.com"})
+    token = client.post("/login", json=credentials).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def in_seconds(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+def create(headers: dict, name: str, expires_in: float | None = None) -> dict:
+    item = {"name": name, "price": 1.0}
+    if expires_in is not None:
+        item["expires_at"] = in_seconds(expires_in)
+    return client.post("/items", json=item, headers=headers).json()
+
+
+@pytest.mark.parametrize(("slots", "levels"), [(4, 2), (8, 3), (64, 4)])
+def test_wheel_fires_like_a_sorted_list(slots, levels):
+    rng = random.Random(slots)  # noqa: S311
+    wheel = TimingWheel(tick=1.0, slots=slots, levels=levels, start=0)
+    deadlines = {}
+    now = 0
+    for key in range(2000):
+        deadline = now + rng.uniform(-5, slots ** (levels + 1))
+        wheel.add(key, deadline)
+        deadlines[key] = deadline
+        if rng.random() < 0.1:
+            removed = rng.choice(list(deadlines))
+            assert wheel.remove(removed)
+            del deadlines[removed]
+        if rng.random() < 0.2:
+            now += rng.randint(1, slots)
+            fired = set(wheel.advance(now))
+            due = {key for key, deadline in deadlines.items() if deadline <= now}
+            assert fired == due
+            for key in fired:
+                del deadlines[key]
+    assert len(wheel) == len(deadlines)
+    fired = set(wheel.advance(now + slots ** (levels + 2)))
+    assert fired == set(deadlines)
+    assert len(wheel) == 0
+
+
+def test_wheel_never_fires_early():
+    wheel = TimingWheel(tick=1.0, start=100.0)
+    wheel.add("a", 100.5)
+    assert wheel.advance(100.9) == []
+    assert wheel.advance(101.0) == ["a"]
+    # Readding replaces the deadline
+    wheel.add("b", 105)
+    wheel.add("b", 110)
+    assert wheel.advance(109) == []
+    assert wheel.advance(110) == ["b"]
+
+
+def test_create_item_with_expiry(auth_headers):
+    item = create(auth_headers, "Reservation", expires_in=60)
+    assert datetime.fromisoformat(item["expires_at"]) > datetime.now(timezone.utc)
+    assert len(item_expiry) == 1
+
+    # Times without a zone are UTC
+    naive = (datetime.utcnow() + timedelta(minutes=5)).isoformat()
+    response = client.post(
+        "/items",
+        json={"name": "Naive", "price": 1.0, "expires_at": naive},
+        headers=auth_headers,
+    )
+    assert datetime.fromisoformat(
+        response.json()["expires_at"]
+    ).utcoffset() == timedelta(0)
+
+    response = client.post(
+        "/items",
+        json={"name": "Past", "price": 1.0, "expires_at": in_seconds(-1)},
+        headers=auth_headers,
+    )
+    assert response.status_code == 422
+
+
+def test_expired_items_are_hidden_before_the_sweep(auth_headers):
+    create(auth_headers, "Reservation", expires_in=30)
+    create(auth_headers, "Permanent")
+    assert len(client.get("/items", headers=auth_headers).json()) == 2
+
+    later = time.time() + 60
+    with patch("time.time", return_value=later):
+        assert [
+            i["name"] for i in client.get("/items", headers=auth_headers).json()
+        ] == ["Permanent"]
+        assert client.get("/items/1", headers=auth_headers).status_code == 404
+        search = client.get("/items/search?q=reservation", headers=auth_headers)
+        assert search.json() == []
+        by_price = client.get("/items/search?min_price=0", headers=auth_headers)
+        assert [i["name"] for i in by_price.json()] == ["Permanent"]
+        by_prefix = client.get("/items/search?prefix=res", headers=auth_headers)
+        assert by_prefix.json() == []
+        item = {"name": "Renewed", "price": 1.0}
+        assert (
+            client.put("/items/1", json=item, headers=auth_headers).status_code == 404
+        )
+        assert client.delete("/items/1", headers=auth_headers).status_code == 404
+    # Still stored until swept
+    assert len(items_db) == 2
+
+
+def test_stats_leave_out_expired_items_before_the_sweep(auth_headers):
+    reservation = create(auth_headers, "Reservation", expires_in=30)
+    client.post("/items", json={"name": "Kept", "price": 3.0}, headers=auth_headers)
+    assert client.get("/items/stats", headers=auth_headers).json()["count"] == 2
+
+    # Just past the expiry, before the wheel's tick for it
+    expired = datetime.fromisoformat(reservation["expires_at"]).timestamp()
+    with patch("time.time", return_value=expired + 0.001):
+        stats = client.get("/items/stats", headers=auth_headers).json()
+    assert stats["count"] == 1
+    assert stats["min_price"] == stats["max_price"] == 3.0
+    assert [item.name for item in items_db] == ["Kept"]
+
+
+def test_pending_holds_timers_of_the_next_tick():
+    wheel = TimingWheel(slots=4, levels=2, start=0)
+    for key, expires_at in [("a", 0.5), ("b", 2.5), ("c", 4.0), ("d", 6.5)]:
+        wheel.add(key, expires_at)
+    assert wheel.pending() == ["a"]
+    assert wheel.advance(2) == ["a"]
+    assert wheel.pending() == ["b"]
+    assert wheel.advance(3) == ["b"]
+    # Still on the second level, the wheel cascades it at tick 4
+    assert wheel.pending() == ["c"]
+    assert wheel.advance(4) == ["c"]
+    assert wheel.pending() == []
+
+
+def test_expire_items(auth_headers):
+    create(auth_headers, "Reservation", expires_in=30)
+    create(auth_headers, "Other reservation", expires_in=90)
+    create(auth_headers, "Permanent")
+    before = ITEMS_EXPIRED.value()
+
+    assert main.expire_items(time.time()) == 0
+    assert main.expire_items(time.time() + 60) == 1
+    assert [item.name for item in items_db] == ["Other reservation", "Permanent"]
+    assert ITEMS_EXPIRED.value() == before + 1
+    assert item_stats.summary(1, 1)["count"] == 2
+    assert len(item_expiry) == 1
+
+
+def test_update_reschedules_expiry(auth_headers):
+    create(auth_headers, "Reservation", expires_in=30)
+    item = {"name": "Reservation", "price": 1.0, "expires_at": in_seconds(120)}
+    client.put("/items/1", json=item, headers=auth_headers)
+    assert main.expire_items(time.time() + 60) == 0
+    assert main.expire_items(time.time() + 180) == 1
+
+    create(auth_headers, "Reservation", expires_in=30)
+    client.put("/items/2", json={"name": "Kept", "price": 1.0}, headers=auth_headers)
+    assert len(item_expiry) == 0
+
+
+def test_sweeper_runs_in_lifespan(auth_headers):
+    with (
+        patch("main.ITEM_SWEEP_INTERVAL", 0.01),
+        patch("main.init_oidc_providers"),
+        TestClient(app) as live_client,
+    ):
+        create(auth_headers, "Reservation", expires_in=0.2)
+        deadline = time.monotonic() + 5
+        while items_db and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not items_db
+        assert live_client.get("/items", headers=auth_headers).json() == []
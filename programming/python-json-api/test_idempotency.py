@@ -0,0 +1,211 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.responses import JSONResponse
+
+import main
+from idempotency import IdempotencyCache, IdempotencyKeyReused
+from main import app, idempotency_cache, items_db, refresh_tokens, users_db
+from metrics import IDEMPOTENT_REQUESTS
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    refresh_tokens.clear()
+    idempotency_cache.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+def login(username: str) -> dict:
+    credentials = {"username": username, "password": "pw"}
+    client.post("/register", json={**credentials, "email": f"{username}@x.com"})
+    return client.post("/login", json=credentials).json()
+
+
+@pytest.fixture
+def auth_headers():
+    return {"Authorization": f"Bearer {login('alice')['access_token']}"}
+
+
+def test_retried_create_returns_the_original_item(auth_headers):
+    headers = {**auth_headers, "Idempotency-Key": "create-1"}
+    item = {"name": "Laptop", "price": 999.0}
+    first = client.post("/items", json=item, headers=headers)
+    retry = client.post("/items", json=item, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert len(items_db) == 1
+    assert main.next_id == 2
+
+    # Another key is another request
+    headers["Idempotency-Key"] = "create-2"
+    assert client.post("/items", json=item, headers=headers).json()["id"] == 2
+
+
+def test_requests_without_key_are_not_stored(auth_headers):
+    item = {"name": "Laptop", "price": 999.0}
+    client.post("/items", json=item, headers=auth_headers)
+    client.post("/items", json=item, headers=auth_headers)
+    assert len(items_db) == 2
+    assert len(idempotency_cache) == 0
+
+
+def test_key_reused_with_different_request(auth_headers):
+    headers = {**auth_headers, "Idempotency-Key": "key"}
+    client.post("/items", json={"name": "Laptop", "price": 1.0}, headers=headers)
+    before = IDEMPOTENT_REQUESTS.value("mismatch")
+    response = client.post(
+        "/items", json={"name": "Phone", "price": 1.0}, headers=headers
+    )
+    assert response.status_code == 422
+    assert IDEMPOTENT_REQUESTS.value("mismatch") == before + 1
+    response = client.put(
+        "/items/1", json={"name": "Laptop", "price": 1.0}, headers=headers
+    )
+    assert response.status_code == 422
+    assert len(items_db) == 1
+
+
+def test_keys_are_scoped_per_user(auth_headers):
+    other_headers = {"Authorization": f"Bearer {login('bob')['access_token']}"}
+    item = {"name": "Laptop", "price": 1.0}
+    for headers in (auth_headers, other_headers):
+        client.post("/items", json=item, headers={**headers, "Idempotency-Key": "k"})
+    assert [item.owner_id for item in items_db] == [1, 2]
+
+
+def test_client_errors_are_replayed(auth_headers):
+    headers = {**auth_headers, "Idempotency-Key": "delete-1"}
+    client.post("/items", json={"name": "Laptop", "price": 1.0}, headers=auth_headers)
+    assert client.delete("/items/1", headers=headers).status_code == 200
+    retry = client.delete("/items/1", headers=headers)
+    assert retry.status_code == 200
+    assert retry.json() == {"message": "Item deleted successfully"}
+
+    headers["Idempotency-Key"] = "update-1"
+    item = {"name": "Phone", "price": 2.0}
+    assert client.put("/items/1", json=item, headers=headers).status_code == 404
+    retry = client.put("/items/1", json=item, headers=headers)
+    assert retry.status_code == 404
+    assert retry.json() == {"detail": "Item not found"}
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+
+def test_invalid_key(auth_headers):
+    headers = {**auth_headers, "Idempotency-Key": "x" * 256}
+    response = client.post("/items", json={"name": "a", "price": 1.0}, headers=headers)
+    assert response.status_code == 422
+
+
+def test_retried_login_skips_password_check():
+    client.post(
+        "/register", json={"username": "alice", "email": "a@x.com", "password": "pw"}
+    )
+    credentials = {"username": "alice", "password": "pw"}
+    headers = {"Idempotency-Key": "login-1"}
+    with patch("main.authenticate_user", wraps=main.authenticate_user) as authenticate:
+        first = client.post("/login", json=credentials, headers=headers)
+        retry = client.post("/login", json=credentials, headers=headers)
+    assert authenticate.call_count == 1
+    assert retry.json() == first.json()
+
+    # The password is part of the request
+    response = client.post(
+        "/login", json={"username": "alice", "password": "guess"}, headers=headers
+    )
+    assert response.status_code == 422
+
+
+def test_retried_register():
+    user = {"username": "alice", "email": "a@x.com", "password": "pw"}
+    headers = {"Idempotency-Key": "register-1"}
+    first = client.post("/register", json=user, headers=headers)
+    retry = client.post("/register", json=user, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert client.post("/register", json=user).status_code == 400
+
+
+def test_retried_refresh_does_not_revoke_the_login():
+    tokens = login("alice")
+    body = {"refresh_token": tokens["refresh_token"]}
+    headers = {"Idempotency-Key": "refresh-1"}
+    first = client.post("/refresh", json=body, headers=headers)
+    retry = client.post("/refresh", json=body, headers=headers)
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    # Reuse detection would have revoked the rotated token
+    response = client.post(
+        "/refresh", json={"refresh_token": first.json()["refresh_token"]}
+    )
+    assert response.status_code == 200
+
+
+def test_concurrent_duplicates_wait_for_the_first():
+    cache = IdempotencyCache()
+    calls = 0
+
+    async def handler():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return JSONResponse({"id": calls}, status_code=201)
+
+    async def run_all():
+        return await asyncio.gather(
+            *(cache.run("alice", "key", "fp", handler) for _ in range(10))
+        )
+
+    results = asyncio.run(run_all())
+    assert calls == 1
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert {bytes(response.body) for response, _ in results} == {b'{"id":1}'}
+    assert {response.status_code for response, _ in results} == {201}
+
+    with pytest.raises(IdempotencyKeyReused):
+        asyncio.run(cache.run("alice", "key", "other", handler))
+
+
+def test_failed_requests_are_not_stored():
+    cache = IdempotencyCache()
+
+    async def handler():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.run("alice", "key", "fp", handler))
+    assert len(cache) == 0
+
+
+def test_bounds_and_expiry():
+    cache = IdempotencyCache(ttl=60, max_keys=2, max_scopes=2)
+
+    async def handler():
+        return JSONResponse({})
+
+    def store(scope, key):
+        asyncio.run(cache.run(scope, key, "fp", handler))
+
+    with patch("idempotency.time.time", return_value=1000.0):
+        store("alice", "a")
+        store("alice", "b")
+        store("alice", "c")
+        # Oldest key of the user is evicted
+        assert list(cache.scopes["alice"]) == ["b", "c"]
+        store("bob", "a")
+        store("carol", "a")
+        # Least recently written user is dropped
+        assert list(cache.scopes) == ["bob", "carol"]
+    with patch("idempotency.time.time", return_value=1060.0):
+        assert cache.get("bob", "a") is None
+        assert "bob" not in cache.scopes
+        assert len(cache) == 1
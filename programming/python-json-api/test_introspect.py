@@ -0,0 +1,141 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import app, items_db, oidc_config, users_db
+from oidc_config import OIDCProvider
+
+client = TestClient(app, headers={"X-Introspect-Token": "gateway-secret"})
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+    oidc_config.providers.clear()
+    main.introspect_rate_limiter.clear()
+    with patch("main.INTROSPECT_TOKEN", "gateway-secret"):
+        yield
+
+
+@pytest.fixture
+def access_token():
+    client.post(
+        "/register",
+        json={"username": "gateway", "email": "g@example.com", "password": "pw"},
+    )
+    response = client.post("/login", json={"username": "gateway", "password": "pw"})
+    return response.json()["access_token"]
+
+
+def test_introspect_local_tokens(access_token):
+    response = client.post(
+        "/auth/introspect", json={"tokens": [access_token, "invalid", access_token]}
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 3
+
+    active = results[0]
+    assert active["active"] is True
+    assert active["user_id"] == 1
+    assert active["username"] == "gateway"
+    assert active["auth_type"] == "local"
+    assert active["claims"]["sub"] == "gateway"
+    assert results[1] == {
+        "active": False,
+        "user_id": None,
+        "username": None,
+        "auth_type": None,
+        "claims": None,
+    }
+    assert results[2] == active
+
+
+def test_introspect_deduplicates_tokens(access_token):
+    with patch("main.validate_access_token", wraps=main.validate_access_token) as spy:
+        response = client.post(
+            "/auth/introspect", json={"tokens": [access_token] * 100 + ["invalid"] * 5}
+        )
+    assert response.status_code == 200
+    assert len(response.json()["results"]) == 105
+    assert spy.call_count == 2
+
+
+def test_introspect_oidc_token():
+    oidc_config.providers["test-provider"] = OIDCProvider(
+        name="test-provider", issuer="https://test-issuer.com", client_id="client"
+    )
+    payload = {
+        "sub": "oidc-123",
+        "iss": "https://test-issuer.com",
+        "email": "oidc@example.com",
+        "name": "OIDC User",
+    }
+    with (
+        patch("main.OIDC_ENABLED", True),
+        patch("main.oidc_config.validate_token", return_value=payload),
+    ):
+        response = client.post("/auth/introspect", json={"tokens": ["oidc-token"]})
+
+    result = response.json()["results"][0]
+    assert result["active"] is True
+    assert result["auth_type"] == "oidc"
+    assert result["claims"] == payload
+    # Introspection does not provision users
+    assert result["user_id"] is None
+    assert len(users_db) == 0
+
+    user = asyncio.run(main.provision_oidc_user(payload, "test-provider"))
+    with (
+        patch("main.OIDC_ENABLED", True),
+        patch("main.oidc_config.validate_token", return_value=payload),
+    ):
+        response = client.post("/auth/introspect", json={"tokens": ["oidc-token"]})
+    assert response.json()["results"][0]["user_id"] == user.id
+
+
+def test_introspect_requires_the_introspection_token():
+    body = {"tokens": ["invalid"]}
+    anonymous = TestClient(app)
+    assert anonymous.post("/auth/introspect", json=body).status_code == 401
+    response = anonymous.post(
+        "/auth/introspect", json=body, headers={"X-Introspect-Token": "guess"}
+    )
+    assert response.status_code == 401
+    with patch("main.INTROSPECT_TOKEN", None):
+        assert client.post("/auth/introspect", json=body).status_code == 401
+
+
+def test_introspect_is_throttled():
+    with patch.object(main.introspect_rate_limiter, "burst", 2):
+        codes = [
+            client.post("/auth/introspect", json={"tokens": []}).status_code
+            for _ in range(3)
+        ]
+    assert codes == [200, 200, 429]
+
+
+def test_user_ids_are_unique_across_threads():
+    payloads = [{"sub": f"user-{n}", "iss": "i"} for n in range(200)]
+    with ThreadPoolExecutor(8) as pool:
+        users = list(pool.map(lambda p: main.create_oidc_user(p, "p"), payloads))
+    assert len({user.id for user in users}) == 200
+
+
+def test_introspect_batch_limit():
+    tokens = ["invalid"] * (main.INTROSPECT_MAX_TOKENS + 1)
+    response = client.post("/auth/introspect", json={"tokens": tokens})
+    assert response.status_code == 422
+
+
+def test_introspect_empty_batch():
+    response = client.post("/auth/introspect", json={"tokens": []})
+    assert response.status_code == 200
+    assert response.json() == {"results": []}
@@ -0,0 +1,129 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from item_index import ItemIndex
+from main import Item, app, item_index, item_stats, items_db, users_db
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    item_stats.clear()
+    item_index.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+@pytest.fixture
+def auth_headers():
+    user_data = {
+        "username": "searchuser",
+        "email": "search@example.com",
+        "password": "searchpass123",
+    }
+    client.post("/register", json=user_data)
+    login_response = client.post(
+        "/login", json={"username": "searchuser", "password": "searchpass123"}
+    )
+    token = login_response.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def make_item(item_id, name, price, owner_id=1):
+    return Item(id=item_id, name=name, price=price, owner_id=owner_id)
+
+
+def test_price_range():
+    index = ItemIndex()
+    for item_id, price in enumerate([30.0, 10.0, 20.0, 20.0, 40.0], start=1):
+        index.add(make_item(item_id, f"Item {item_id}", price))
+    index.add(make_item(6, "Other", 25.0, owner_id=2))
+
+    items = list(index.price_range(1, 15.0, 30.0))
+    assert [item.id for item in items] == [3, 4, 1]
+    assert [item.price for item in index.price_range(1, max_price=10.0)] == [10.0]
+    assert len(list(index.price_range(1))) == 5
+    assert list(index.price_range(3)) == []
+
+
+def test_name_prefix_case_insensitive():
+    index = ItemIndex()
+    for item_id, name in enumerate(["Laptop", "lamp", "Desk", "LAN cable"], start=1):
+        index.add(make_item(item_id, name, 1.0))
+
+    assert [item.name for item in index.name_prefix(1, "la")] == [
+        "lamp",
+        "LAN cable",
+        "Laptop",
+    ]
+    assert [item.name for item in index.name_prefix(1, "Desk")] == ["Desk"]
+    assert list(index.name_prefix(1, "z")) == []
+
+
+def test_remove():
+    index = ItemIndex()
+    item = make_item(1, "Laptop", 10.0)
+    index.add(item)
+    index.add(make_item(2, "Laptop", 10.0))
+    index.remove(item)
+
+    assert [i.id for i in index.price_range(1)] == [2]
+    assert [i.id for i in index.name_prefix(1, "lap")] == [2]
+
+    index.remove(make_item(2, "Laptop", 10.0))
+    assert 1 not in index.by_price
+    assert 1 not in index.by_name
+
+
+def test_search_endpoint_tracks_mutations(auth_headers):
+    items_data = [
+        {"name": "Laptop", "price": 1299.99},
+        {"name": "Lamp", "price": 39.99},
+        {"name": "Desk", "price": 249.0},
+    ]
+    for item in items_data:
+        client.post("/items", json=item, headers=auth_headers)
+
+    response = client.get("/items/search?min_price=100", headers=auth_headers)
+    assert response.status_code == 200
+    assert [item["name"] for item in response.json()] == ["Desk", "Laptop"]
+
+    client.put(
+        "/items/1", json={"name": "Notebook", "price": 999.0}, headers=auth_headers
+    )
+    client.delete("/items/2", headers=auth_headers)
+
+    response = client.get("/items/search?prefix=la", headers=auth_headers)
+    assert response.json() == []
+
+    response = client.get(
+        "/items/search?prefix=no&max_price=1000", headers=auth_headers
+    )
+    assert [item["id"] for item in response.json()] == [1]
+
+    response = client.get("/items/search?limit=1", headers=auth_headers)
+    assert [item["name"] for item in response.json()] == ["Desk"]
+
+
+def test_search_only_own_items(auth_headers):
+    client.post("/items", json={"name": "Mine", "price": 1.0}, headers=auth_headers)
+    client.post(
+        "/register",
+        json={"username": "other", "email": "other@example.com", "password": "pw"},
+    )
+    token = client.post("/login", json={"username": "other", "password": "pw"}).json()[
+        "access_token"
+    ]
+    response = client.get(
+        "/items/search?prefix=mi", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.json() == []
+
+
+def test_search_no_auth():
+    response = client.get("/items/search")
+    assert response.status_code == 403
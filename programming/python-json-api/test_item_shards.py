@@ -0,0 +1,388 @@
+import asyncio
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import store_node
+from benchmark import free_port
+from item_shards import HashRing, ShardedItemStore, ShardUnavailable, rebalance
+from main import app, items_db, users_db
+
+NODES = 3
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+@pytest.fixture(scope="module")
+def node_urls():
+    ports = [free_port() for _ in range(NODES)]
+    processes = [
+        subprocess.Popen(  # noqa: S603
+            [
+                sys.executable,
+                "store_node.py",
+                "serve",
+                "--port",
+                str(port),
+                "--node-id",
+                str(node_id),
+                "--log-level",
+                "warning",
+            ],
+            cwd=Path(__file__).parent,
+        )
+        for node_id, port in enumerate(ports)
+    ]
+    urls = [f"http://127.0.0.1:{port}" for port in ports]
+    try:
+        for url in urls:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    httpx.get(f"{url}/health").raise_for_status()
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.1)
+        yield urls
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+@pytest.fixture
+def nodes(node_urls):
+    for url in node_urls:
+        for owner in httpx.get(f"{url}/owners").json():
+            httpx.delete(f"{url}/owners/{owner}")
+        for owner in httpx.get(f"{url}/fences").json():
+            httpx.delete(f"{url}/owners/{owner}/fence")
+    return node_urls
+
+
+def stored_on(url: str) -> int:
+    return httpx.get(f"{url}/health").json()["items"]
+
+
+def test_ring_spreads_keys_and_moves_few_on_add():
+    ring = HashRing([f"node{i}" for i in range(4)])
+    owners = range(4000)
+    before = {owner: ring.node_for(owner) for owner in owners}
+    for node in ring.nodes:
+        assert 600 < list(before.values()).count(node) < 1400
+
+    ring.add("node4")
+    after = {owner: ring.node_for(owner) for owner in owners}
+    moved = [owner for owner in owners if before[owner] != after[owner]]
+    # Only keys taken over by the new node move
+    assert {after[owner] for owner in moved} == {"node4"}
+    assert 400 < len(moved) < 1200
+
+    ring.remove("node4")
+    assert {owner: ring.node_for(owner) for owner in owners} == before
+
+
+def test_ring_without_nodes():
+    with pytest.raises(LookupError):
+        HashRing().node_for(1)
+
+
+def test_items_are_routed_to_the_owning_node(nodes):
+    store = ShardedItemStore(nodes)
+    with (
+        patch("main.item_shards", store),
+        patch("main.init_oidc_providers"),
+        TestClient(app) as client,
+    ):
+        credentials = {"username": "alice", "password": "pw"}
+        client.post("/register", json={**credentials, "email": "a@x.com"})
+        token = client.post("/login", json=credentials).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        created = [
+            client.post(
+                "/items", json={"name": name, "price": 1.0}, headers=headers
+            ).json()
+            for name in ("a", "b")
+        ]
+        assert [item["owner_id"] for item in created] == [1, 1]
+        first, second = (item["id"] for item in created)
+        owner_node = store.ring.node_for(main.shard_owner(users_db[0]))
+        assert [stored_on(url) for url in nodes] == [
+            2 if url == owner_node else 0 for url in nodes
+        ]
+
+        client.put(f"/items/{first}", json={"name": "A", "price": 2.0}, headers=headers)
+        assert client.get(f"/items/{first}", headers=headers).json()["name"] == "A"
+        assert client.delete(f"/items/{second}", headers=headers).status_code == 200
+        assert client.delete(f"/items/{second}", headers=headers).status_code == 404
+        names = [item["name"] for item in client.get("/items", headers=headers).json()]
+        assert names == ["A"]
+        assert client.get("/items/stats", headers=headers).status_code == 501
+        assert len(items_db) == 0
+
+        credentials = {"username": "bob", "password": "pw"}
+        client.post("/register", json={**credentials, "email": "b@x.com"})
+        token = client.post("/login", json=credentials).json()["access_token"]
+        other = {"Authorization": f"Bearer {token}"}
+        assert client.get(f"/items/{first}", headers=other).status_code == 404
+        assert client.get("/items", headers=other).json() == []
+
+
+def test_items_outlive_api_user_ids(nodes):
+    def login(client, username):
+        credentials = {"username": username, "password": "pw"}
+        client.post("/register", json={**credentials, "email": f"{username}@x.com"})
+        token = client.post("/login", json=credentials).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    store = ShardedItemStore(nodes)
+    with (
+        patch("main.item_shards", store),
+        patch("main.init_oidc_providers"),
+        TestClient(app) as client,
+    ):
+        headers = login(client, "alice")
+        client.post("/items", json={"name": "a", "price": 1.0}, headers=headers)
+
+        # A restarted API hands out user ids from 1 again
+        users_db.clear()
+        main.next_user_id = 1
+        headers = login(client, "mallory")
+        assert users_db[0].id == 1
+        assert client.get("/items", headers=headers).json() == []
+
+        headers = login(client, "alice")
+        items = client.get("/items", headers=headers).json()
+        assert [(item["name"], item["owner_id"]) for item in items] == [("a", 2)]
+
+
+def test_shard_owner_is_stable_and_path_safe():
+    local = type("User", (), {"id": 1, "username": "a/b c"})()
+    oidc = type(
+        "User",
+        (),
+        {"id": 1, "username": "a/b c", "oidc_provider": "p", "oidc_subject": "s"},
+    )()
+    assert main.shard_owner(local) == main.shard_owner(local)
+    assert main.shard_owner(local) != main.shard_owner(oidc)
+    assert main.shard_owner(local).isalnum()
+
+
+def test_unreachable_node_is_a_503():
+    node = f"http://127.0.0.1:{free_port()}"
+    with pytest.raises(ShardUnavailable):
+        asyncio.run(ShardedItemStore([node], timeout=1.0).items(1))
+    with (
+        patch("main.item_shards", ShardedItemStore([node], timeout=1.0)),
+        patch("main.init_oidc_providers"),
+        TestClient(app) as client,
+    ):
+        credentials = {"username": "alice", "password": "pw"}
+        client.post("/register", json={**credentials, "email": "a@x.com"})
+        token = client.post("/login", json=credentials).json()["access_token"]
+        response = client.get("/items", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 503
+
+
+def test_node_id_is_required():
+    with patch("store_node.NODE_ID", None):
+        with pytest.raises(SystemExit) as exited:
+            store_node.main(["serve"])
+        assert exited.value.code == 2
+        with pytest.raises(RuntimeError), TestClient(store_node.app):
+            pass
+
+
+def test_import_rejects_conflicting_ids():
+    node = TestClient(store_node.app)
+    store_node.items.clear()
+    with patch("store_node.NODE_ID", 1):
+        item = node.post("/owners/a/items", json={"name": "x", "price": 1.0}).json()
+        other = node.post("/owners/b/items", json={"name": "y", "price": 2.0}).json()
+    # The same items again, as when an interrupted rebalance runs again
+    response = node.post("/owners/a/items/import", json=[item])
+    assert response.json() == {"imported": 0}
+
+    # Another node with the same node id handed out the same ids
+    response = node.post(
+        "/owners/a/items/import",
+        json=[{**item, "id": item["id"] + 1024 * 100}, {**item, "name": "clash"}],
+    )
+    assert response.status_code == 409
+    assert response.json()["detail"]["ids"] == [item["id"]]
+    response = node.post("/owners/a/items/import", json=[{**other, "owner_id": "a"}])
+    assert response.status_code == 409
+    # Nothing of a conflicting import is stored
+    assert [i["name"] for i in node.get("/owners/a/items").json()] == ["x"]
+    store_node.items.clear()
+
+
+def test_rebalance_onto_an_added_node(nodes):
+    old, new = nodes[:2], nodes
+    owners = range(1, 41)
+
+    async def fill() -> dict:
+        store = ShardedItemStore(old)
+        ids = {}
+        for owner in owners:
+            for _ in range(2):
+                item = await store.create(owner, {"name": "item", "price": 1.0})
+                ids.setdefault(owner, []).append(item["id"])
+        await store.aclose()
+        return ids
+
+    ids = asyncio.run(fill())
+    assert stored_on(nodes[2]) == 0
+
+    moved = asyncio.run(rebalance(old, new))
+    ring = HashRing(new)
+    expected = [owner for owner in owners if ring.node_for(owner) == nodes[2]]
+    assert moved == {"owners": len(expected), "items": 2 * len(expected)}
+    assert stored_on(nodes[2]) == 2 * len(expected)
+    assert sum(stored_on(url) for url in nodes) == 2 * len(owners)
+
+    async def read() -> dict:
+        store = ShardedItemStore(new)
+        ids = {
+            owner: [item["id"] for item in await store.items(owner)] for owner in owners
+        }
+        await store.aclose()
+        return ids
+
+    assert asyncio.run(read()) == ids
+    # A second run has nothing left to move
+    assert asyncio.run(rebalance(new, new)) == {"owners": 0, "items": 0}
+
+
+def test_items_are_found_on_the_previous_ring_until_moved(nodes):
+    old, new = nodes[:2], nodes
+    owners = [str(owner) for owner in range(1, 41)]
+    ring, previous = HashRing(new), HashRing(old)
+    moving = [
+        owner for owner in owners if ring.node_for(owner) != previous.node_for(owner)
+    ]
+    assert moving
+    reads = []
+
+    async def run():
+        stale = ShardedItemStore(old)
+        ids = {}
+        for owner in owners:
+            for _ in range(2):
+                item = await stale.create(owner, {"name": "item", "price": 1.0})
+                ids.setdefault(owner, []).append(item["id"])
+        await stale.aclose()
+
+        # The API restarted on the new ring while the rebalance runs
+        store = ShardedItemStore(new, previous_nodes=old)
+
+        async def read() -> dict:
+            return {
+                owner: [item["id"] for item in await store.items(owner)]
+                for owner in owners
+            }
+
+        reads.append(await read())
+        assert reads[0] == ids
+        owner = moving[0]
+        first, second = ids[owner]
+        assert (await store.get(owner, first))["id"] == first
+        updated = await store.replace(owner, first, {"name": "renamed", "price": 2.0})
+        assert updated["name"] == "renamed"
+        assert (await store.delete(owner, second))["id"] == second
+        ids[owner].remove(second)
+        created = await store.create(owner, {"name": "new", "price": 1.0})
+        ids[owner].append(created["id"])
+
+        class Rebalancer(httpx.AsyncClient):
+            async def get(self, url, **kwargs):
+                response = await super().get(url, **kwargs)
+                if url.endswith("/export") and len(reads) == 2:
+                    # The first owner is moving and the others wait
+                    reads.append(await read())
+                return response
+
+        reads.append(await read())
+        with patch("httpx.AsyncClient", Rebalancer):
+            await rebalance(old, new)
+        reads.append(await read())
+        assert (await store.get(owner, first))["name"] == "renamed"
+        await store.aclose()
+        return ids
+
+    ids = asyncio.run(run())
+    assert len(reads) == 4
+    # Before, during and after the rebalance, in whatever order
+    for read in reads[1:]:
+        assert {owner: sorted(read[owner]) for owner in owners} == {
+            owner: sorted(ids[owner]) for owner in owners
+        }
+
+
+def test_writes_during_a_move_are_refused(nodes):
+    old, new = nodes[:2], nodes
+    ring = HashRing(new)
+    owner = next(str(o) for o in range(1000) if ring.node_for(str(o)) == nodes[2])
+    outcomes = {}
+
+    async def run():
+        # A worker still on the old ring, and one already on the new ring
+        stale = ShardedItemStore(old)
+        current = ShardedItemStore(new)
+        kept = await stale.create(owner, {"name": "kept", "price": 1.0})
+        assert current.client is not None
+
+        class Rebalancer(httpx.AsyncClient):
+            async def get(self, url, **kwargs):
+                response = await super().get(url, **kwargs)
+                if url.endswith("/export"):
+                    writes = {
+                        "create_old": lambda: stale.create(owner, {"name": "lost"}),
+                        "delete_old": lambda: stale.delete(owner, kept["id"]),
+                        "delete_new": lambda: current.delete(owner, kept["id"]),
+                        "create_new": lambda: current.create(owner, {"name": "new"}),
+                    }
+                    for name, write in writes.items():
+                        try:
+                            outcomes[name] = await write()
+                        except ShardUnavailable:
+                            outcomes[name] = "refused"
+                return response
+
+        with patch("httpx.AsyncClient", Rebalancer):
+            moved = await rebalance(old, new)
+        names = [item["name"] for item in await current.items(owner)]
+        # Writable again once moved
+        await current.create(owner, {"name": "after", "price": 1.0})
+        await stale.aclose()
+        await current.aclose()
+        return moved, names
+
+    moved, names = asyncio.run(run())
+    assert outcomes == dict.fromkeys(outcomes, "refused")
+    assert len(outcomes) == 4
+    assert moved == {"owners": 1, "items": 1}
+    assert names == ["kept"]
+    assert all(httpx.get(f"{url}/fences").json() == [] for url in nodes)
+
+
+def test_rebalance_releases_fences_of_an_interrupted_run(nodes):
+    httpx.put(f"{nodes[0]}/owners/someone/fence")
+    asyncio.run(rebalance(nodes, nodes))
+    assert httpx.get(f"{nodes[0]}/fences").json() == []
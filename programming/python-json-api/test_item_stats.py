@@ -0,0 +1,120 @@
+import statistics
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from item_stats import ItemStats
+from main import app, item_stats, items_db, users_db
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    item_stats.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+@pytest.fixture
+def auth_headers():
+    user_data = {
+        "username": "statsuser",
+        "email": "stats@example.com",
+        "password": "statspass123",
+    }
+    client.post("/register", json=user_data)
+    login_response = client.post(
+        "/login", json={"username": "statsuser", "password": "statspass123"}
+    )
+    token = login_response.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_summary_empty():
+    stats = ItemStats()
+    summary = stats.summary(1)
+    assert summary["count"] == 0
+    assert summary["min_price"] is None
+    assert summary["histogram"] == []
+
+
+def test_summary_add_and_remove():
+    stats = ItemStats()
+    for price in [10.0, 20.0, 30.0, 40.0]:
+        stats.add(1, price)
+    stats.add(2, 1000.0)
+    stats.remove(1, 40.0)
+
+    summary = stats.summary(1, bins=2)
+    assert summary["count"] == 3
+    assert summary["total_price"] == 60.0
+    assert summary["min_price"] == 10.0
+    assert summary["max_price"] == 30.0
+    assert summary["mean_price"] == 20.0
+    assert summary["stddev_price"] == pytest.approx(8.16496580927726)
+    assert [b["count"] for b in summary["histogram"]] == [1, 2]
+
+
+def test_stddev_of_large_close_prices():
+    stats = ItemStats()
+    prices = [1e9 + 0.1 * n for n in range(1, 6)]
+    for price in prices:
+        stats.add(1, price)
+    # Churn that made running sums of squares drift
+    for n in range(1000):
+        stats.add(1, 1e9 + n)
+        stats.remove(1, 1e9 + n)
+
+    summary = stats.summary(1)
+    assert summary["mean_price"] == pytest.approx(1e9 + 0.3, abs=1e-6)
+    assert summary["stddev_price"] == pytest.approx(statistics.pstdev(prices), rel=1e-6)
+
+
+def test_summary_remove_last_item():
+    stats = ItemStats()
+    stats.add(1, 5.0)
+    stats.remove(1, 5.0)
+    assert stats.summary(1)["count"] == 0
+    assert 1 not in stats.owners
+
+
+def test_histogram_identical_prices():
+    stats = ItemStats()
+    for _ in range(3):
+        stats.add(1, 7.5)
+    histogram = stats.summary(1, bins=4)["histogram"]
+    assert sum(b["count"] for b in histogram) == 3
+
+
+def test_stats_endpoint_tracks_mutations(auth_headers):
+    for price in [10.0, 20.0, 30.0]:
+        client.post(
+            "/items", json={"name": "Item", "price": price}, headers=auth_headers
+        )
+    client.put("/items/1", json={"name": "Item", "price": 50.0}, headers=auth_headers)
+    client.delete("/items/2", headers=auth_headers)
+
+    response = client.get("/items/stats?bins=4", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 2
+    assert data["total_price"] == 80.0
+    assert data["min_price"] == 30.0
+    assert data["max_price"] == 50.0
+    assert data["mean_price"] == 40.0
+    assert len(data["histogram"]) == 4
+    assert sum(b["count"] for b in data["histogram"]) == 2
+
+
+def test_stats_endpoint_no_auth():
+    response = client.get("/items/stats")
+    assert response.status_code == 403
+
+
+def test_stats_endpoint_invalid_bins(auth_headers):
+    response = client.get("/items/stats?bins=0", headers=auth_headers)
+    assert response.status_code == 422
@@ -0,0 +1,143 @@
+import gc
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from item_store import ItemStore
+from main import Item, app, item_index, item_stats, items_db, text_index, users_db
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    item_stats.clear()
+    item_index.clear()
+    text_index.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+@pytest.fixture
+def auth_headers():
+    credentials = {"username": "alice", "password": "pw"}
+    client.post("/register", json={**credentials, "email": "a@x.com"})
+    token = client.post("/login", json=credentials).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def make_item(item_id, name, owner_id=1):
+    return Item(id=item_id, name=name, price=1.0, owner_id=owner_id)
+
+
+def test_add_get_remove():
+    store = ItemStore()
+    store.add(make_item(1, "a"))
+    store.add(make_item(2, "b", owner_id=2))
+    store.add(make_item(1, "a2"))
+    assert store.get(1).name == "a2"
+    assert len(store) == 2
+    assert [item.id for item in store] == [1, 2]
+
+    assert store.remove(1).name == "a2"
+    assert store.remove(1) is None
+    assert store.get(1) is None
+    assert store.partitions == {2: {2: make_item(2, "b", owner_id=2)}}
+    assert [item.id for item in store.remove_many([2, 3])] == [2]
+    assert len(store) == 0
+
+
+def test_snapshots_are_isolated_from_writes():
+    store = ItemStore()
+    for item_id in range(1, 4):
+        store.add(make_item(item_id, f"item {item_id}"))
+    store.add(make_item(4, "other", owner_id=2))
+
+    owner = store.snapshot(1)
+    everything = store.snapshot()
+    store.add(make_item(2, "renamed"))
+    store.remove(3)
+    store.add(make_item(5, "new"))
+    store.remove(4)
+
+    assert [item.name for item in owner.items(1)] == ["item 1", "item 2", "item 3"]
+    assert owner.items(2) == []
+    assert len(everything) == 4
+    assert everything.get(4).name == "other"
+    assert [item.name for item in store.snapshot(1)] == ["item 1", "renamed", "new"]
+    assert store.get(4) is None
+
+
+def test_writes_are_in_place_without_snapshots():
+    store = ItemStore()
+    store.add(make_item(1, "a"))
+    partition = store.partitions[1]
+    store.add(make_item(2, "b"))
+    assert store.partitions[1] is partition
+
+    snapshot = store.snapshot(1)
+    store.add(make_item(3, "c"))
+    copied = store.partitions[1]
+    assert copied is not partition
+    # Copied once per snapshot, not per write
+    store.add(make_item(4, "d"))
+    assert store.partitions[1] is copied
+    assert len(snapshot) == 2
+
+
+def test_iterating_while_writing():
+    store = ItemStore()
+    for item_id in range(1, 6):
+        store.add(make_item(item_id, "item"))
+    for item in store:
+        store.remove(item.id)
+        store.add(make_item(item.id + 10, "item"))
+    assert sorted(item.id for item in store) == [11, 12, 13, 14, 15]
+
+
+def test_snapshot_usage():
+    store = ItemStore()
+    for item_id in range(1, 4):
+        store.add(make_item(item_id, "item"))
+    assert store.snapshot_usage()["snapshots"] == 0
+
+    snapshot = store.snapshot(1)
+    usage = store.snapshot_usage()
+    # Nothing is retained while the snapshot shares the live partition
+    assert usage["snapshots"] == 1
+    assert usage["retained_partitions"] == 0
+
+    store.remove(1)
+    store.add(make_item(2, "renamed"))
+    usage = store.snapshot_usage()
+    assert usage["retained_partitions"] == 1
+    assert usage["retained_items"] == 2
+    assert usage["retained_bytes"] > 0
+
+    del snapshot
+    gc.collect()
+    assert store.snapshot_usage() == {
+        "snapshots": 0,
+        "retained_partitions": 0,
+        "retained_items": 0,
+        "retained_bytes": 0,
+    }
+
+
+def test_item_endpoints_use_the_store(auth_headers):
+    for name in ("a", "b", "c"):
+        client.post("/items", json={"name": name, "price": 1.0}, headers=auth_headers)
+    client.put("/items/2", json={"name": "B", "price": 2.0}, headers=auth_headers)
+    client.delete("/items/3", headers=auth_headers)
+
+    names = [item["name"] for item in client.get("/items", headers=auth_headers).json()]
+    assert names == ["a", "B"]
+    assert client.get("/items/2", headers=auth_headers).json()["price"] == 2.0
+    assert client.get("/items/3", headers=auth_headers).status_code == 404
+    assert len(items_db) == 2
+
+    metrics = client.get("/metrics").text
+    assert 'item_snapshots{measure="retained_items"}' in metrics
@@ -0,0 +1,227 @@
+import base64
+import hmac
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+
+import bench_jwt
+from jwt_backend import (
+    BACKENDS,
+    ExpiredSignatureError,
+    JWTBackend,
+    JWTClaimsError,
+    JWTError,
+    get_backend,
+)
+
+ISSUER = "https://issuer.example.com"
+AUDIENCE = "client"
+BACKEND_NAMES = list(BACKENDS)
+
+
+@pytest.fixture(scope="module", params=["HS256", "RS256", "ES256"])
+def keys(request):
+    algorithm = request.param
+    signing_key, verifying_key = bench_jwt.generate_keys(algorithm)
+    _, other_key = bench_jwt.generate_keys(algorithm)
+    if algorithm == "HS256":
+        other_key = "another-secret"
+    return algorithm, signing_key, verifying_key, other_key
+
+
+def b64(data: dict | list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+
+def claims(**overrides):
+    base = {
+        "sub": "user",
+        "iss": ISSUER,
+        "aud": AUDIENCE,
+        "iat": int(time.time()),
+        "exp": int(time.time()) + 600,
+    }
+    base.update(overrides)
+    return {name: value for name, value in base.items() if value is not None}
+
+
+def outcome(backend_name, token, key, algorithm, **kwargs):
+    kwargs.setdefault("audience", AUDIENCE)
+    kwargs.setdefault("issuer", ISSUER)
+    try:
+        return get_backend(backend_name).decode(
+            token, key, algorithms=[algorithm], **kwargs
+        )
+    except JWTError as e:
+        return type(e)
+
+
+def assert_conformant(token, key, algorithm, expected, **kwargs):
+    outcomes = {
+        name: outcome(name, token, key, algorithm, **kwargs) for name in BACKEND_NAMES
+    }
+    for name, result in outcomes.items():
+        if isinstance(expected, type):
+            assert result is expected, name
+        else:
+            assert result == expected, name
+
+
+@pytest.mark.parametrize("signer", BACKEND_NAMES)
+def test_tokens_verify_across_backends(keys, signer):
+    algorithm, signing_key, verifying_key, _ = keys
+    payload = claims()
+    token = get_backend(signer).encode(payload, signing_key, algorithm=algorithm)
+    assert_conformant(token, verifying_key, algorithm, payload)
+    assert_conformant(token, {"keys": [verifying_key]}, algorithm, payload)
+
+
+@pytest.mark.parametrize(
+    ("payload", "kwargs", "expected"),
+    [
+        (claims(exp=int(time.time()) - 60), {}, ExpiredSignatureError),
+        (claims(nbf=int(time.time()) + 600), {}, JWTClaimsError),
+        (claims(iat="yesterday"), {}, JWTClaimsError),
+        (claims(aud="someone-else"), {}, JWTClaimsError),
+        (claims(aud=["someone-else", AUDIENCE]), {}, None),
+        (claims(aud=[1]), {}, JWTClaimsError),
+        (claims(aud=None), {}, None),
+        (claims(), {"audience": None}, JWTClaimsError),
+        (claims(iss="https://evil.example.com"), {}, JWTClaimsError),
+        (claims(iss=None), {}, JWTClaimsError),
+        (claims(iss=None), {"issuer": None}, None),
+        (claims(sub=42), {}, JWTClaimsError),
+        (claims(jti=42), {}, JWTClaimsError),
+        (claims(at_hash="abc"), {}, JWTClaimsError),
+    ],
+)
+def test_claims_validation(keys, payload, kwargs, expected):
+    algorithm, signing_key, verifying_key, _ = keys
+    token = get_backend("jose").encode(payload, signing_key, algorithm=algorithm)
+    assert_conformant(
+        token,
+        verifying_key,
+        algorithm,
+        payload if expected is None else expected,
+        **kwargs,
+    )
+
+
+def test_rejects_tampered_tokens(keys):
+    algorithm, signing_key, verifying_key, other_key = keys
+    token = get_backend("jose").encode(claims(), signing_key, algorithm=algorithm)
+    header, payload, signature = token.split(".")
+
+    forged_payload = f"{header}.{b64(claims(sub='admin'))}.{signature}"
+    assert_conformant(forged_payload, verifying_key, algorithm, JWTError)
+
+    forged_signature = f"{header}.{payload}.{signature[::-1]}"
+    assert_conformant(forged_signature, verifying_key, algorithm, JWTError)
+
+    assert_conformant(token, other_key, algorithm, JWTError)
+
+
+def test_rejects_disallowed_algorithms(keys):
+    algorithm, signing_key, verifying_key, _ = keys
+    token = get_backend("jose").encode(claims(), signing_key, algorithm=algorithm)
+    other = "HS512" if algorithm != "HS512" else "HS256"
+    assert_conformant(token, verifying_key, other, JWTError)
+
+    header = b64({"alg": "none", "typ": "JWT"})
+    unsigned = f"{header}.{b64(claims())}."
+    assert_conformant(unsigned, verifying_key, algorithm, JWTError)
+
+
+def test_rejects_hmac_with_public_key():
+    private_pem, _ = bench_jwt.generate_keys("RS256")
+    backend = get_backend("cryptography")
+    public_pem = backend._load_key(private_pem, "RS256", private=False).public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    # A token signed with the public key as an HMAC secret
+    header = b64({"alg": "HS256", "typ": "JWT"})
+    signing_input = f"{header}.{b64(claims())}".encode()
+    signature = base64.urlsafe_b64encode(
+        hmac.new(public_pem, signing_input, "sha256").digest()
+    )
+    token = f"{signing_input.decode()}.{signature.rstrip(b'=').decode()}"
+    assert_conformant(token, public_pem.decode(), "HS256", JWTError)
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "",
+        "abc",
+        "a.b",
+        "!!!.@@@.###",
+        f"{b64(['not', 'an', 'object'])}.{b64(claims())}.sig",
+        f"{b64({'typ': 'JWT'})}.{b64(claims())}.sig",
+    ],
+)
+def test_rejects_malformed_tokens(token):
+    assert_conformant(token, "secret", "HS256", JWTError)
+
+
+def test_payload_must_be_an_object():
+    header = b64({"alg": "HS256", "typ": "JWT"})
+    signing_input = f"{header}.{b64(['list'])}".encode()
+    signature = base64.urlsafe_b64encode(
+        hmac.new(b"key", signing_input, "sha256").digest()
+    )
+    token = f"{signing_input.decode()}.{signature.rstrip(b'=').decode()}"
+    assert_conformant(token, "key", "HS256", JWTError)
+
+
+def test_deterministic_tokens_are_identical():
+    for algorithm in ("HS256", "RS256"):
+        signing_key, _ = bench_jwt.generate_keys(algorithm)
+        # Issued within the same second for every backend
+        payload = claims()
+        tokens = {
+            get_backend(name).encode(
+                payload, signing_key, algorithm=algorithm, headers={"kid": "k1"}
+            )
+            for name in BACKEND_NAMES
+        }
+        assert len(tokens) == 1
+
+
+def test_encode_converts_datetimes():
+    expires = datetime.now(timezone.utc) + timedelta(minutes=5)
+    for name in BACKEND_NAMES:
+        backend = get_backend(name)
+        token = backend.encode({"sub": "user", "exp": expires}, "secret")
+        assert backend.get_unverified_claims(token)["exp"] == int(expires.timestamp())
+        assert backend.get_unverified_header(token) == {"alg": "HS256", "typ": "JWT"}
+
+
+def test_incomplete_backend_cannot_be_created():
+    class SignOnly(JWTBackend):
+        name = "sign-only"
+
+        def encode(self, claims, key, algorithm="HS256", headers=None):
+            return ""
+
+    with pytest.raises(TypeError, match="abstract"):
+        SignOnly()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown JWT backend"):
+        get_backend("missing")
+
+
+def test_bench_jwt():
+    results = bench_jwt.run_benchmark(2, algorithms=["HS256", "ES256"])
+    assert set(results) == {
+        f"{backend}/{algorithm}/{operation}"
+        for backend in BACKEND_NAMES
+        for algorithm in ("HS256", "ES256")
+        for operation in ("sign", "verify")
+    }
+    assert all(result["ops_per_second"] > 0 for result in results.values())
@@ -0,0 +1,175 @@
+import io
+import json
+import logging
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from log_pipeline import JsonFormatter, LogPipeline, RateLimitFilter, log_pipeline
+from main import oidc_config
+from metrics import LOG_MESSAGES_DROPPED, LOG_MESSAGES_SUPPRESSED, registry
+from oidc_config import OIDCProvider
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    registry.clear()
+    log_pipeline.rate_limit.windows.clear()
+    oidc_config.providers.clear()
+
+
+@pytest.fixture
+def pipeline():
+    stream = io.StringIO()
+    pipeline = LogPipeline(stream, max_queue=100, burst=2, interval=60.0)
+    pipeline.install("test_log_pipeline")
+    pipeline.start()
+    yield pipeline, stream
+    pipeline.stop()
+    pipeline.uninstall("test_log_pipeline")
+
+
+def written(stream: io.StringIO) -> list[dict]:
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def record(msg: str, level: int = logging.ERROR, *args) -> logging.LogRecord:
+    return logging.LogRecord("test", level, __file__, 1, msg, args, None)
+
+
+def test_records_are_written_as_json(pipeline):
+    pipeline, stream = pipeline
+    logger = logging.getLogger("test_log_pipeline.child")
+    logger.info("Hello %s", "world", extra={"user": "alice", "count": 2})
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("Failed")
+    pipeline.stop()
+
+    first, second = written(stream)
+    assert first["message"] == "Hello world"
+    assert first["level"] == "INFO"
+    assert first["logger"] == "test_log_pipeline.child"
+    assert (first["user"], first["count"]) == ("alice", 2)
+    assert second["message"] == "Failed"
+    assert "ValueError: boom" in second["exception"]
+
+
+def test_repeated_errors_are_rate_limited():
+    limit = RateLimitFilter(burst=2, interval=10.0)
+    with patch("log_pipeline.time.monotonic", return_value=100.0):
+        # Arguments differ, the template is the same
+        passed = [
+            limit.filter(record("Failed for %s", logging.ERROR, n)) for n in range(5)
+        ]
+        assert passed == [True, True, False, False, False]
+        assert limit.filter(record("Other failure"))
+        # Records below the level are never limited
+        assert all(limit.filter(record("Info", logging.INFO)) for _ in range(5))
+    assert LOG_MESSAGES_SUPPRESSED.value("test") == 3
+
+    with patch("log_pipeline.time.monotonic", return_value=110.0):
+        summary = record("Failed for %s", logging.ERROR, 9)
+        assert limit.filter(summary)
+        assert summary.suppressed == 3
+        assert limit.filter(record("Failed for %s", logging.ERROR, 9))
+        assert not hasattr(record("x"), "suppressed")
+
+
+def test_rate_limit_keys_are_bounded():
+    limit = RateLimitFilter(burst=1, max_keys=3)
+    for n in range(10):
+        assert limit.filter(record(f"Message {n}"))
+    assert len(limit.windows) == 3
+
+
+def test_full_queue_drops_without_blocking():
+    class BlockedStream(io.StringIO):
+        def __init__(self):
+            super().__init__()
+            self.unblocked = threading.Event()
+
+        def write(self, text):
+            self.unblocked.wait()
+            return super().write(text)
+
+    stream = BlockedStream()
+    pipeline = LogPipeline(stream, max_queue=5)
+    pipeline.install("test_log_pipeline.blocked")
+    pipeline.start()
+    logger = logging.getLogger("test_log_pipeline.blocked")
+    try:
+        start = time.perf_counter()
+        for n in range(100):
+            logger.info("Message %d", n)
+        assert time.perf_counter() - start < 1.0
+    finally:
+        stream.unblocked.set()
+        pipeline.stop()
+        pipeline.uninstall("test_log_pipeline.blocked")
+
+    lines = written(stream)
+    # The writer holds one record while blocked, five more fit the queue
+    assert 5 <= len(lines) <= 6
+    assert LOG_MESSAGES_DROPPED.value("test_log_pipeline.blocked") == 100 - len(lines)
+
+
+def test_records_are_written_directly_without_a_writer():
+    stream = io.StringIO()
+    pipeline = LogPipeline(stream)
+    pipeline.install("test_log_pipeline.direct")
+    logger = logging.getLogger("test_log_pipeline.direct")
+    logger.warning("Before start")
+    assert [line["message"] for line in written(stream)] == ["Before start"]
+
+    pipeline.start()
+    for n in range(3):
+        logger.warning("Queued %d", n)
+    pipeline.stop()
+    logger.warning("After stop")
+    pipeline.uninstall("test_log_pipeline.direct")
+    assert [line["message"] for line in written(stream)] == [
+        "Before start",
+        "Queued 0",
+        "Queued 1",
+        "Queued 2",
+        "After stop",
+    ]
+    assert pipeline.queue.empty()
+
+
+def test_records_do_not_reach_root_handlers(pipeline):
+    pipeline, stream = pipeline
+    root = io.StringIO()
+    handler = logging.StreamHandler(root)
+    logging.getLogger().addHandler(handler)
+    try:
+        logging.getLogger("test_log_pipeline").warning("Once")
+    finally:
+        logging.getLogger().removeHandler(handler)
+    pipeline.stop()
+    assert root.getvalue() == ""
+    assert [line["message"] for line in written(stream)] == ["Once"]
+
+
+@patch("requests.get")
+def test_oidc_errors_are_logged_not_printed(mock_get, caplog, capsys):
+    mock_get.side_effect = Exception("connection refused")
+    with caplog.at_level(logging.WARNING, logger="simple_json_api.oidc"):
+        oidc_config.add_provider(
+            OIDCProvider(
+                name="broken", issuer="https://broken.example.com", client_id="c"
+            )
+        )
+    assert capsys.readouterr().out == ""
+    (logged,) = caplog.records
+    assert logged.getMessage() == "Failed to discover OIDC configuration"
+    assert logged.provider == "broken"
+    assert logged.error == "connection refused"
+
+    entry = json.loads(JsonFormatter().format(logged))
+    assert entry["provider"] == "broken"
+    assert entry["level"] == "ERROR"
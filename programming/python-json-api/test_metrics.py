@@ -0,0 +1,138 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import app, items_db, oidc_config, users_db
+from metrics import (
+    HTTP_REQUEST_DURATION,
+    JWKS_FETCHES,
+    TOKEN_VALIDATIONS,
+    Counter,
+    Gauge,
+    Histogram,
+    registry,
+)
+from oidc_config import OIDCProvider
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+    oidc_config.providers.clear()
+    oidc_config.jwks_cache.clear()
+    oidc_config.jwks_cache_expiry.clear()
+    registry.clear()
+
+
+def test_counter_merges_thread_shards():
+    counter = Counter("test_total", "Test counter", ("kind",))
+
+    def work():
+        for _ in range(1000):
+            counter.inc("a")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc("b", amount=2.5)
+
+    assert counter.value("a") == 4000
+    assert counter.samples() == [
+        'test_total{kind="a"} 4000',
+        'test_total{kind="b"} 2.5',
+    ]
+
+
+def test_gauge_track():
+    gauge = Gauge("test_in_flight", "Test gauge")
+    with gauge.track():
+        assert gauge.value() == 1
+    assert gauge.value() == 0
+
+
+def test_histogram_render():
+    histogram = Histogram("test_seconds", "Test histogram", ("route",), (0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5.0, "/a")
+
+    assert histogram.render().splitlines() == [
+        "# HELP test_seconds Test histogram",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{route="/a",le="0.1"} 1',
+        'test_seconds_bucket{route="/a",le="1"} 2',
+        'test_seconds_bucket{route="/a",le="+Inf"} 3',
+        'test_seconds_sum{route="/a"} 5.55',
+        'test_seconds_count{route="/a"} 3',
+    ]
+
+
+def test_label_escaping():
+    counter = Counter("test_total", "Test counter", ("path",))
+    counter.inc('a"b\\c')
+    assert counter.samples() == ['test_total{path="a\\"b\\\\c"} 1']
+
+
+def test_metrics_endpoint():
+    client.get("/")
+    client.get("/items/1", headers={"Authorization": "Bearer invalid"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'store_size{store="users"} 0' in body
+    assert "http_requests_in_flight" in body
+    assert "bcrypt_queue_depth" in body
+
+    assert HTTP_REQUEST_DURATION.count("GET", "/", "200") == 1
+    assert HTTP_REQUEST_DURATION.count("GET", "/items/{item_id}", "401") == 1
+    assert TOKEN_VALIDATIONS.value("local", "invalid") == 1
+
+
+def test_local_token_outcomes():
+    client.post(
+        "/register",
+        json={"username": "metrics", "email": "m@example.com", "password": "pw"},
+    )
+    token = client.post(
+        "/login", json={"username": "metrics", "password": "pw"}
+    ).json()["access_token"]
+    client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    users_db.clear()
+    client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+
+    assert TOKEN_VALIDATIONS.value("local", "valid") == 1
+    assert TOKEN_VALIDATIONS.value("local", "unknown_user") == 1
+
+
+@patch("requests.get")
+def test_jwks_fetch_metrics(mock_get):
+    mock_get.side_effect = Exception("connection refused")
+    oidc_config.add_provider(
+        OIDCProvider(
+            name="broken",
+            issuer="https://broken.example.com",
+            client_id="client",
+        )
+    )
+    assert JWKS_FETCHES.value("broken", "discovery_failure") == 1
+
+    response = MagicMock()
+    response.json.return_value = {"keys": []}
+    mock_get.side_effect = None
+    mock_get.return_value = response
+    oidc_config._fetch_jwks("broken", "https://broken.example.com/jwks")
+    assert JWKS_FETCHES.value("broken", "success") == 1
+    assert 'jwks_fetch_duration_seconds_count{provider="broken"} 2' in registry.render()
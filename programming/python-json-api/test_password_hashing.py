@@ -0,0 +1,91 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import password_hashing
+from main import app, items_db, users_db
+from metrics import PASSWORD_REHASHES, registry
+from password_hashing import bcrypt_context, bcrypt_rounds, calibrate_rounds
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    registry.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+def fake_hash_time(rounds, samples=3):
+    # 1 ms at cost 4, doubling with every round
+    return 0.001 * 2 ** (rounds - 4)
+
+
+def test_calibrate_rounds():
+    with patch("password_hashing.hash_time", side_effect=fake_hash_time):
+        assert calibrate_rounds(0.064) == 10
+        assert calibrate_rounds(0.1) == 10
+        assert calibrate_rounds(0.3) == 12
+        # Clamped to the configured bounds
+        assert calibrate_rounds(0.001, min_rounds=10) == 10
+        assert calibrate_rounds(10.0, max_rounds=12) == 12
+
+
+def test_calibrate_rounds_steps_down_when_too_slow():
+    probe = password_hashing.PROBE_ROUNDS
+
+    def slow_above_probe(rounds, samples=3):
+        # The probe suggests cost 12, but anything above cost 10 is too slow
+        if rounds == probe:
+            return fake_hash_time(rounds)
+        return 1.0 if rounds > 10 else 0.01
+
+    with patch("password_hashing.hash_time", side_effect=slow_above_probe):
+        assert calibrate_rounds(0.3) == 10
+
+
+def test_calibrate_rounds_on_this_machine():
+    rounds = calibrate_rounds(0.05, min_rounds=4, max_rounds=10)
+    assert 4 <= rounds <= 10
+
+
+def test_bcrypt_context():
+    context = bcrypt_context(5)
+    assert bcrypt_rounds(context) == 5
+    assert context.hash("pw").startswith("$2b$05$")
+    assert context.needs_update(bcrypt_context(4).hash("pw"))
+    assert not context.needs_update(context.hash("pw"))
+
+
+def test_login_rehashes_outdated_cost():
+    with patch("main.pwd_context", bcrypt_context(4)):
+        client.post(
+            "/register",
+            json={"username": "rehash", "email": "r@example.com", "password": "pw"},
+        )
+    assert users_db[0].password_hash.startswith("$2b$04$")
+
+    with patch("main.pwd_context", bcrypt_context(5)):
+        response = client.post("/login", json={"username": "rehash", "password": "pw"})
+        assert response.status_code == 200
+        assert users_db[0].password_hash.startswith("$2b$05$")
+        assert PASSWORD_REHASHES.value() == 1
+
+        # Already at the configured cost
+        response = client.post("/login", json={"username": "rehash", "password": "pw"})
+        assert response.status_code == 200
+        assert PASSWORD_REHASHES.value() == 1
+
+        # A wrong password never rehashes
+        response = client.post(
+            "/login", json={"username": "rehash", "password": "wrong"}
+        )
+        assert response.status_code == 401
+
+        metrics = client.get("/metrics").text
+        assert "bcrypt_rounds 5" in metrics
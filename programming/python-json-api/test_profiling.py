@@ -0,0 +1,197 @@
+import sys
+import threading
+import time
+import tracemalloc
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import app, items_db, users_db
+from profiling import (
+    MemoryTracer,
+    ProfilerBusy,
+    SamplingProfiler,
+    approximate_size,
+    folded,
+    memory_tracer,
+)
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+    yield
+    if tracemalloc.is_tracing():
+        memory_tracer.stop()
+
+
+def login(username: str) -> dict:
+    credentials = {"username": username, "password": "pw"}
+    client.post("/register", json={**credentials, "email": f"{username}@x.com"})
+    token = client.post("/login", json=credentials).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def admin_headers():
+    with patch("main.ADMIN_TOKEN", "admin-secret"):
+        # A user's token as well, for the requests the tests make
+        yield {**login("ops"), "X-Admin-Token": "admin-secret"}
+
+
+def test_approximate_size():
+    values = [f"value-{i}" for i in range(10)]
+    exact = sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+    assert approximate_size(values) == exact
+
+    # Shared objects are counted once
+    assert approximate_size([values, values]) == sys.getsizeof([values, values]) + exact
+
+    class Record:
+        def __init__(self, name):
+            self.name = name
+
+    record = Record("x" * 1000)
+    assert approximate_size(record) > 1000
+
+
+def test_approximate_size_samples_large_containers():
+    values = {i: f"{i:0100d}" for i in range(100000)}
+    estimate = approximate_size(values, sample=100)
+    exact = sys.getsizeof(values) + sum(
+        sys.getsizeof(key) + sys.getsizeof(value) for key, value in values.items()
+    )
+    assert estimate == pytest.approx(exact, rel=0.05)
+
+
+def test_debug_endpoints_require_admin():
+    assert client.get("/debug/memory").status_code == 403
+    headers = login("alice")
+    for path in ("/debug/memory", "/debug/tracemalloc", "/debug/profile"):
+        assert client.get(path, headers=headers).status_code == 403
+    # Off without an admin token, whatever is sent
+    for token in ("", "None"):
+        response = client.get("/debug/memory", headers={"X-Admin-Token": token})
+        assert response.status_code == 403
+
+
+def test_admin_name_registered_again_is_rejected(admin_headers):
+    # After a restart anyone can register the name an admin used before
+    headers = login("admin")
+    assert client.get("/debug/memory", headers=headers).status_code == 403
+    wrong = {**headers, "X-Admin-Token": "admin-guess"}
+    assert client.get("/debug/memory", headers=wrong).status_code == 403
+    assert client.get("/debug/memory", headers=admin_headers).status_code == 200
+
+
+def test_debug_memory(admin_headers):
+    for i in range(3):
+        client.post(
+            "/items", json={"name": f"item {i}", "price": 1.0}, headers=admin_headers
+        )
+    report = client.get("/debug/memory?types=5", headers=admin_headers).json()
+    assert report["stores"]["items"]["objects"] == 3
+    assert report["stores"]["items"]["bytes"] > 0
+    assert report["stores"]["users"]["objects"] == 1
+    assert set(report["stores"]) >= {"jwks_cache", "idempotency_cache", "text_index"}
+    assert len(report["top_types"]) == 5
+    assert report["rss_bytes"] is None or report["rss_bytes"] > 0
+
+
+def test_tracemalloc_diff(admin_headers):
+    response = client.post("/debug/tracemalloc/snapshots", headers=admin_headers)
+    assert response.status_code == 409
+
+    status = client.post("/debug/tracemalloc/start?frames=5", headers=admin_headers)
+    assert status.json()["tracing"] is True
+    base = client.post("/debug/tracemalloc/snapshots", headers=admin_headers).json()
+    for i in range(200):
+        client.post(
+            "/items", json={"name": f"item {i}", "price": 1.0}, headers=admin_headers
+        )
+    target = client.post("/debug/tracemalloc/snapshots", headers=admin_headers).json()
+
+    response = client.get(
+        f"/debug/tracemalloc/snapshots/{target['id']}?base={base['id']}&limit=5",
+        headers=admin_headers,
+    )
+    stats = response.json()
+    assert len(stats) == 5
+    assert sum(stat["size_diff"] for stat in stats) > 0
+
+    top = client.get(
+        f"/debug/tracemalloc/snapshots/{base['id']}", headers=admin_headers
+    )
+    assert top.json()[0]["size_diff"] is None
+    missing = client.get("/debug/tracemalloc/snapshots/999", headers=admin_headers)
+    assert missing.status_code == 404
+
+    status = client.post("/debug/tracemalloc/stop", headers=admin_headers).json()
+    assert status["tracing"] is False
+    assert status["snapshots"] == []
+
+
+def test_memory_tracer_keeps_recent_snapshots():
+    tracer = MemoryTracer(max_snapshots=2)
+    tracer.start()
+    ids = [tracer.take_snapshot() for _ in range(3)]
+    assert list(tracer.snapshots) == ids[1:]
+    tracer.stop()
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampling_profiler():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,))
+    thread.start()
+    try:
+        samples = SamplingProfiler().profile(thread.ident, 0.2, 0.001)
+    finally:
+        stop.set()
+        thread.join()
+    assert sum(samples.values()) > 10
+    stack, _ = samples.most_common(1)[0]
+    assert "busy_loop" in stack
+    # Root frame first
+    assert stack.index("run") < stack.index("busy_loop")
+
+    line = folded(samples).splitlines()[0]
+    assert line.rsplit(" ", 1)[1].isdigit()
+
+
+def test_one_profile_at_a_time():
+    profiler = SamplingProfiler()
+    thread = threading.Thread(
+        target=profiler.profile, args=(threading.get_ident(), 0.3, 0.01)
+    )
+    thread.start()
+    time.sleep(0.05)
+    with pytest.raises(ProfilerBusy):
+        profiler.profile(threading.get_ident(), 0.1, 0.01)
+    thread.join()
+
+
+def test_debug_profile(admin_headers):
+    response = client.get(
+        "/debug/profile?seconds=0.2&interval_ms=2", headers=admin_headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].startswith("attachment;")
+    lines = response.text.splitlines()
+    assert lines
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    with patch("main.PROFILE_MAX_SECONDS", 1):
+        response = client.get("/debug/profile?seconds=5", headers=admin_headers)
+    assert response.status_code == 422
@@ -0,0 +1,115 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import app, items_db, refresh_tokens, users_db
+from refresh_tokens import InvalidRefreshToken, RefreshTokenStore
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    refresh_tokens.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+@pytest.fixture
+def tokens():
+    client.post(
+        "/register",
+        json={"username": "refresher", "email": "r@example.com", "password": "pw"},
+    )
+    response = client.post("/login", json={"username": "refresher", "password": "pw"})
+    return response.json()
+
+
+def test_rotate():
+    store = RefreshTokenStore("secret", timedelta(days=1))
+    token = store.issue("alice")
+    subject, rotated = store.rotate(token)
+    assert subject == "alice"
+    assert rotated != token
+    # Only digests are stored
+    assert token not in store.records
+
+
+def test_reuse_revokes_family():
+    store = RefreshTokenStore("secret", timedelta(days=1))
+    token = store.issue("alice")
+    _, rotated = store.rotate(token)
+    with pytest.raises(InvalidRefreshToken, match="reuse"):
+        store.rotate(token)
+    with pytest.raises(InvalidRefreshToken):
+        store.rotate(rotated)
+    assert store.records == {}
+    assert store.families == {}
+
+
+def test_expired_token():
+    store = RefreshTokenStore("secret", timedelta(seconds=-1))
+    token = store.issue("alice")
+    with pytest.raises(InvalidRefreshToken, match="expired"):
+        store.rotate(token)
+
+
+def test_purge():
+    store = RefreshTokenStore("secret", timedelta(seconds=-1), purge_interval=3)
+    store.issue("alice")
+    store.issue("bob")
+    assert len(store.records) == 2
+    store.issue("carol")
+    assert len(store.records) == 1
+    assert len(store.families) == 1
+
+
+def test_login_returns_refresh_token(tokens):
+    assert tokens["token_type"] == "bearer"
+    assert tokens["refresh_token"]
+
+
+def test_refresh_endpoint(tokens):
+    with patch("main.verify_password") as verify_password:
+        response = client.post(
+            "/refresh", json={"refresh_token": tokens["refresh_token"]}
+        )
+        verify_password.assert_not_called()
+    assert response.status_code == 200
+    renewed = response.json()
+    assert renewed["refresh_token"] != tokens["refresh_token"]
+
+    headers = {"Authorization": f"Bearer {renewed['access_token']}"}
+    response = client.get("/auth/me", headers=headers)
+    assert response.json()["username"] == "refresher"
+
+    # The previous refresh token has been rotated out
+    response = client.post("/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+    response = client.post("/refresh", json={"refresh_token": renewed["refresh_token"]})
+    assert response.status_code == 401
+
+
+def test_refresh_invalid_token():
+    response = client.post("/refresh", json={"refresh_token": "invalid"})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Invalid refresh token"
+
+
+def test_refresh_unknown_user(tokens):
+    users_db.clear()
+    response = client.post("/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+    assert refresh_tokens.records == {}
+
+
+def test_logout(tokens):
+    response = client.post("/logout", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    response = client.post("/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
@@ -0,0 +1,89 @@
+import json
+import logging
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from log_pipeline import JsonFormatter
+from main import app, items_db, response_cache, users_db
+from request_timing import RequestTimings, stage
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    response_cache.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+def parse_server_timing(header):
+    stages = {}
+    for metric in header.split(", "):
+        name, duration = metric.split(";dur=")
+        stages[name] = float(duration)
+    return stages
+
+
+def test_stage_outside_request_is_noop():
+    with stage("store") as first, stage("auth") as second:
+        pass
+    assert first is second
+
+
+def test_header_value():
+    timings = RequestTimings()
+    timings.add("auth", 0.001)
+    timings.add("auth", 0.002)
+    assert timings.header_value(0.01) == "auth;dur=3.000, total;dur=10.000"
+
+
+def test_no_header_when_disabled():
+    response = client.get("/")
+    assert response.status_code == 200
+    assert "server-timing" not in response.headers
+
+
+def test_server_timing_stages(caplog):
+    with patch("main.SERVER_TIMING_SAMPLE_RATE", 1.0):
+        client.post(
+            "/register",
+            json={"username": "timed", "email": "t@example.com", "password": "pw"},
+        )
+        response = client.post("/login", json={"username": "timed", "password": "pw"})
+        assert "bcrypt" in parse_server_timing(response.headers["server-timing"])
+
+        token = response.json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        client.post("/items", json={"name": "Item", "price": 1.0}, headers=headers)
+
+        with caplog.at_level(logging.INFO, logger="simple_json_api.timing"):
+            response = client.get("/items", headers=headers)
+
+    stages = parse_server_timing(response.headers["server-timing"])
+    assert {"auth", "store", "endpoint", "serialize", "total"} <= set(stages)
+    assert stages["total"] >= stages["endpoint"]
+
+    record = caplog.records[-1]
+    assert record.getMessage() == "Request timing"
+    assert record.path == "/items"
+    assert record.status == 200
+    assert "store" in record.stages_ms
+    # Written as one JSON object, not as JSON inside the message
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Request timing"
+    assert entry["stages_ms"] == record.stages_ms
+
+
+def test_sampling_rate():
+    with (
+        patch("main.SERVER_TIMING_SAMPLE_RATE", 0.5),
+        patch("request_timing.random.random", side_effect=[0.9, 0.1]),
+    ):
+        assert "server-timing" not in client.get("/").headers
+        assert "server-timing" in client.get("/").headers
@@ -0,0 +1,159 @@
+import gzip
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import app, items_db, response_cache, users_db
+from metrics import RESPONSE_CACHE_REQUESTS
+from response_cache import ResponseCache, compress, negotiate_encoding
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    response_cache.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+@pytest.fixture
+def auth_headers():
+    credentials = {"username": "alice", "password": "pw"}
+    client.post("/register", json={**credentials, "email": "a@x.com"})
+    token = client.post("/login", json=credentials).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def create_items(headers: dict, count: int):
+    for i in range(count):
+        item = {
+            "name": f"Item {i}",
+            "description": "A fairly long description",
+            "price": i,
+        }
+        client.post("/items", json=item, headers=headers)
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "expected"),
+    [
+        ("", "identity"),
+        ("gzip", "gzip"),
+        ("gzip, deflate", "gzip"),
+        ("deflate", "identity"),
+        ("gzip;q=0", "identity"),
+        ("*", "gzip"),
+        ("*;q=0.5, gzip;q=0", "identity"),
+        ("GZIP;q=0.8", "gzip"),
+        ("gzip;q=abc", "identity"),
+    ],
+)
+def test_negotiate_encoding(accept_encoding, expected):
+    with patch("response_cache._brotli", return_value=None):
+        assert negotiate_encoding(accept_encoding) == expected
+
+
+def test_negotiate_prefers_brotli_when_installed():
+    with patch("response_cache._brotli", return_value=object()):
+        assert negotiate_encoding("gzip, br") == "br"
+        assert negotiate_encoding("gzip, br;q=0.5") == "gzip"
+
+
+def test_large_item_lists_are_compressed_and_cached(auth_headers):
+    create_items(auth_headers, 50)
+    headers = {**auth_headers, "Accept-Encoding": "gzip"}
+    hits = RESPONSE_CACHE_REQUESTS.value("gzip", "hit")
+
+    first = client.get("/items", headers=headers)
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["vary"] == "Accept-Encoding"
+    assert len(first.json()) == 50
+    assert first.json()[0] == {
+        "id": 1,
+        "name": "Item 0",
+        "description": "A fairly long description",
+        "price": 0.0,
+        "owner_id": 1,
+        "expires_at": None,
+    }
+
+    second = client.get("/items", headers=headers)
+    assert second.json() == first.json()
+    assert RESPONSE_CACHE_REQUESTS.value("gzip", "hit") == hits + 1
+
+    # A mutation moves the collection to a new version
+    client.delete("/items/1", headers=auth_headers)
+    assert len(client.get("/items", headers=headers).json()) == 49
+    assert RESPONSE_CACHE_REQUESTS.value("gzip", "hit") == hits + 1
+
+
+def test_small_and_identity_responses_are_not_compressed(auth_headers):
+    create_items(auth_headers, 1)
+    response = client.get("/items", headers={**auth_headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert len(response.json()) == 1
+
+    create_items(auth_headers, 50)
+    response = client.get(
+        "/items", headers={**auth_headers, "Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in response.headers
+    assert len(response.json()) == 51
+
+
+def test_collections_are_cached_per_owner(auth_headers):
+    create_items(auth_headers, 3)
+    client.get("/items", headers=auth_headers)
+    credentials = {"username": "bob", "password": "pw"}
+    client.post("/register", json={**credentials, "email": "b@x.com"})
+    token = client.post("/login", json=credentials).json()["access_token"]
+    assert (
+        client.get("/items", headers={"Authorization": f"Bearer {token}"}).json() == []
+    )
+
+
+def test_other_responses_are_compressed_above_threshold(auth_headers):
+    create_items(auth_headers, 50)
+    response = client.get(
+        "/items/search?limit=50", headers={**auth_headers, "Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_compress_is_deterministic():
+    body = json.dumps([{"name": "item"}] * 100).encode()
+    assert compress(body, "gzip") == compress(body, "gzip")
+    assert gzip.decompress(compress(body, "gzip")) == body
+    assert compress(body, "identity") is body
+
+
+def test_invalidate_drops_old_bodies():
+    cache = ResponseCache()
+    assert cache.get_or_render(1, "identity", lambda: b"[1]") == b"[1]"
+    assert cache.get_or_render(1, "identity", lambda: b"[2]") == b"[1]"
+    cache.invalidate(1)
+    assert len(cache) == 0
+    assert cache.size == 0
+    assert cache.get_or_render(1, "identity", lambda: b"[2]") == b"[2]"
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_bytes=10)
+    cache.get_or_render(1, "identity", lambda: b"aaaa")
+    cache.get_or_render(2, "identity", lambda: b"bbbb")
+    # Touch the first body, so the second is least recently used
+    cache.get_or_render(1, "identity", lambda: b"xxxx")
+    cache.get_or_render(3, "identity", lambda: b"cccc")
+    assert [key[0] for key in cache.entries] == [1, 3]
+    assert cache.size == 8
+    # Bodies larger than the cache are served without being stored
+    assert cache.get_or_render(4, "identity", lambda: b"d" * 11) == b"d" * 11
+    assert len(cache) == 2
@@ -0,0 +1,101 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+
+import main
+from main import SECRET_KEY, app, items_db, refresh_tokens, revocation_list, users_db
+from metrics import TOKEN_VALIDATIONS, registry
+from revocation import BloomFilter, RevocationList
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    refresh_tokens.clear()
+    revocation_list.clear()
+    registry.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+@pytest.fixture
+def tokens():
+    client.post(
+        "/register",
+        json={"username": "revoker", "email": "r@example.com", "password": "pw"},
+    )
+    response = client.post("/login", json={"username": "revoker", "password": "pw"})
+    return response.json()
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"revoked-{i}")
+    assert all(f"revoked-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_revocation_list():
+    revocations = RevocationList(capacity=10)
+    assert not revocations.is_revoked("a")
+    revocations.revoke("a", time.time() + 60)
+    assert revocations.is_revoked("a")
+    assert not revocations.is_revoked("b")
+
+    # Tokens that have already expired are not tracked
+    revocations.revoke("c", time.time() - 1)
+    assert "c" not in revocations.revoked
+
+
+def test_revocation_list_purges_when_full():
+    revocations = RevocationList(capacity=4)
+    revocations.revoke("expiring", time.time() + 0.01)
+    for i in range(3):
+        revocations.revoke(f"live-{i}", time.time() + 60)
+    time.sleep(0.02)
+    revocations.revoke("new", time.time() + 60)
+
+    assert "expiring" not in revocations.revoked
+    assert all(revocations.is_revoked(f"live-{i}") for i in range(3))
+    assert revocations.is_revoked("new")
+
+
+def test_access_token_has_jti(tokens):
+    payload = jwt.decode(tokens["access_token"], SECRET_KEY, algorithms=["HS256"])
+    assert payload["jti"]
+
+
+def test_logout_revokes_access_token(tokens):
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    response = client.post(
+        "/logout", json={"refresh_token": tokens["refresh_token"]}, headers=headers
+    )
+    assert response.status_code == 200
+
+    response = client.get("/auth/me", headers=headers)
+    assert response.status_code == 401
+    assert TOKEN_VALIDATIONS.value("local", "revoked") == 1
+
+    # Other access tokens of the same user stay valid
+    response = client.post("/login", json={"username": "revoker", "password": "pw"})
+    other_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/auth/me", headers=other_headers).status_code == 200
+
+
+def test_logout_ignores_invalid_access_token(tokens):
+    response = client.post(
+        "/logout",
+        json={"refresh_token": tokens["refresh_token"]},
+        headers={"Authorization": "Bearer invalid"},
+    )
+    assert response.status_code == 200
+    assert revocation_list.revoked == {}
@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+import pytest
+from pydantic import ValidationError
+
+import serve
+from settings import ServerSettings
+
+
+def test_default_settings(monkeypatch):
+    monkeypatch.delenv("SERVER_WORKERS", raising=False)
+    settings = ServerSettings()
+    assert settings.port == 8000
+    assert settings.workers == 1
+    assert settings.max_requests is None
+
+
+def test_settings_from_environment(monkeypatch):
+    monkeypatch.setenv("SERVER_WORKERS", "4")
+    monkeypatch.setenv("SERVER_LOOP", "uvloop")
+    monkeypatch.setenv("SERVER_ACCESS_LOG", "false")
+    settings = ServerSettings()
+    assert settings.workers == 4
+    assert settings.loop == "uvloop"
+    assert settings.access_log is False
+
+
+def test_invalid_settings(monkeypatch):
+    monkeypatch.setenv("SERVER_HTTP", "h3")
+    with pytest.raises(ValidationError):
+        ServerSettings()
+
+
+def test_parse_args():
+    assert serve.parse_args([]) == {}
+    assert serve.parse_args(
+        ["--workers", "2", "--http", "httptools", "--no-access-log"]
+    ) == {"workers": "2", "http": "httptools", "access_log": False}
+    with pytest.raises(SystemExit):
+        serve.parse_args(["--loop", "tokio"])
+
+
+def test_uvicorn_options():
+    options = serve.uvicorn_options(
+        ServerSettings(keep_alive=30, max_requests=10000, limit_concurrency=512)
+    )
+    assert options["timeout_keep_alive"] == 30
+    assert options["limit_max_requests"] == 10000
+    assert options["limit_concurrency"] == 512
+    assert options["timeout_graceful_shutdown"] == 30
+
+
+def test_main(monkeypatch):
+    monkeypatch.setenv("SERVER_PORT", "9000")
+    with patch("uvicorn.run") as run:
+        assert serve.main(["--workers", "3", "--loop", "asyncio"]) == 0
+    args, kwargs = run.call_args
+    assert args == ("main:app",)
+    assert kwargs["workers"] == 3
+    assert kwargs["loop"] == "asyncio"
+    # Command line options override, the environment fills in the rest
+    assert kwargs["port"] == 9000
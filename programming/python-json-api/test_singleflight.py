@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+import main
+from main import items_db, oidc_config, oidc_provisioning, users_db
+from oidc_config import OIDCProvider
+from singleflight import SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+    oidc_config.providers.clear()
+
+
+def test_do_shares_result_between_threads():
+    flight = SingleFlight()
+    calls = 0
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        nonlocal calls
+        calls += 1
+        started.set()
+        release.wait()
+        return object()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        leader = executor.submit(flight.do, "key", slow)
+        started.wait()
+        followers = [executor.submit(flight.do, "key", slow) for _ in range(7)]
+        while flight.in_flight() != 1:
+            time.sleep(0.001)
+        time.sleep(0.01)
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert calls == 1
+    assert all(result is results[0] for result in results)
+    assert flight.in_flight() == 0
+
+
+def test_do_propagates_errors():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        flight.do("key", fail)
+    # A failed flight does not stick
+    assert flight.do("key", lambda: 42) == 42
+
+
+def test_do_async_shares_result():
+    flight = SingleFlight()
+    calls = 0
+
+    async def slow():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do_async("key", slow) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == [1] * 5
+    assert calls == 1
+
+
+def test_concurrent_first_requests_share_oidc_provisioning():
+    oidc_config.providers["provider"] = OIDCProvider(
+        name="provider", issuer="https://issuer", client_id="client"
+    )
+    provision_oidc_user = main.provision_oidc_user
+    create_oidc_user = main.create_oidc_user
+    entered = 0
+    all_entered = threading.Event()
+
+    async def counting_provision(*args):
+        nonlocal entered
+        entered += 1
+        if entered == 8:
+            all_entered.set()
+        return await provision_oidc_user(*args)
+
+    def slow_create(*args):
+        # Holds the first creation until every request is waiting on it
+        all_entered.wait(5)
+        return create_oidc_user(*args)
+
+    payload = {"sub": "new-user", "iss": "https://issuer", "name": "New User"}
+
+    async def first_requests():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            return await asyncio.gather(
+                *(
+                    client.get("/auth/me", headers={"Authorization": "Bearer t"})
+                    for _ in range(8)
+                )
+            )
+
+    with (
+        patch("main.OIDC_ENABLED", True),
+        patch("main.oidc_config.validate_token", return_value=payload),
+        patch("main.provision_oidc_user", side_effect=counting_provision),
+        patch("main.create_oidc_user", side_effect=slow_create) as create,
+    ):
+        responses = asyncio.run(first_requests())
+
+    assert all_entered.is_set()
+    assert create.call_count == 1
+    assert len(users_db) == 1
+    assert {response.json()["id"] for response in responses} == {users_db[0].id}
+    assert oidc_provisioning.in_flight() == 0
+
+    # Later requests find the existing user without a flight
+    user = asyncio.run(main.provision_oidc_user(payload, "provider"))
+    assert user is users_db[0]
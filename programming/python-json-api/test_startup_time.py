@@ -0,0 +1,88 @@
+import json
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import startup_time
+from main import app, items_db, users_db
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       150 |        150 |   _io
+import time:      2000 |       2500 |     fastapi.routing
+import time:      1000 |       3500 |   fastapi
+import time:       500 |       4150 | main
+"""
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+def test_parse_importtime():
+    assert startup_time.parse_importtime(IMPORTTIME_OUTPUT) == [
+        ("_io", 0.15),
+        ("fastapi.routing", 2.0),
+        ("fastapi", 1.0),
+        ("main", 0.5),
+    ]
+
+
+def test_import_breakdown():
+    breakdown = startup_time.import_breakdown("item_stats")
+    assert breakdown["packages"]["item_stats"] > 0
+    assert breakdown["total_ms"] == pytest.approx(sum(breakdown["packages"].values()))
+
+
+def test_import_has_no_side_effects():
+    # Rarely used dependencies are only imported once needed, and logging is
+    # left alone until the lifespan starts
+    script = (
+        "import logging, sys, main; "
+        "print(json.dumps([m for m in ('requests', 'jose') if m in sys.modules])); "
+        "print(len(logging.getLogger('simple_json_api').handlers))"
+    )
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", f"import json; {script}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={"OIDC_ENABLED": "true", "OIDC_ISSUER": "http://127.0.0.1:9"},
+    )
+    modules, handlers = result.stdout.splitlines()
+    assert json.loads(modules) == []
+    assert handlers == "0"
+
+
+def test_lifespan_runs_startup_work():
+    with (
+        patch("main.init_oidc_providers") as init_oidc_providers,
+        patch("main.BCRYPT_TARGET_MS", 50.0),
+        patch("main.calibrate_rounds", return_value=5) as calibrate_rounds,
+        patch("main.pwd_context", main.pwd_context),
+        patch("main.BCRYPT_ROUNDS", main.BCRYPT_ROUNDS),
+        TestClient(app) as client,
+    ):
+        init_oidc_providers.assert_called_once()
+        calibrate_rounds.assert_called_once_with(
+            0.05, main.BCRYPT_MIN_ROUNDS, main.BCRYPT_MAX_ROUNDS
+        )
+        assert main.BCRYPT_ROUNDS == 5
+        assert "bcrypt_rounds 5" in client.get("/metrics").text
+        assert main.log_pipeline.queue.maxsize == main.LOG_QUEUE_SIZE
+        assert main.log_pipeline.handler in main.logger.handlers
+
+
+@pytest.mark.slow
+def test_time_to_first_request():
+    result = startup_time.time_to_first_request("/")
+    assert result["status"] == 200
+    assert result["total_ms"] >= result["import_ms"] > 0
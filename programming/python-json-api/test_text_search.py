@@ -0,0 +1,111 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import Item, app, item_index, item_stats, items_db, text_index, users_db
+from text_search import TextIndex, tokenize
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    users_db.clear()
+    items_db.clear()
+    item_stats.clear()
+    item_index.clear()
+    text_index.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+@pytest.fixture
+def auth_headers():
+    user_data = {
+        "username": "textuser",
+        "email": "text@example.com",
+        "password": "textpass123",
+    }
+    client.post("/register", json=user_data)
+    login_response = client.post(
+        "/login", json={"username": "textuser", "password": "textpass123"}
+    )
+    token = login_response.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def make_item(item_id, name, description=None, owner_id=1):
+    return Item(
+        id=item_id, name=name, description=description, price=1.0, owner_id=owner_id
+    )
+
+
+def test_tokenize():
+    assert tokenize("Gaming Laptop, 16GB!") == ["gaming", "laptop", "16gb"]
+    assert tokenize(None) == []
+
+
+def test_bm25_ranking():
+    index = TextIndex()
+    index.add(make_item(1, "Laptop", "Office laptop"))
+    index.add(make_item(2, "Gaming laptop", "Gaming laptop with gaming keyboard"))
+    index.add(make_item(3, "Desk", "Standing desk"))
+    index.add(make_item(4, "Gaming chair", None, owner_id=2))
+
+    results = index.search(1, "gaming laptop")
+    assert [item.id for item, _ in results] == [2, 1]
+    assert results[0][1] > results[1][1]
+
+    assert [item.id for item, _ in index.search(1, "gaming laptop", limit=1)] == [2]
+    assert index.search(1, "chair") == []
+    assert index.search(3, "gaming") == []
+
+
+def test_search_predicate():
+    index = TextIndex()
+    index.add(make_item(1, "Red lamp"))
+    index.add(make_item(2, "Blue lamp"))
+    results = index.search(1, "lamp", predicate=lambda item: item.id == 2)
+    assert [item.id for item, _ in results] == [2]
+
+
+def test_remove_and_memory_usage():
+    index = TextIndex()
+    item = make_item(1, "Laptop", "Gaming laptop")
+    index.add(item)
+    usage = index.memory_usage(1)
+    assert usage["documents"] == 1
+    assert usage["terms"] == 2
+    assert usage["postings"] == 2
+    assert usage["approximate_bytes"] > 0
+
+    index.remove(item)
+    assert index.search(1, "laptop") == []
+    assert index.memory_usage(1)["documents"] == 0
+    assert index.owners == {}
+
+
+def test_keyword_search_endpoint(auth_headers):
+    items_data = [
+        {"name": "Laptop", "description": "Office laptop", "price": 899.0},
+        {"name": "Gaming laptop", "description": "Fast gaming laptop", "price": 1999.0},
+        {"name": "Mouse", "description": "Gaming mouse", "price": 59.0},
+    ]
+    for item in items_data:
+        client.post("/items", json=item, headers=auth_headers)
+
+    response = client.get("/items/search?q=gaming", headers=auth_headers)
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [2, 3]
+
+    response = client.get("/items/search?q=laptop&max_price=1000", headers=auth_headers)
+    assert [item["id"] for item in response.json()] == [1]
+
+    client.put("/items/3", json={"name": "Mouse", "price": 59.0}, headers=auth_headers)
+    client.delete("/items/2", headers=auth_headers)
+    response = client.get("/items/search?q=gaming", headers=auth_headers)
+    assert response.json() == []
+
+    response = client.get("/items/search/index", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["documents"] == 2
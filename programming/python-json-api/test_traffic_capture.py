@@ -0,0 +1,211 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import (
+    app,
+    create_access_token,
+    item_index,
+    item_stats,
+    items_db,
+    refresh_tokens,
+    response_cache,
+    text_index,
+    traffic_recorder,
+    users_db,
+)
+from replay import Bindings, read_capture, replay, users_to_prepare
+from traffic_capture import REPLAY_PASSWORD, Sanitizer
+
+client = TestClient(app)
+
+
+def clear_stores():
+    users_db.clear()
+    items_db.clear()
+    item_stats.clear()
+    item_index.clear()
+    text_index.clear()
+    response_cache.clear()
+    refresh_tokens.clear()
+    main.next_user_id = 1
+    main.next_id = 1
+
+
+@pytest.fixture(autouse=True)
+def reset_db():
+    clear_stores()
+    yield
+    traffic_recorder.close()
+
+
+def login(username: str) -> dict:
+    credentials = {"username": username, "password": "pw"}
+    client.post("/register", json={**credentials, "email": f"{username}@x.com"})
+    tokens = client.post("/login", json=credentials).json()
+    return {"Authorization": f"Bearer {tokens['access_token']}"}, tokens
+
+
+def replay_asgi(records: list[dict], speed: float = 20.0) -> dict:
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await replay(c, records, speed)
+
+    return asyncio.run(run())
+
+
+def test_sanitizer():
+    sanitizer = Sanitizer(key=b"k" * 32)
+    token = create_access_token({"sub": "alice"})
+    body = sanitizer.value(
+        {
+            "username": "alice",
+            "email": "alice@x.com",
+            "password": "secret",
+            "refresh_token": "opaque",
+            "tokens": [token, "garbage"],
+            "name": "Laptop",
+            "price": 12.5,
+        }
+    )
+    user = "{{user:" + sanitizer.digest("alice") + "}}"
+    assert body["username"] == user
+    assert body["email"].endswith("@replay.invalid")
+    assert body["password"] == REPLAY_PASSWORD
+    assert body["refresh_token"] == "{{refresh:" + sanitizer.digest("opaque") + "}}"
+    # Tokens are grouped by subject, so they map to the same replay user
+    assert body["tokens"] == [
+        "{{token:" + sanitizer.digest("alice") + "}}",
+        "{{token:}}",
+    ]
+    assert body["name"] == "xxxxxx"
+    assert body["price"] == 12.5
+    assert sanitizer.authorization(f"Bearer {token}") == body["tokens"][0].join(
+        ["Bearer ", ""]
+    )
+
+    expires_at = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    now = (expires_at - timedelta(seconds=30)).timestamp()
+    assert sanitizer.value(expires_at.isoformat(), "expires_at", now) == "{{in:30.0}}"
+    assert sanitizer.path("/items/17") == "/items/{{id:17}}"
+    assert sanitizer.query("q=laptop&limit=5") == "q=xxxxxx&limit=5"
+
+
+def test_capture_and_replay(tmp_path):
+    path = tmp_path / "traffic.jsonl.gz"
+    traffic_recorder.open(str(path))
+    headers, tokens = login("alice")
+    later = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    client.post("/items", json={"name": "Laptop", "price": 1.0}, headers=headers)
+    client.post(
+        "/items",
+        json={"name": "Lamp", "price": 2.0, "expires_at": later},
+        headers={**headers, "Idempotency-Key": "k1"},
+    )
+    client.get("/items/1", headers=headers)
+    client.put("/items/2", json={"name": "Desk", "price": 3.0}, headers=headers)
+    client.get("/items/search?q=desk&limit=5", headers=headers)
+    client.get("/items", headers=headers)
+    client.post("/refresh", json={"refresh_token": tokens["refresh_token"]})
+    client.post("/auth/introspect", json={"tokens": [tokens["access_token"]]})
+    client.delete("/items/1", headers=headers)
+    client.get("/debug/memory", headers=headers)
+    traffic_recorder.close()
+
+    text = path.read_bytes()
+    records = read_capture(path)
+    raw = json.dumps(records)
+    for secret in ("alice", '"pw"', tokens["access_token"], tokens["refresh_token"]):
+        assert secret not in raw
+    assert b"Laptop" not in text
+    # Debug endpoints are not captured
+    assert [record["p"] for record in records][-1] == "/items/{{id:1}}"
+    assert len(records) == 11
+    assert records[0]["t"] <= records[-1]["t"]
+
+    clear_stores()
+    report = replay_asgi(records)
+    assert report["total"]["requests"] == 11
+    assert report["total"]["errors"] == 0
+    assert report["total"]["status_mismatches"] == 0
+    assert set(report["routes"]) >= {"POST /login", "PUT /items/{id}"}
+    # Names are replaced by filler of the same length
+    assert [item.name for item in items_db] == ["xxxx"]
+
+
+def test_replay_prepares_users_from_before_the_capture(tmp_path):
+    headers, _ = login("alice")
+    client.post("/items", json={"name": "Old", "price": 1.0}, headers=headers)
+    path = tmp_path / "traffic.jsonl"
+    traffic_recorder.open(str(path))
+    client.get("/auth/me", headers=headers)
+    client.post("/items", json={"name": "New", "price": 1.0}, headers=headers)
+    client.get("/items/2", headers=headers)
+    client.post("/login", json={"username": "alice", "password": "pw"})
+    traffic_recorder.close()
+
+    records = read_capture(path)
+    assert len(users_to_prepare(records)) == 1
+    clear_stores()
+    report = replay_asgi(records)
+    assert report["total"]["status_mismatches"] == 0
+    # Replayed ids are mapped from replayed responses
+    assert [item.id for item in items_db] == [1]
+
+
+def test_replaying_twice_against_one_instance(tmp_path):
+    path = tmp_path / "traffic.jsonl"
+    traffic_recorder.open(str(path))
+    headers, _ = login("alice")
+    client.post("/items", json={"name": "Laptop", "price": 1.0}, headers=headers)
+    traffic_recorder.close()
+    headers, _ = login("bob")
+    traffic_recorder.open(str(path))
+    # Bob registered before this capture, so replay prepares him
+    client.get("/auth/me", headers=headers)
+    traffic_recorder.close()
+
+    records = read_capture(path)
+    clear_stores()
+    for _ in range(2):
+        report = replay_asgi(records)
+        assert report["total"]["status_mismatches"] == 0
+    assert len(users_db) == 4
+
+
+def test_appended_captures_play_one_after_the_other(tmp_path):
+    path = tmp_path / "traffic.jsonl"
+    for _ in range(2):
+        traffic_recorder.open(str(path))
+        client.get("/")
+        client.get("/")
+        traffic_recorder.close()
+    offsets = [record["t"] for record in read_capture(path)]
+    assert len(offsets) == 4
+    assert offsets == sorted(offsets)
+    assert offsets[2] >= offsets[1]
+
+
+def test_nothing_is_recorded_while_closed():
+    records = traffic_recorder.records
+    client.get("/")
+    assert traffic_recorder.records == records
+    assert not traffic_recorder.enabled
+
+
+def test_bindings_render():
+    bindings = Bindings()
+    bindings.bind(
+        {"id": 7, "access_token": "{{token:abc}}"}, {"id": 3, "access_token": "t"}
+    )
+    assert bindings.render("/items/{{id:7}}") == "/items/3"
+    assert bindings.render("/items/{{id:8}}") == "/items/8"
+    assert bindings.render({"h": "Bearer {{token:abc}}"}) == {"h": "Bearer t"}
+    assert bindings.render(["{{user:abc}}"]) == [f"user-abc-{bindings.nonce}"]
+    assert bindings.render("{{key:k}}") == f"k-{bindings.nonce}"
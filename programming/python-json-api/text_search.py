@@ -0,0 +1,146 @@
+import heapq
+import math
+import re
+import sys
+from collections.abc import Callable
+from typing import Any
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+class OwnerTextIndex:
+    """Inverted index over the item names and descriptions of a single owner"""
+
+    def __init__(self):
+        # term -> {item_id: term frequency}
+        self.postings: dict[str, dict[int, int]] = {}
+        self.doc_lengths: dict[int, int] = {}
+        self.items: dict[int, Any] = {}
+        self.total_length = 0
+
+    def add(self, item: Any):
+        if item.id in self.items:
+            self.remove(self.items[item.id])
+        tokens = tokenize(item.name) + tokenize(item.description)
+        frequencies: dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token, frequency in frequencies.items():
+            self.postings.setdefault(token, {})[item.id] = frequency
+        self.doc_lengths[item.id] = len(tokens)
+        self.items[item.id] = item
+        self.total_length += len(tokens)
+
+    def remove(self, item: Any):
+        if item.id not in self.items:
+            return
+        for token in set(tokenize(item.name) + tokenize(item.description)):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(item.id, None)
+            if not posting:
+                del self.postings[token]
+        self.total_length -= self.doc_lengths.pop(item.id)
+        del self.items[item.id]
+
+
+class TextIndex:
+    """
+    Per-owner inverted index with BM25 ranking
+    Query cost is bounded by the postings of the query terms
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.owners: dict[int, OwnerTextIndex] = {}
+
+    def add(self, item: Any):
+        index = self.owners.get(item.owner_id)
+        if index is None:
+            index = self.owners[item.owner_id] = OwnerTextIndex()
+        index.add(item)
+
+    def remove(self, item: Any):
+        index = self.owners.get(item.owner_id)
+        if index is None:
+            return
+        index.remove(item)
+        if not index.items:
+            del self.owners[item.owner_id]
+
+    def clear(self):
+        self.owners.clear()
+
+    def search(
+        self,
+        owner_id: int,
+        query: str,
+        limit: int = 10,
+        predicate: Callable[[Any], bool] | None = None,
+    ) -> list[tuple[Any, float]]:
+        """Return the top (item, score) pairs matching query ranked by BM25"""
+        index = self.owners.get(owner_id)
+        if index is None:
+            return []
+
+        document_count = len(index.items)
+        average_length = index.total_length / document_count or 1.0
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = index.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(
+                1 + (document_count - len(posting) + 0.5) / (len(posting) + 0.5)
+            )
+            for item_id, frequency in posting.items():
+                norm = self.k1 * (
+                    1 - self.b + self.b * index.doc_lengths[item_id] / average_length
+                )
+                scores[item_id] = scores.get(item_id, 0.0) + idf * (
+                    frequency * (self.k1 + 1) / (frequency + norm)
+                )
+
+        candidates = (
+            (score, item_id)
+            for item_id, score in scores.items()
+            if predicate is None or predicate(index.items[item_id])
+        )
+        # Ties are broken by ascending item id
+        top = heapq.nsmallest(limit, candidates, key=lambda c: (-c[0], c[1]))
+        return [(index.items[item_id], score) for score, item_id in top]
+
+    def memory_usage(self, owner_id: int | None = None) -> dict[str, int]:
+        """Approximate memory used by the index, for one owner or all owners"""
+        if owner_id is None:
+            indexes = list(self.owners.values())
+        else:
+            indexes = [self.owners[owner_id]] if owner_id in self.owners else []
+
+        documents = terms = postings = size = 0
+        for index in indexes:
+            documents += len(index.items)
+            terms += len(index.postings)
+            size += sys.getsizeof(index.postings)
+            size += sys.getsizeof(index.doc_lengths) + sys.getsizeof(index.items)
+            for term, posting in index.postings.items():
+                postings += len(posting)
+                size += sys.getsizeof(term) + sys.getsizeof(posting)
+        return {
+            "documents": documents,
+            "terms": terms,
+            "postings": postings,
+            "approximate_bytes": size,
+        }
+
+
+# Global text index instance
+text_index = TextIndex()
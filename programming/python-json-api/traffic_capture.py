@@ -0,0 +1,322 @@
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import re
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any
+from urllib.parse import parse_qsl, urlencode
+
+# Password of every user in a capture, so replayed logins succeed
+REPLAY_PASSWORD = "replay-password"  # noqa: S105
+
+# Placeholders look like {{kind:value}} and are filled in on replay
+PLACEHOLDER = re.compile(r"\{\{(\w+):([^{}]*)\}\}")
+
+# Headers recorded for replay, values of the first two are replaced
+RECORDED_HEADERS = ("authorization", "idempotency-key", "accept-encoding")
+
+
+def _placeholder(kind: str, value: Any) -> str:
+    return f"{{{{{kind}:{value}}}}}"
+
+
+def _jwt_subject(token: str) -> str | None:
+    """Subject of a JWT, read without verifying it, None for other strings"""
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = json.loads(
+            base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4))
+        )
+    except ValueError:
+        return None
+    subject = payload.get("sub") if isinstance(payload, dict) else None
+    return subject if isinstance(subject, str) else None
+
+
+class Sanitizer:
+    """
+    Replaces credentials and personal data in captured requests
+    Usernames, tokens, refresh tokens and idempotency keys become keyed
+    hashes, so requests of the same user still match up on replay, and other
+    strings become filler of the same length. The key is per capture and
+    never written out.
+    """
+
+    def __init__(self, key: bytes | None = None):
+        self.key = secrets.token_bytes(32) if key is None else key
+
+    def digest(self, value: str) -> str:
+        return hmac.new(self.key, value.encode(), hashlib.sha256).hexdigest()[:16]
+
+    def token(self, token: str) -> str:
+        subject = _jwt_subject(token)
+        if subject is None:
+            return _placeholder("token", "")
+        return _placeholder("token", self.digest(subject))
+
+    def authorization(self, value: str) -> str:
+        scheme, _, credentials = value.partition(" ")
+        return f"{scheme} {self.token(credentials)}"
+
+    def value(self, value: Any, field: str | None = None, now: float = 0.0) -> Any:
+        if isinstance(value, dict):
+            return {key: self.value(item, key, now) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.value(item, field, now) for item in value]
+        if not isinstance(value, str):
+            return value
+        if field == "username":
+            return _placeholder("user", self.digest(value))
+        if field == "email":
+            return _placeholder("email", self.digest(value)) + "@replay.invalid"
+        if field == "password":
+            return REPLAY_PASSWORD
+        if field == "refresh_token":
+            return _placeholder("refresh", self.digest(value))
+        if field == "expires_at":
+            # Relative to the request, absolute times would be past on replay
+            try:
+                expires_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                return value
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            return _placeholder("in", round(expires_at.timestamp() - now, 3))
+        if field in ("access_token", "tokens") or _jwt_subject(value) is not None:
+            return self.token(value)
+        return "x" * len(value)
+
+    def path(self, path: str) -> str:
+        # Item ids differ on replay and are mapped from replayed responses
+        return "/".join(
+            _placeholder("id", part) if part.isdigit() else part
+            for part in path.split("/")
+        )
+
+    def query(self, query: str) -> str:
+        pairs = parse_qsl(query, keep_blank_values=True)
+        return urlencode(
+            [
+                (name, value if _is_number(value) else "x" * len(value))
+                for name, value in pairs
+            ]
+        )
+
+    def headers(self, headers: dict[str, str]) -> dict[str, str]:
+        sanitized = {}
+        for name, value in headers.items():
+            if name == "authorization":
+                sanitized[name] = self.authorization(value)
+            elif name == "idempotency-key":
+                sanitized[name] = _placeholder("key", self.digest(value))
+            else:
+                sanitized[name] = value
+        return sanitized
+
+    def returned(self, body: Any) -> dict | None:
+        """Fields of a response that later requests of the capture refer to"""
+        if not isinstance(body, dict):
+            return None
+        returned = {}
+        if isinstance(body.get("id"), int):
+            returned["id"] = body["id"]
+        if isinstance(body.get("access_token"), str):
+            returned["access_token"] = self.token(body["access_token"])
+        if isinstance(body.get("refresh_token"), str):
+            returned["refresh_token"] = self.value(
+                body["refresh_token"], "refresh_token"
+            )
+        return returned or None
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+class TrafficRecorder:
+    """
+    Append-only capture of request records, one compact JSON line each
+    Each capture starts with a header line, and request offsets are seconds
+    since it. Paths ending in .gz are gzip compressed, appended captures
+    become further gzip members.
+    """
+
+    def __init__(self, max_body: int = 64 * 1024):
+        self.max_body = max_body
+        self.sanitizer = Sanitizer()
+        self.enabled = False
+        self.records = 0
+        self._file = None
+        self._start = 0.0
+        self._lock = threading.Lock()
+
+    def open(self, path: str):
+        self.close()
+        opener = gzip.open if path.endswith(".gz") else open
+        self._file = opener(path, "at", encoding="utf-8")
+        self._start = time.monotonic()
+        self.sanitizer = Sanitizer()
+        self.records = 0
+        self._write(
+            {
+                "capture": 1,
+                "started_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+        self.enabled = True
+
+    def offset(self) -> float:
+        return time.monotonic() - self._start
+
+    def _write(self, record: dict):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+
+    def record(
+        self,
+        offset: float,
+        method: str,
+        path: str,
+        query: str,
+        headers: dict[str, str],
+        body: bytes | None,
+        body_size: int,
+        status: int,
+        duration: float,
+        response: bytes | None = None,
+    ):
+        """Sanitize and append a request, body None when it was too large"""
+        sanitizer = self.sanitizer
+        record: dict[str, Any] = {
+            "t": round(offset, 6),
+            "m": method,
+            "p": sanitizer.path(path),
+        }
+        if query:
+            record["q"] = sanitizer.query(query)
+        if headers:
+            record["h"] = sanitizer.headers(headers)
+        if body:
+            try:
+                record["b"] = sanitizer.value(json.loads(body), now=time.time())
+            except ValueError:
+                body = None
+        if body is None:
+            # Only JSON bodies are kept, others by size
+            record["bl"] = body_size
+        record["s"] = status
+        record["d"] = round(duration, 6)
+        if response:
+            try:
+                returned = sanitizer.returned(json.loads(response))
+            except ValueError:
+                returned = None
+            if returned:
+                record["r"] = returned
+        self._write(record)
+        self.records += 1
+
+    def close(self):
+        self.enabled = False
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class TrafficCaptureMiddleware:
+    """
+    ASGI middleware recording requests to a TrafficRecorder while it is open
+    Costs one attribute lookup per request otherwise.
+    """
+
+    def __init__(self, app, recorder: TrafficRecorder, exclude: tuple = ("/debug",)):
+        self.app = app
+        self.recorder = recorder
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        recorder = self.recorder
+        if (
+            not recorder.enabled
+            or scope["type"] != "http"
+            or scope["path"].startswith(self.exclude)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        offset = recorder.offset()
+        start = time.perf_counter()
+        body = bytearray()
+        body_size = 0
+        truncated = False
+        status = 500
+        # Responses are read back only for writes, which return created ids
+        # and tokens that later requests refer to
+        keep_response = scope["method"] != "GET"
+        response = bytearray()
+
+        async def receive_recording():
+            nonlocal body_size, truncated
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_size += len(chunk)
+                if not truncated:
+                    body.extend(chunk)
+                if body_size > recorder.max_body:
+                    truncated = True
+                    body.clear()
+            return message
+
+        async def send_recording(message):
+            nonlocal status, keep_response
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = dict(message.get("headers", []))
+                if status >= 300 or b"content-encoding" in headers:
+                    keep_response = False
+            elif message["type"] == "http.response.body" and keep_response:
+                response.extend(message.get("body", b""))
+                if len(response) > recorder.max_body:
+                    keep_response = False
+                    response.clear()
+            await send(message)
+
+        try:
+            await self.app(scope, receive_recording, send_recording)
+        finally:
+            headers = {}
+            for name, value in scope["headers"]:
+                name = name.decode("latin-1")
+                if name in RECORDED_HEADERS:
+                    headers[name] = value.decode("latin-1")
+            recorder.record(
+                offset,
+                scope["method"],
+                scope["path"],
+                scope.get("query_string", b"").decode("latin-1"),
+                headers,
+                None if truncated else bytes(body),
+                body_size,
+                status,
+                time.perf_counter() - start,
+                bytes(response) if keep_response else None,
+            )
+
+
+# Global traffic recorder instance
+traffic_recorder = TrafficRecorder()